@@ -0,0 +1,31 @@
+"""add image dimensions to uploadmetadata
+
+Revision ID: 4f1c2a9d7e30
+Revises: 8b52c1b9f73b
+Create Date: 2026-10-18 10:15:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "4f1c2a9d7e30"
+down_revision: str | Sequence[str] | None = "8b52c1b9f73b"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("uploadmetadata", sa.Column("width", sa.Integer(), nullable=True))
+    op.add_column("uploadmetadata", sa.Column("height", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("uploadmetadata", "height")
+    op.drop_column("uploadmetadata", "width")
@@ -0,0 +1,35 @@
+"""add byte size and image format to uploadmetadata
+
+Revision ID: b7d3e5f1a2c4
+Revises: 4f1c2a9d7e30
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b7d3e5f1a2c4"
+down_revision: str | Sequence[str] | None = "4f1c2a9d7e30"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("uploadmetadata", sa.Column("byte_size", sa.BigInteger(), nullable=True))
+    op.add_column(
+        "uploadmetadata",
+        sa.Column("image_format", sqlmodel.sql.sqltypes.AutoString(length=16), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("uploadmetadata", "image_format")
+    op.drop_column("uploadmetadata", "byte_size")
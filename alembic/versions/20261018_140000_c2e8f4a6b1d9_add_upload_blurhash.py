@@ -0,0 +1,33 @@
+"""add blurhash placeholder to uploadmetadata
+
+Revision ID: c2e8f4a6b1d9
+Revises: b7d3e5f1a2c4
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c2e8f4a6b1d9"
+down_revision: str | Sequence[str] | None = "b7d3e5f1a2c4"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "uploadmetadata",
+        sa.Column("blurhash", sqlmodel.sql.sqltypes.AutoString(length=64), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("uploadmetadata", "blurhash")
@@ -0,0 +1,37 @@
+"""add dhash chunks to uploadmetadata
+
+Revision ID: d4a9b3c7e5f2
+Revises: c2e8f4a6b1d9
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d4a9b3c7e5f2"
+down_revision: str | Sequence[str] | None = "c2e8f4a6b1d9"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+DHASH_CHUNKS = ("dhash_0", "dhash_1", "dhash_2", "dhash_3")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for column in DHASH_CHUNKS:
+        op.add_column("uploadmetadata", sa.Column(column, sa.Integer(), nullable=True))
+        op.create_index(
+            op.f(f"ix_uploadmetadata_{column}"), "uploadmetadata", [column], unique=False
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for column in reversed(DHASH_CHUNKS):
+        op.drop_index(op.f(f"ix_uploadmetadata_{column}"), table_name="uploadmetadata")
+        op.drop_column("uploadmetadata", column)
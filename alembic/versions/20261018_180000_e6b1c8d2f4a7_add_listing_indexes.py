@@ -0,0 +1,53 @@
+"""add listing and tag lookup indexes
+
+Revision ID: e6b1c8d2f4a7
+Revises: d4a9b3c7e5f2
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e6b1c8d2f4a7"
+down_revision: str | Sequence[str] | None = "d4a9b3c7e5f2"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY keeps both tables writable during the build on
+    # Postgres, but cannot run inside a transaction. Other dialects ignore it.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_uploadmetadata_created_at_pk",
+            "uploadmetadata",
+            ["created_at", "pk"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_uploadtag_tag_pk_upload_pk",
+            "uploadtag",
+            ["tag_pk", "upload_pk"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_uploadtag_tag_pk_upload_pk",
+            table_name="uploadtag",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_uploadmetadata_created_at_pk",
+            table_name="uploadmetadata",
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,40 @@
+"""add maintained upload count to tag
+
+Revision ID: f8c3d5a7b9e1
+Revises: e6b1c8d2f4a7
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f8c3d5a7b9e1"
+down_revision: str | Sequence[str] | None = "e6b1c8d2f4a7"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "tag",
+        sa.Column("upload_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    # Only count links whose upload still exists; SQLite does not enforce the
+    # cascade unless foreign keys are switched on.
+    op.execute(
+        "UPDATE tag SET upload_count = ("
+        "SELECT count(*) FROM uploadtag "
+        "JOIN uploadmetadata ON uploadmetadata.pk = uploadtag.upload_pk "
+        "WHERE uploadtag.tag_pk = tag.pk)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("tag", "upload_count")
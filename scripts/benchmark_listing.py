@@ -0,0 +1,195 @@
+"""Query plans and latencies of upload listings with and without the listing indexes.
+
+Seeds uploads whose tags follow a Zipf distribution, as real tag usage does,
+then times ``TagService.list_with_tags`` for typical requests twice: once
+without ``ix_uploadmetadata_created_at_pk`` and ``ix_uploadtag_tag_pk_upload_pk``
+and once with them, printing the plan the database chose for each.
+"""
+
+import argparse
+import datetime
+import random
+import statistics
+import time
+import uuid
+from collections.abc import Callable
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+from sqlmodel import Session, SQLModel
+
+from lenzr_server.models.tags import Tag, UploadTag
+from lenzr_server.models.uploads import UploadMetaData
+from lenzr_server.tag_service import TagService
+
+INSERT_BATCH_SIZE = 10_000
+INDEXES = {
+    "ix_uploadmetadata_created_at_pk": UploadMetaData.__table__,
+    "ix_uploadtag_tag_pk_upload_pk": UploadTag.__table__,
+}
+
+
+def _seed(session: Session, uploads: int, tags: int, rng: random.Random) -> list[str]:
+    """Insert uploads with 0-5 Zipf-distributed tags each; return tag names by popularity."""
+    tag_rows = [{"pk": uuid.uuid4(), "name": f"tag{rank:05d}"} for rank in range(tags)]
+    session.execute(sa.insert(Tag), tag_rows)
+    upload_counts = [0] * tags
+    weights = [1 / (rank + 1) for rank in range(tags)]
+
+    start = datetime.datetime(2020, 1, 1, tzinfo=datetime.UTC)
+    upload_rows: list[dict] = []
+    upload_tag_rows: list[dict] = []
+    for index in range(uploads):
+        pk = uuid.uuid4()
+        upload_rows.append(
+            {
+                "pk": pk,
+                "upload_id": f"{index:032x}",
+                # Roughly one upload a minute, with some sharing a timestamp.
+                "created_at": start + datetime.timedelta(minutes=index // 2),
+                "content_type": "image/jpeg",
+            }
+        )
+        chosen = set(rng.choices(range(tags), weights=weights, k=rng.randint(0, 5)))
+        upload_tag_rows.extend({"upload_pk": pk, "tag_pk": tag_rows[rank]["pk"]} for rank in chosen)
+        for rank in chosen:
+            upload_counts[rank] += 1
+        if len(upload_rows) >= INSERT_BATCH_SIZE:
+            _flush(session, upload_rows, upload_tag_rows)
+    _flush(session, upload_rows, upload_tag_rows)
+    # The counts TagService would have maintained, which rank the filter tags.
+    tag_table = Tag.__table__
+    session.connection().execute(
+        sa.update(tag_table)
+        .where(tag_table.c.pk == sa.bindparam("tag_pk"))
+        .values(upload_count=sa.bindparam("count")),
+        [
+            {"tag_pk": row["pk"], "count": count}
+            for row, count in zip(tag_rows, upload_counts, strict=True)
+        ],
+    )
+    session.commit()
+    return [row["name"] for row in tag_rows]
+
+
+def _flush(session: Session, upload_rows: list[dict], upload_tag_rows: list[dict]) -> None:
+    if upload_rows:
+        session.execute(sa.insert(UploadMetaData), upload_rows)
+    if upload_tag_rows:
+        session.execute(sa.insert(UploadTag), upload_tag_rows)
+    upload_rows.clear()
+    upload_tag_rows.clear()
+
+
+def _set_indexes(session: Session, present: bool) -> None:
+    connection = session.connection()
+    for name, table in INDEXES.items():
+        index = next(index for index in table.indexes if index.name == name)
+        if present:
+            index.create(connection, checkfirst=True)
+        else:
+            index.drop(connection, checkfirst=True)
+    # Fresh statistics, so the planner knows about the new (or missing) index.
+    session.execute(sa.text("ANALYZE"))
+    session.commit()
+
+
+@contextmanager
+def _captured_statements(session: Session):
+    statements: list[tuple[str, object]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    engine = session.get_bind()
+    sa.event.listen(engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        sa.event.remove(engine, "before_cursor_execute", capture)
+
+
+def _explain(session: Session, run: Callable[[], object]) -> str:
+    with _captured_statements(session) as statements:
+        run()
+    # Tag lookups and counts come first; the page itself is the ordered select.
+    statement, parameters = next(
+        (statement, parameters)
+        for statement, parameters in statements
+        if statement.lstrip().startswith("SELECT uploadmetadata.") and "ORDER BY" in statement
+    )
+    connection = session.connection()
+    if connection.dialect.name == "postgresql":
+        rows = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+        return "\n".join(f"    {row[0]}" for row in rows)
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+    return "\n".join(f"    {row[-1]}" for row in rows)
+
+
+def _time(run: Callable[[], object], iterations: int) -> float:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def _scenarios(
+    tag_service: TagService, tag_names: list[str], uploads: int
+) -> dict[str, Callable[[], object]]:
+    deep_offset = max(0, uploads // 2)
+    middle = tag_service.list_with_tags(offset=deep_offset, limit=1)
+    after = (middle[0].created_at, middle[0].pk) if middle else None
+    return {
+        "first page": lambda: tag_service.list_with_tags(limit=50),
+        f"offset {deep_offset:,}": lambda: tag_service.list_with_tags(offset=deep_offset, limit=50),
+        "cursor at same depth": lambda: tag_service.list_with_tags(limit=50, after=after),
+        "common tag": lambda: tag_service.list_with_tags(tag_names[:1], limit=50),
+        "rare tag": lambda: tag_service.list_with_tags(tag_names[-1:], limit=50),
+        "two common tags": lambda: tag_service.list_with_tags(tag_names[:2], limit=50),
+        "common + rare tag": lambda: tag_service.list_with_tags(
+            [tag_names[0], tag_names[len(tag_names) // 2]], limit=50
+        ),
+        "any of 3 rare tags": lambda: tag_service.list_with_tags(any_tags=tag_names[-3:], limit=50),
+        "any of 3 common tags": lambda: tag_service.list_with_tags(
+            any_tags=tag_names[:3], limit=50
+        ),
+        "excluding common tag": lambda: tag_service.list_with_tags(
+            exclude_tags=tag_names[:1], limit=50
+        ),
+        "rare tag, cursor, not common": lambda: tag_service.list_with_tags(
+            tag_names[-1:], limit=50, after=after, exclude_tags=tag_names[:1]
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--uploads", type=int, default=1_000_000)
+    parser.add_argument("--tags", type=int, default=2_000)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--database-url", default="sqlite://", help="Default: in-memory SQLite.")
+    parser.add_argument("--no-plans", action="store_true", help="Only print latencies.")
+    args = parser.parse_args()
+
+    engine = sa.create_engine(args.database_url)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        start = time.perf_counter()
+        tag_names = _seed(session, args.uploads, args.tags, random.Random(0))
+        print(f"Seeded {args.uploads:,} uploads in {time.perf_counter() - start:.1f}s")
+
+        tag_service = TagService(session)
+        for label, present in (("without indexes", False), ("with indexes", True)):
+            _set_indexes(session, present)
+            print(f"\n== {label} ==")
+            for name, run in _scenarios(tag_service, tag_names, args.uploads).items():
+                median = _time(run, args.iterations)
+                print(f"{name:>28}: {median * 1000:9.1f} ms median")
+                if not args.no_plans:
+                    print(_explain(session, run))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Compare the multi-index similar-upload search with a full scan of all hashes."""
+
+import argparse
+import datetime
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from collections.abc import Callable
+
+import sqlalchemy as sa
+from sqlmodel import Session, SQLModel, select
+
+from lenzr_server.file_storages.on_disk_file_storage import OnDiskFileStorage
+from lenzr_server.models.uploads import UploadMetaData
+from lenzr_server.perceptual_hash import (
+    MAX_SEARCH_DISTANCE,
+    hamming_distance,
+    join_hash,
+    split_hash,
+)
+from lenzr_server.upload_id_creators.hashing_id_creator import HashingIDCreator
+from lenzr_server.upload_service import UploadService
+
+INSERT_BATCH_SIZE = 10_000
+
+
+def _flip_bits(value: int, count: int, rng: random.Random) -> int:
+    for bit in rng.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+
+def _populate(session: Session, uploads: int, queries: int, rng: random.Random) -> list[str]:
+    """Insert random hashes plus a few near-duplicates of each query upload."""
+    created_at = datetime.datetime(2026, 1, 1, tzinfo=datetime.UTC)
+    query_ids = []
+    rows = []
+    for index in range(uploads):
+        value = rng.getrandbits(64)
+        if index < queries:
+            query_ids.append(f"query{index}")
+            duplicates = [_flip_bits(value, rng.randint(1, 6), rng) for _ in range(3)]
+            rows.extend(_row(f"dup{index}-{n}", d, created_at) for n, d in enumerate(duplicates))
+            rows.append(_row(query_ids[-1], value, created_at))
+        else:
+            rows.append(_row(f"upload{index}", value, created_at))
+        if len(rows) >= INSERT_BATCH_SIZE:
+            session.execute(sa.insert(UploadMetaData), rows)
+            rows = []
+    if rows:
+        session.execute(sa.insert(UploadMetaData), rows)
+    session.commit()
+    return query_ids
+
+
+def _row(upload_id: str, value: int, created_at: datetime.datetime) -> dict:
+    chunks = split_hash(value)
+    return {
+        "pk": uuid.uuid4(),
+        "upload_id": upload_id,
+        "created_at": created_at,
+        "content_type": "image/jpeg",
+        **{f"dhash_{index}": chunk for index, chunk in enumerate(chunks)},
+    }
+
+
+def _full_scan(session: Session, upload_id: str, max_distance: int) -> int:
+    query_row = session.exec(
+        select(UploadMetaData).where(UploadMetaData.upload_id == upload_id)
+    ).one()
+    value = join_hash((query_row.dhash_0, query_row.dhash_1, query_row.dhash_2, query_row.dhash_3))
+    columns = select(
+        UploadMetaData.dhash_0,
+        UploadMetaData.dhash_1,
+        UploadMetaData.dhash_2,
+        UploadMetaData.dhash_3,
+    )
+    matches = sum(
+        hamming_distance(value, join_hash(tuple(chunks))) <= max_distance
+        for chunks in session.exec(columns)
+    )
+    # The query upload matches itself.
+    return matches - 1
+
+
+def _time(search: Callable[[], object], iterations: int) -> float:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        search()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--uploads", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument(
+        "--max-distance", type=int, default=6, choices=range(MAX_SEARCH_DISTANCE + 1)
+    )
+    parser.add_argument("--database-url", default="sqlite://", help="Default: in-memory SQLite.")
+    args = parser.parse_args()
+
+    engine = sa.create_engine(args.database_url)
+    SQLModel.metadata.create_all(engine)
+    rng = random.Random(0)
+    with Session(engine) as session:
+        start = time.perf_counter()
+        query_ids = _populate(session, args.uploads, args.queries, rng)
+        print(f"Inserted {args.uploads:,} uploads in {time.perf_counter() - start:.1f}s")
+
+        service = UploadService(OnDiskFileStorage(tempfile.mkdtemp()), session, HashingIDCreator(0))
+        for upload_id in query_ids:
+            indexed = _time(
+                lambda: service.find_similar(upload_id, args.max_distance, limit=100),
+                args.iterations,
+            )
+            found = len(service.find_similar(upload_id, args.max_distance, limit=100))
+            scanned = _time(
+                lambda: _full_scan(session, upload_id, args.max_distance), args.iterations
+            )
+            expected = _full_scan(session, upload_id, args.max_distance)
+            print(
+                f"{upload_id:>8}: multi-index {indexed * 1000:8.1f} ms ({found} found), "
+                f"full scan {scanned * 1000:8.1f} ms ({expected} found)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Compare thumbnail generation before and after the explicit scaled JPEG decode.
+
+``baseline`` is the code path before the change: ``Image.thumbnail`` with its
+defaults, which already drafts JPEGs. ``full decode`` disables that, to show
+what draft decoding itself saves.
+"""
+
+import argparse
+import io
+import multiprocessing
+import resource
+import statistics
+import time
+from collections.abc import Callable
+
+from PIL import Image
+
+from lenzr_server.thumbnail_service import (
+    InMemoryThumbnailCache,
+    InMemoryThumbnailService,
+    ThumbnailSize,
+    ThumbnailSpec,
+)
+
+
+def _create_photo(width: int, height: int) -> bytes:
+    # Noise compresses like a real photo, unlike a flat colour.
+    image = Image.effect_noise((width, height), 64).convert("RGB")
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+def _render(content: bytes, size: int, **thumbnail_options) -> bytes:
+    image = Image.open(io.BytesIO(content))
+    image.thumbnail((size, size), **thumbnail_options)
+    output = io.BytesIO()
+    image.convert("RGB").save(output, format="JPEG")
+    return output.getvalue()
+
+
+def _peak_memory_growth(generate: Callable[[], object]) -> int:
+    """Peak resident memory added by one ``generate()`` call, in bytes.
+
+    Runs in a forked child, whose high-water mark starts at the parent's current
+    size, so earlier runs do not mask the peak. Pillow allocates pixel buffers
+    outside the Python allocator, where tracemalloc cannot see them.
+    """
+    context = multiprocessing.get_context("fork")
+    results = context.SimpleQueue()
+
+    def measure() -> None:
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        generate()
+        # ru_maxrss is in KiB on Linux.
+        results.put((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) * 1024)
+
+    child = context.Process(target=measure)
+    child.start()
+    growth = results.get()
+    child.join()
+    return growth
+
+
+def _time(generate: Callable[[], object], iterations: int) -> float:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        generate()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--width", type=int, default=6000)
+    parser.add_argument("--height", type=int, default=4000)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument(
+        "--size", type=int, choices=[int(s) for s in ThumbnailSize], default=ThumbnailSize.DEFAULT
+    )
+    args = parser.parse_args()
+
+    content = _create_photo(args.width, args.height)
+    spec = ThumbnailSpec(size=args.size)
+    # A zero byte budget never caches, so every call renders.
+    service = InMemoryThumbnailService(cache=InMemoryThumbnailCache(max_bytes=0))
+
+    rows = [
+        ("full decode", lambda: _render(content, args.size, reducing_gap=None)),
+        ("baseline", lambda: _render(content, args.size)),
+        ("scaled decode", lambda: service.get_thumbnail("benchmark", lambda: content, spec)),
+    ]
+    print(f"{args.width}x{args.height} JPEG, {len(content) / 1e6:.1f} MB")
+    for name, generate in rows:
+        # Measured before timing, so the child starts without freed heap
+        # left over from earlier runs to reuse.
+        peak_mb = _peak_memory_growth(generate) / 1e6
+        median = _time(generate, args.iterations)
+        print(f"{name:>14}: {median * 1000:8.1f} ms median, {peak_mb:8.1f} MB peak RSS growth")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+from lenzr_server.cli import main
+
+# Guarded: spawned thumbnail worker processes re-import the main module.
+if __name__ == "__main__":
+    main()
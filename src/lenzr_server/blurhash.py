@@ -0,0 +1,90 @@
+"""Pure-Python BlurHash encoder (https://blurha.sh) for image placeholders."""
+
+import io
+import math
+
+from PIL import Image
+
+X_COMPONENTS = 4
+Y_COMPONENTS = 3
+# The hash only keeps a few low frequencies, so a tiny sample is enough and
+# keeps the pure-Python transform cheap.
+SAMPLE_SIZE = 32
+
+_BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def _srgb_to_linear(value: int) -> float:
+    v = value / 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+_LINEAR = [_srgb_to_linear(value) for value in range(256)]
+
+
+def _linear_to_srgb(value: float) -> int:
+    v = max(0.0, min(1.0, value))
+    if v <= 0.0031308:
+        return round(v * 12.92 * 255)
+    return round((1.055 * v ** (1 / 2.4) - 0.055) * 255)
+
+
+def _sign_pow(value: float, exponent: float) -> float:
+    return math.copysign(abs(value) ** exponent, value)
+
+
+def _base83(value: int, length: int) -> str:
+    return "".join(_BASE83[value // 83 ** (length - 1 - i) % 83] for i in range(length))
+
+
+def encode_blurhash(
+    content: bytes, x_components: int = X_COMPONENTS, y_components: int = Y_COMPONENTS
+) -> str:
+    """Encode the image in ``content`` as a BlurHash string.
+
+    Raises ``PIL.UnidentifiedImageError`` if ``content`` is not an image.
+    """
+    image = Image.open(io.BytesIO(content))
+    image.thumbnail((SAMPLE_SIZE, SAMPLE_SIZE))
+    image = image.convert("RGB")
+    width, height = image.size
+    pixels = image.tobytes()
+
+    factors: list[tuple[float, float, float]] = []
+    for j in range(y_components):
+        cos_y = [math.cos(math.pi * j * y / height) for y in range(height)]
+        for i in range(x_components):
+            cos_x = [math.cos(math.pi * i * x / width) for x in range(width)]
+            r = g = b = 0.0
+            offset = 0
+            for y in range(height):
+                for x in range(width):
+                    basis = cos_x[x] * cos_y[y]
+                    r += basis * _LINEAR[pixels[offset]]
+                    g += basis * _LINEAR[pixels[offset + 1]]
+                    b += basis * _LINEAR[pixels[offset + 2]]
+                    offset += 3
+            scale = (1 if i == 0 and j == 0 else 2) / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _base83((x_components - 1) + (y_components - 1) * 9, 1)
+
+    if ac:
+        actual_max = max(abs(channel) for factor in ac for channel in factor)
+        quantised_max = max(0, min(82, math.floor(actual_max * 166 - 0.5)))
+        max_value = (quantised_max + 1) / 166
+    else:
+        quantised_max, max_value = 0, 1.0
+    result += _base83(quantised_max, 1)
+
+    r, g, b = (_linear_to_srgb(channel) for channel in dc)
+    result += _base83((r << 16) + (g << 8) + b, 4)
+
+    for factor in ac:
+        qr, qg, qb = (
+            max(0, min(18, math.floor(_sign_pow(channel / max_value, 0.5) * 9 + 9.5)))
+            for channel in factor
+        )
+        result += _base83(qr * 19 * 19 + qg * 19 + qb, 2)
+    return result
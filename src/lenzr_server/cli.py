@@ -0,0 +1,367 @@
+"""Command-line maintenance tasks for a Lenzr server deployment."""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import pathlib
+import time
+import uuid
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AbstractContextManager
+from dataclasses import dataclass
+
+from lenzr_server.dependencies import get_file_storage, upload_service_scope
+from lenzr_server.file_storages.file_storage import FileStorage
+from lenzr_server.jobs import compute_image_hashes, warm_thumbnail
+from lenzr_server.pagination import ListPosition
+from lenzr_server.thumbnail_service import (
+    ThumbnailFormat,
+    ThumbnailService,
+    ThumbnailSize,
+    ThumbnailSpec,
+    thumbnail_service_from_env,
+)
+from lenzr_server.upload_service import UploadNotFoundException, UploadService
+
+DEFAULT_BATCH_SIZE = 100
+
+
+@dataclass
+class BackfillProgress:
+    uploads: int = 0
+    thumbnails: int = 0
+    failed: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def uploads_per_second(self) -> float:
+        return self.uploads / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+
+class BackfillCheckpoint:
+    """Position of the last fully processed batch, stored as JSON."""
+
+    def __init__(self, path: pathlib.Path):
+        self._path = path
+
+    def load(self) -> ListPosition | None:
+        try:
+            data = json.loads(self._path.read_text())
+        except FileNotFoundError:
+            return None
+        return datetime.datetime.fromisoformat(data["created_at"]), uuid.UUID(data["pk"])
+
+    def save(self, position: ListPosition) -> None:
+        created_at, pk = position
+        staging_path = self._path.with_name(self._path.name + ".tmp")
+        staging_path.write_text(json.dumps({"created_at": created_at.isoformat(), "pk": str(pk)}))
+        os.replace(staging_path, self._path)
+
+
+def backfill_thumbnails(
+    upload_service: UploadService,
+    thumbnail_service: ThumbnailService,
+    file_storage: FileStorage,
+    specs: Sequence[ThumbnailSpec],
+    workers: int,
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+    limit: int | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    checkpoint: BackfillCheckpoint | None = None,
+    report: Callable[[BackfillProgress], None] = lambda progress: None,
+) -> BackfillProgress:
+    """Generate ``specs`` thumbnails of uploads, newest first.
+
+    Thumbnails already on disk are not rendered again, so an interrupted run
+    can simply be restarted; with a ``checkpoint`` it also skips the batches
+    that were completed before.
+    """
+    progress = BackfillProgress()
+    after = checkpoint.load() if checkpoint is not None else None
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while limit is None or progress.uploads < limit:
+            page_size = batch_size if limit is None else min(batch_size, limit - progress.uploads)
+            batch = upload_service.list_metadata(
+                limit=page_size, since=since, until=until, after=after
+            )
+            if not batch:
+                break
+
+            jobs = [
+                executor.submit(
+                    warm_thumbnail, thumbnail_service, file_storage, upload.upload_id, spec
+                )
+                for upload in batch
+                for spec in specs
+            ]
+            results = [job.result() for job in jobs]
+
+            progress.uploads += len(batch)
+            progress.thumbnails += sum(results)
+            progress.failed += results.count(False)
+            progress.elapsed_seconds = time.monotonic() - start
+            after = (batch[-1].created_at, batch[-1].pk)
+            if checkpoint is not None:
+                checkpoint.save(after)
+            report(progress)
+    return progress
+
+
+def backfill_file_info(
+    upload_services: Callable[[], AbstractContextManager[UploadService]],
+    workers: int,
+    limit: int | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    report: Callable[[BackfillProgress], None] = lambda progress: None,
+) -> BackfillProgress:
+    """Record byte size, dimensions and format of uploads stored before ingest did.
+
+    Stored files are probed in parallel; each batch is written in its own
+    transaction, so a restarted run continues with the remaining uploads.
+    Uploads whose file is missing are counted as failed and skipped.
+    """
+    progress = BackfillProgress()
+    after: ListPosition | None = None
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while limit is None or progress.uploads < limit:
+            page_size = batch_size if limit is None else min(batch_size, limit - progress.uploads)
+            with upload_services() as upload_service:
+                batch = upload_service.list_metadata(
+                    limit=page_size, after=after, missing_file_info=True
+                )
+                if not batch:
+                    break
+
+                # Probing only reads files, so it runs off the session's thread.
+                jobs = [
+                    executor.submit(upload_service.probe_stored_file, upload.upload_id)
+                    for upload in batch
+                ]
+                for upload, job in zip(batch, jobs, strict=True):
+                    try:
+                        byte_size, image_info = job.result()
+                    except FileNotFoundError:
+                        logging.warning("File of upload %s is missing", upload.upload_id)
+                        progress.failed += 1
+                        continue
+                    upload_service.set_file_info(upload.upload_id, byte_size, image_info)
+
+            progress.uploads += len(batch)
+            progress.elapsed_seconds = time.monotonic() - start
+            after = (batch[-1].created_at, batch[-1].pk)
+            report(progress)
+    return progress
+
+
+def backfill_image_hashes(
+    upload_services: Callable[[], AbstractContextManager[UploadService]],
+    thumbnail_service: ThumbnailService,
+    file_storage: FileStorage,
+    workers: int,
+    limit: int | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    report: Callable[[BackfillProgress], None] = lambda progress: None,
+) -> BackfillProgress:
+    """Record the BlurHash placeholder and dHash of uploads that have none.
+
+    Hashes are computed in parallel from the default thumbnails; each batch is
+    written in its own transaction. Uploads that cannot be decoded keep no
+    hashes and are counted as failed; the listing position moves past them, so
+    a run visits each upload once.
+    """
+    progress = BackfillProgress()
+    after: ListPosition | None = None
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while limit is None or progress.uploads < limit:
+            page_size = batch_size if limit is None else min(batch_size, limit - progress.uploads)
+            with upload_services() as upload_service:
+                batch = upload_service.list_metadata(
+                    limit=page_size, after=after, missing_hashes=True
+                )
+                if not batch:
+                    break
+
+                jobs = [
+                    executor.submit(
+                        compute_image_hashes, thumbnail_service, file_storage, upload.upload_id
+                    )
+                    for upload in batch
+                ]
+                for upload, job in zip(batch, jobs, strict=True):
+                    hashes = job.result()
+                    if hashes is None:
+                        progress.failed += 1
+                        continue
+                    blurhash, perceptual_hash = hashes
+                    try:
+                        upload_service.set_blurhash(upload.upload_id, blurhash)
+                        upload_service.set_dhash(upload.upload_id, perceptual_hash)
+                    except UploadNotFoundException:
+                        progress.failed += 1
+
+            progress.uploads += len(batch)
+            progress.elapsed_seconds = time.monotonic() - start
+            after = (batch[-1].created_at, batch[-1].pk)
+            report(progress)
+    return progress
+
+
+def _log_progress(progress: BackfillProgress) -> None:
+    logging.info(
+        "%d uploads, %d thumbnails, %d failed, %.1f uploads/s",
+        progress.uploads,
+        progress.thumbnails,
+        progress.failed,
+        progress.uploads_per_second,
+    )
+
+
+def _parse_datetime(value: str) -> datetime.datetime:
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.UTC)
+    return parsed
+
+
+def _run_backfill(args: argparse.Namespace) -> None:
+    specs = [
+        ThumbnailSpec(size=size, format=image_format)
+        for size in args.size or [ThumbnailSize.DEFAULT]
+        for image_format in args.format or [ThumbnailFormat.JPEG]
+    ]
+    checkpoint = BackfillCheckpoint(args.checkpoint) if args.checkpoint else None
+    with thumbnail_service_from_env() as thumbnail_service, upload_service_scope() as uploads:
+        progress = backfill_thumbnails(
+            upload_service=uploads,
+            thumbnail_service=thumbnail_service,
+            file_storage=get_file_storage(),
+            specs=specs,
+            workers=args.workers,
+            since=args.since,
+            until=args.until,
+            limit=args.limit,
+            batch_size=args.batch_size,
+            checkpoint=checkpoint,
+            report=_log_progress,
+        )
+    logging.info("Backfill finished in %.1fs", progress.elapsed_seconds)
+
+
+def _log_upload_progress(progress: BackfillProgress) -> None:
+    logging.info(
+        "%d uploads, %d failed, %.1f uploads/s",
+        progress.uploads,
+        progress.failed,
+        progress.uploads_per_second,
+    )
+
+
+def _run_file_info_backfill(args: argparse.Namespace) -> None:
+    progress = backfill_file_info(
+        upload_services=upload_service_scope,
+        workers=args.workers,
+        limit=args.limit,
+        batch_size=args.batch_size,
+        report=_log_upload_progress,
+    )
+    logging.info("Backfill finished in %.1fs", progress.elapsed_seconds)
+
+
+def _run_image_hashes_backfill(args: argparse.Namespace) -> None:
+    with thumbnail_service_from_env() as thumbnail_service:
+        progress = backfill_image_hashes(
+            upload_services=upload_service_scope,
+            thumbnail_service=thumbnail_service,
+            file_storage=get_file_storage(),
+            workers=args.workers,
+            limit=args.limit,
+            batch_size=args.batch_size,
+            report=_log_upload_progress,
+        )
+    logging.info("Backfill finished in %.1fs", progress.elapsed_seconds)
+
+
+def _add_batch_arguments(parser: argparse.ArgumentParser, workers_help: str) -> None:
+    parser.add_argument("--limit", type=int, help="Stop after this many uploads.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help=f"{workers_help} (default: CPU count).",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f"Uploads read per query (default: {DEFAULT_BATCH_SIZE}).",
+    )
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="lenzr-server", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    thumbnails = commands.add_parser("thumbnails", help="Manage generated thumbnails")
+    thumbnail_commands = thumbnails.add_subparsers(dest="thumbnails_command", required=True)
+    backfill = thumbnail_commands.add_parser(
+        "backfill", help="Generate thumbnails of existing uploads, newest first"
+    )
+    backfill.add_argument(
+        "--size",
+        type=int,
+        action="append",
+        choices=[int(size) for size in ThumbnailSize],
+        help="Thumbnail size to generate; repeatable (default: 200).",
+    )
+    backfill.add_argument(
+        "--format",
+        type=ThumbnailFormat,
+        action="append",
+        choices=list(ThumbnailFormat),
+        help="Thumbnail format to generate; repeatable (default: jpeg).",
+    )
+    backfill.add_argument(
+        "--since", type=_parse_datetime, help="Only uploads created at or after this ISO time."
+    )
+    backfill.add_argument(
+        "--until", type=_parse_datetime, help="Only uploads created before this ISO time."
+    )
+    _add_batch_arguments(backfill, "Thumbnails generated in parallel")
+    backfill.add_argument(
+        "--checkpoint",
+        type=pathlib.Path,
+        help="Resume from and record progress in this file.",
+    )
+    backfill.set_defaults(handler=_run_backfill)
+
+    uploads = commands.add_parser("uploads", help="Manage stored uploads")
+    upload_commands = uploads.add_subparsers(dest="uploads_command", required=True)
+    file_info = upload_commands.add_parser(
+        "backfill-file-info",
+        help="Record size, dimensions and format of uploads stored before ingest did",
+    )
+    _add_batch_arguments(file_info, "Files probed in parallel")
+    file_info.set_defaults(handler=_run_file_info_backfill)
+    image_hashes = upload_commands.add_parser(
+        "backfill-hashes",
+        help="Record BlurHash placeholders and dHashes of uploads that have none",
+    )
+    _add_batch_arguments(image_hashes, "Hashes computed in parallel")
+    image_hashes.set_defaults(handler=_run_image_hashes_backfill)
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    logging.basicConfig(
+        level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+    )
+    args = _build_parser().parse_args(argv)
+    args.handler(args)
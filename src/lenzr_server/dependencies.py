@@ -1,4 +1,6 @@
 import os
+from collections.abc import Generator
+from contextlib import contextmanager
 
 from fastapi import Depends, HTTPException, Request
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
@@ -8,22 +10,29 @@ import lenzr_server.security as security
 from lenzr_server.db import engine
 from lenzr_server.file_storages.file_storage import FileStorage
 from lenzr_server.file_storages.on_disk_file_storage import OnDiskFileStorage
+from lenzr_server.keyed_lock import KeyedLock
 from lenzr_server.tag_service import TagService
-from lenzr_server.thumbnail_service import InMemoryThumbnailService, ThumbnailService
+from lenzr_server.thumbnail_service import ThumbnailService
 from lenzr_server.upload_id_creators.hashing_id_creator import HashingIDCreator
 from lenzr_server.upload_id_creators.id_creator import IDCreator
 from lenzr_server.upload_service import UploadService
 from lenzr_server.webhook import WebhookNotifier
+from lenzr_server.worker_pool import BoundedWorkerPool
 
 DEFAULT_MAX_UPLOAD_BYTES = 25 * 1024 * 1024
 
 _id_creator = HashingIDCreator(seed=32)
+_ingest_locks = KeyedLock()
 
 
 def get_id_creator() -> IDCreator:
     return _id_creator
 
 
+def get_ingest_locks() -> KeyedLock:
+    return _ingest_locks
+
+
 def get_max_upload_bytes() -> int:
     return int(os.environ.get("MAX_UPLOAD_BYTES", DEFAULT_MAX_UPLOAD_BYTES))
 
@@ -48,14 +57,28 @@ def get_upload_service(
     file_storage: FileStorage = Depends(get_file_storage),
     db_session: Session = Depends(get_db_session),
     upload_id_creator: IDCreator = Depends(get_id_creator),
+    ingest_locks: KeyedLock = Depends(get_ingest_locks),
 ) -> UploadService:
     return UploadService(
         file_storage=file_storage,
         database_session=db_session,
         upload_id_creator=upload_id_creator,
+        ingest_locks=ingest_locks,
     )
 
 
+@contextmanager
+def upload_service_scope() -> Generator[UploadService, None, None]:
+    """``UploadService`` with its own database session, for use outside requests."""
+    with contextmanager(get_db_session)() as db_session:
+        yield get_upload_service(
+            file_storage=get_file_storage(),
+            db_session=db_session,
+            upload_id_creator=get_id_creator(),
+            ingest_locks=get_ingest_locks(),
+        )
+
+
 def get_tag_service(
     db_session: Session = Depends(get_db_session),
 ):
@@ -63,13 +86,17 @@ def get_tag_service(
 
 
 def get_thumbnail_service(request: Request) -> ThumbnailService:
-    return InMemoryThumbnailService(cache=request.app.state.thumbnail_cache)
+    return request.app.state.thumbnail_service
 
 
 def get_webhook_notifier(request: Request) -> WebhookNotifier:
     return request.app.state.webhook_notifier
 
 
+def get_ingest_pool(request: Request) -> BoundedWorkerPool:
+    return request.app.state.ingest_pool
+
+
 http_basic_auth = HTTPBasic()
 
 
@@ -1,14 +1,36 @@
+import pathlib
 from typing import NewType, Protocol
 
 FileID = NewType("FileID", str)
 
 
+class StagedFile(Protocol):
+    """A file being written before its final ``FileID`` is known."""
+
+    def write(self, chunk: bytes) -> None:
+        pass
+
+    def commit(self, file_id: FileID) -> None:
+        pass
+
+    def discard(self) -> None:
+        """Remove the staged content. No-op after a successful ``commit``."""
+        pass
+
+
 class FileStorage(Protocol):
     def add_file(self, file_id: FileID, content: bytes) -> None:
         pass
 
+    def stage_file(self) -> StagedFile:
+        pass
+
     def get_file_content(self, file_id: FileID) -> bytes:
         pass
 
+    def get_file_path(self, file_id: FileID) -> pathlib.Path:
+        """Return a path the file can be streamed from. Raises ``FileNotFoundError``."""
+        pass
+
     def delete_file_content(self, file_id: FileID) -> None:
         pass
@@ -1,7 +1,48 @@
+import logging
 import os
 import pathlib
+import tempfile
+import time
+from collections.abc import Callable
 
-from lenzr_server.file_storages.file_storage import FileID, FileStorage
+from lenzr_server.file_storages.file_storage import FileID, FileStorage, StagedFile
+
+STAGING_PREFIX = ".staging-"
+# Staging files older than this are left over from a crash, not being written.
+STALE_STAGING_SECONDS = 60 * 60
+
+# The umask can only be read by setting it, so do so once at import time,
+# before any threads exist.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+# Mode open() gives a new file; mkstemp creates staging files as 0600.
+DEFAULT_FILE_MODE = 0o666 & ~_UMASK
+
+
+class OnDiskStagedFile(StagedFile):
+    def __init__(self, base_path: pathlib.Path, resolve: Callable[[FileID], pathlib.Path]):
+        # Stage inside the storage root so the final rename never crosses
+        # a filesystem boundary and stays atomic.
+        fd, path = tempfile.mkstemp(dir=base_path, prefix=STAGING_PREFIX)
+        self._file = os.fdopen(fd, "wb")
+        self._path = pathlib.Path(path)
+        self._resolve = resolve
+        self._committed = False
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+
+    def commit(self, file_id: FileID) -> None:
+        file_path = self._resolve(file_id)
+        os.fchmod(self._file.fileno(), DEFAULT_FILE_MODE)
+        self._file.close()
+        os.replace(self._path, file_path)
+        self._committed = True
+
+    def discard(self) -> None:
+        self._file.close()
+        if not self._committed:
+            self._path.unlink(missing_ok=True)
 
 
 class OnDiskFileStorage(FileStorage):
@@ -16,11 +57,40 @@ class OnDiskFileStorage(FileStorage):
         with open(file_path, "wb") as f:
             f.write(content)
 
+    def stage_file(self) -> OnDiskStagedFile:
+        return OnDiskStagedFile(self._resolved_base_path, self._resolve)
+
+    def remove_stale_staging_files(self, max_age_seconds: float = STALE_STAGING_SECONDS) -> int:
+        """Delete staging files abandoned by a crash; return how many were removed.
+
+        Only files older than ``max_age_seconds`` are touched, so uploads
+        being staged by other workers right now are left alone.
+        """
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        for path in self._resolved_base_path.glob(f"{STAGING_PREFIX}*"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                # Committed or discarded meanwhile.
+                continue
+        if removed:
+            logging.info("Removed %d stale staging files from %s", removed, self._base_path)
+        return removed
+
     def get_file_content(self, file_id: FileID) -> bytes:
         file_path = self._resolve(file_id)
         with open(file_path, "rb") as f:
             return f.read()
 
+    def get_file_path(self, file_id: FileID) -> pathlib.Path:
+        file_path = self._resolve(file_id)
+        if not file_path.is_file():
+            raise FileNotFoundError(file_path)
+        return file_path
+
     def delete_file_content(self, file_id: FileID) -> None:
         file_path = self._resolve(file_id)
         file_path.unlink()
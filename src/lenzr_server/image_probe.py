@@ -0,0 +1,49 @@
+import os
+from dataclasses import dataclass
+from typing import BinaryIO
+
+from PIL import Image, UnidentifiedImageError
+
+DEFAULT_MAX_IMAGE_PIXELS = 100_000_000
+
+
+@dataclass(frozen=True)
+class ImageInfo:
+    width: int
+    height: int
+    format: str
+
+
+class ImageTooLargeException(Exception):
+    def __init__(self, detail: str = "Image exceeds the pixel limit"):
+        self.detail = detail
+        super().__init__(detail)
+
+
+def get_max_image_pixels() -> int:
+    return int(os.environ.get("MAX_IMAGE_PIXELS", DEFAULT_MAX_IMAGE_PIXELS))
+
+
+def exceeds_pixel_limit(width: int, height: int, max_pixels: int | None) -> bool:
+    return max_pixels is not None and width * height > max_pixels
+
+
+def probe_image(stream: BinaryIO, max_pixels: int | None = None) -> ImageInfo | None:
+    """Read dimensions and format from the image header without decoding pixels.
+
+    Returns None if the content is not an image Pillow recognises. Raises
+    ``ImageTooLargeException`` if it has more than ``max_pixels`` pixels.
+    The stream position is left wherever the header parser stopped.
+    """
+    try:
+        image = Image.open(stream)
+    except Image.DecompressionBombError as exc:
+        # Pillow's own hard limit, checked on the header as well.
+        raise ImageTooLargeException() from exc
+    except (UnidentifiedImageError, OSError):
+        return None
+
+    info = ImageInfo(width=image.width, height=image.height, format=image.format or "")
+    if exceeds_pixel_limit(info.width, info.height, max_pixels):
+        raise ImageTooLargeException()
+    return info
@@ -0,0 +1,94 @@
+import logging
+
+from lenzr_server.blurhash import encode_blurhash
+from lenzr_server.dependencies import get_file_storage, upload_service_scope
+from lenzr_server.file_storages.file_storage import FileID, FileStorage
+from lenzr_server.perceptual_hash import dhash
+from lenzr_server.thumbnail_service import (
+    DEFAULT_THUMBNAIL_SPEC,
+    InvalidImageException,
+    ThumbnailService,
+    ThumbnailSpec,
+)
+from lenzr_server.types import UploadID
+from lenzr_server.upload_service import UploadNotFoundException
+
+
+def warm_thumbnail(
+    thumbnail_service: ThumbnailService,
+    file_storage: FileStorage,
+    upload_id: UploadID,
+    spec: ThumbnailSpec = DEFAULT_THUMBNAIL_SPEC,
+) -> bool:
+    """Render the thumbnail of ``upload_id`` before its first request.
+
+    Returns False if the upload has no thumbnail because it cannot be decoded
+    or no longer exists.
+    """
+    try:
+        thumbnail_service.get_thumbnail(
+            upload_id, lambda: file_storage.get_file_content(FileID(upload_id)), spec
+        )
+    except InvalidImageException:
+        # Remembered by the service, so the route answers 422 without decoding.
+        logging.info("Upload %s cannot be decoded, no thumbnail generated", upload_id)
+        return False
+    except FileNotFoundError:
+        logging.info("Upload %s was deleted before its thumbnail was generated", upload_id)
+        return False
+    return True
+
+
+def compute_image_hashes(
+    thumbnail_service: ThumbnailService, file_storage: FileStorage, upload_id: UploadID
+) -> tuple[str, int] | None:
+    """Return the BlurHash placeholder and dHash of ``upload_id``, warming its default thumbnail.
+
+    Both are computed from the default thumbnail rather than the original,
+    which is far cheaper to decode. Returns None if the upload has no
+    thumbnail or was deleted meanwhile.
+    """
+    try:
+        thumbnail = thumbnail_service.get_thumbnail(
+            upload_id, lambda: file_storage.get_file_content(FileID(upload_id))
+        )
+    except InvalidImageException:
+        logging.info("Upload %s cannot be decoded, no image hashes generated", upload_id)
+        return None
+    except FileNotFoundError:
+        logging.info("Upload %s was deleted before its image hashes were generated", upload_id)
+        return None
+    return encode_blurhash(thumbnail.content), dhash(thumbnail.content)
+
+
+def record_image_hashes(
+    thumbnail_service: ThumbnailService, file_storage: FileStorage, upload_id: UploadID
+) -> bool:
+    """Store the BlurHash placeholder and dHash of a new upload.
+
+    Returns False if the upload has no thumbnail or was deleted meanwhile.
+    """
+    hashes = compute_image_hashes(thumbnail_service, file_storage, upload_id)
+    if hashes is None:
+        return False
+
+    blurhash, perceptual_hash = hashes
+    with upload_service_scope() as upload_service:
+        try:
+            upload_service.set_blurhash(upload_id, blurhash)
+            upload_service.set_dhash(upload_id, perceptual_hash)
+        except UploadNotFoundException:
+            logging.info("Upload %s was deleted before its image hashes were stored", upload_id)
+            return False
+    return True
+
+
+def warm_recent_thumbnails(thumbnail_service: ThumbnailService, count: int) -> None:
+    """Load the default thumbnails of the ``count`` most recent uploads into the cache."""
+    with upload_service_scope() as upload_service:
+        uploads = upload_service.list_metadata(limit=count)
+    file_storage = get_file_storage()
+    warmed = sum(
+        warm_thumbnail(thumbnail_service, file_storage, upload.upload_id) for upload in uploads
+    )
+    logging.info("Warmed %d of %d recent thumbnails", warmed, len(uploads))
@@ -0,0 +1,51 @@
+import threading
+from collections.abc import Hashable, Iterator
+from contextlib import contextmanager
+
+
+class KeyedLock:
+    """One mutex per key, created on demand and dropped once nobody holds or waits for it.
+
+    ``release`` may be called from a different thread than ``acquire``, so a
+    key can stay held until some later event, e.g. a transaction commit.
+    """
+
+    def __init__(self):
+        self._locks: dict[Hashable, tuple[threading.Lock, int]] = {}
+        self._guard = threading.Lock()
+
+    @contextmanager
+    def hold(self, key: Hashable) -> Iterator[None]:
+        self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release(key)
+
+    def acquire(self, key: Hashable) -> None:
+        with self._guard:
+            lock, users = self._locks.get(key, (threading.Lock(), 0))
+            self._locks[key] = (lock, users + 1)
+        try:
+            lock.acquire()
+        except BaseException:
+            self._forget(key)
+            raise
+
+    def release(self, key: Hashable) -> None:
+        with self._guard:
+            lock, _ = self._locks[key]
+            lock.release()
+        self._forget(key)
+
+    def _forget(self, key: Hashable) -> None:
+        with self._guard:
+            lock, users = self._locks[key]
+            if users == 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, users - 1)
+
+    def __len__(self) -> int:
+        with self._guard:
+            return len(self._locks)
@@ -1,17 +1,31 @@
+import dataclasses
 import logging
 import os
 from contextlib import asynccontextmanager
 from typing import Annotated
 
 import fastapi
-from fastapi import Header
+from fastapi import Depends, Header
 from fastapi.responses import JSONResponse
 
 import lenzr_server
+from lenzr_server.dependencies import (
+    check_login_valid,
+    get_file_storage,
+    get_ingest_pool,
+    get_thumbnail_service,
+)
 from lenzr_server.exceptions import NotFoundException
+from lenzr_server.jobs import warm_recent_thumbnails
 from lenzr_server.routes import tag_router, upload_router
-from lenzr_server.thumbnail_service import InMemoryThumbnailCache
+from lenzr_server.schemas import (
+    StatsResponse,
+    ThumbnailCacheStatsResponse,
+    WorkerPoolStatsResponse,
+)
+from lenzr_server.thumbnail_service import ThumbnailService, thumbnail_service_from_env
 from lenzr_server.webhook import WebhookPayload, webhook_notifier_from_env
+from lenzr_server.worker_pool import BoundedWorkerPool, ingest_pool_from_env
 
 logging.basicConfig(
     level=os.environ.get("LOG_LEVEL", "INFO").upper(),
@@ -19,11 +33,25 @@ logging.basicConfig(
 )
 
 
+def get_thumbnail_warmup_count() -> int:
+    return int(os.environ.get("THUMBNAIL_WARMUP_COUNT", 0))
+
+
 @asynccontextmanager
 async def lifespan(app: fastapi.FastAPI):
-    app.state.thumbnail_cache = InMemoryThumbnailCache()
-    with webhook_notifier_from_env() as notifier:
+    with (
+        webhook_notifier_from_env() as notifier,
+        thumbnail_service_from_env() as thumbnail_service,
+        # Last, so it is shut down before the services its jobs use.
+        ingest_pool_from_env() as ingest_pool,
+    ):
         app.state.webhook_notifier = notifier
+        app.state.thumbnail_service = thumbnail_service
+        app.state.ingest_pool = ingest_pool
+        get_file_storage().remove_stale_staging_files()
+        warmup_count = get_thumbnail_warmup_count()
+        if warmup_count > 0:
+            ingest_pool.submit(warm_recent_thumbnails, thumbnail_service, warmup_count)
         yield
 
 
@@ -43,6 +71,21 @@ async def health() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/stats", tags=["Health"], summary="Runtime statistics")
+async def stats(
+    thumbnail_service: ThumbnailService = Depends(get_thumbnail_service),
+    ingest_pool: BoundedWorkerPool = Depends(get_ingest_pool),
+    _login_valid: None = Depends(check_login_valid),
+) -> StatsResponse:
+    """Counters of this worker's in-memory caches and ingest queue, for sizing them per host."""
+    cache_stats = dataclasses.asdict(thumbnail_service.stats())
+    queue_stats = dataclasses.asdict(ingest_pool.stats())
+    return StatsResponse(
+        thumbnail_cache=ThumbnailCacheStatsResponse(**cache_stats),
+        ingest_queue=WorkerPoolStatsResponse(**queue_stats),
+    )
+
+
 @app.webhooks.post(
     "upload.created",
     status_code=204,
@@ -9,9 +9,16 @@ from lenzr_server.models.uploads import LenzrServerModel
 class Tag(LenzrServerModel, table=True):
     pk: uuid.UUID | None = Field(default_factory=uuid.uuid4, primary_key=True)
     name: str = Field(max_length=64, unique=True, index=True)
+    # Number of uploads carrying the tag, kept in step with UploadTag by the
+    # services, so facet counts need not scan UploadTag.
+    upload_count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
 
 class UploadTag(LenzrServerModel, table=True):
+    # The primary key leads with upload_pk; this covers lookups by tag and the
+    # foreign key check when a tag is deleted.
+    __table_args__ = (sa.Index("ix_uploadtag_tag_pk_upload_pk", "tag_pk", "upload_pk"),)
+
     upload_pk: uuid.UUID = Field(
         sa_column=sa.Column(
             sa.Uuid,
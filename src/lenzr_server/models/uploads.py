@@ -2,6 +2,7 @@ import datetime
 import uuid
 from functools import partial
 
+import sqlalchemy as sa
 from sqlmodel import Field, SQLModel
 
 
@@ -14,8 +15,25 @@ class UploadMetaDataBase(LenzrServerModel):
 
 
 class UploadMetaData(UploadMetaDataBase, table=True):
+    # Serves the newest-first listing order and its keyset cursor.
+    __table_args__ = (sa.Index("ix_uploadmetadata_created_at_pk", "created_at", "pk"),)
+
     pk: uuid.UUID | None = Field(default_factory=uuid.uuid4, primary_key=True)
     created_at: datetime.datetime = Field(
         default_factory=partial(datetime.datetime.now, datetime.UTC)
     )
     content_type: str = Field(max_length=32)
+    # Recorded at ingest; None if it is not a recognised image, or for rows
+    # stored before that which have not been backfilled yet.
+    width: int | None = None
+    height: int | None = None
+    byte_size: int | None = Field(default=None, sa_type=sa.BigInteger)
+    image_format: str | None = Field(default=None, max_length=16)
+    # BlurHash placeholder, filled in by a background job after ingest.
+    blurhash: str | None = Field(default=None, max_length=64)
+    # 64-bit dHash in four separately indexed 16-bit chunks, most significant
+    # first, for multi-index near-duplicate search. Set by the same job.
+    dhash_0: int | None = Field(default=None, index=True)
+    dhash_1: int | None = Field(default=None, index=True)
+    dhash_2: int | None = Field(default=None, index=True)
+    dhash_3: int | None = Field(default=None, index=True)
@@ -0,0 +1,45 @@
+import base64
+import binascii
+import datetime
+import json
+import uuid
+
+import sqlalchemy as sa
+
+from lenzr_server.models.uploads import UploadMetaData
+
+# (created_at, pk) of an upload: its place in the newest-first listing order.
+ListPosition = tuple[datetime.datetime, uuid.UUID]
+
+
+class InvalidCursorException(Exception):
+    def __init__(self, detail: str = "Invalid cursor"):
+        self.detail = detail
+        super().__init__(detail)
+
+
+def encode_cursor(position: ListPosition) -> str:
+    created_at, pk = position
+    payload = json.dumps([created_at.isoformat(), str(pk)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> ListPosition:
+    """Inverse of ``encode_cursor``. Raises ``InvalidCursorException`` on malformed input."""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, pk = json.loads(payload)
+        return datetime.datetime.fromisoformat(created_at), uuid.UUID(pk)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as exc:
+        raise InvalidCursorException() from exc
+
+
+def uploads_after(position: ListPosition) -> sa.ColumnElement[bool]:
+    """Filter for the uploads that follow ``position`` in newest-first order.
+
+    Matches an ``ORDER BY created_at DESC, pk DESC``. Written as a row-value
+    comparison, which Postgres and SQLite turn into a range scan on the
+    ``(created_at, pk)`` index; the equivalent OR of two conditions is not.
+    """
+    created_at, pk = position
+    return sa.tuple_(UploadMetaData.created_at, UploadMetaData.pk) < sa.tuple_(created_at, pk)
@@ -0,0 +1,74 @@
+"""Difference hash (dHash) for near-duplicate detection, with multi-index lookup keys.
+
+A 64-bit dHash is split into four 16-bit chunks that are stored and indexed
+separately. If two hashes differ in at most ``d`` bits, at least one chunk
+differs in at most ``d // 4`` bits (pigeonhole), so a search only has to look
+up the chunk values near the query's chunks instead of scanning every row.
+"""
+
+import io
+from collections.abc import Iterator
+from itertools import combinations
+
+from PIL import Image
+
+HASH_BITS = 64
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+# Bounds the number of chunk values looked up per search: at 2 bits per chunk
+# that is 4 * (1 + 16 + 120) values.
+MAX_SEARCH_DISTANCE = 11
+
+_CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+def dhash(content: bytes) -> int:
+    """Return the 64-bit difference hash of the image in ``content``.
+
+    Raises ``PIL.UnidentifiedImageError`` if ``content`` is not an image.
+    """
+    image = Image.open(io.BytesIO(content))
+    image.draft("L", (64, 64))
+    # One extra column, so each row yields eight left/right comparisons.
+    pixels = image.convert("L").resize((9, 8), Image.Resampling.BOX).tobytes()
+    value = 0
+    for row in range(8):
+        for column in range(8):
+            left = pixels[row * 9 + column]
+            right = pixels[row * 9 + column + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def split_hash(value: int) -> tuple[int, ...]:
+    """Split ``value`` into its chunks, most significant first."""
+    return tuple(
+        (value >> (CHUNK_BITS * (CHUNKS - 1 - index))) & _CHUNK_MASK for index in range(CHUNKS)
+    )
+
+
+def join_hash(chunks: tuple[int, ...]) -> int:
+    value = 0
+    for chunk in chunks:
+        value = (value << CHUNK_BITS) | chunk
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def chunk_neighbours(chunk: int, max_distance: int) -> Iterator[int]:
+    """Yield every chunk value within ``max_distance`` bits of ``chunk``."""
+    for distance in range(max_distance + 1):
+        for bits in combinations(range(CHUNK_BITS), distance):
+            flipped = chunk
+            for bit in bits:
+                flipped ^= 1 << bit
+            yield flipped
+
+
+def candidate_chunks(value: int, max_distance: int) -> list[list[int]]:
+    """Per chunk, the values a hash within ``max_distance`` must match in at least one chunk."""
+    radius = max_distance // CHUNKS
+    return [list(chunk_neighbours(chunk, radius)) for chunk in split_hash(value)]
@@ -1,17 +1,76 @@
-from fastapi.responses import Response
+import os
+
+from fastapi.responses import FileResponse, Response
 
 from lenzr_server.schemas import ErrorResponse
+from lenzr_server.types import UploadID
 
 NOT_FOUND_RESPONSES = {404: {"description": "Not found", "model": ErrorResponse}}
+NOT_MODIFIED_RESPONSES = {304: {"description": "Not modified - cached copy is still valid"}}
+
+# Upload IDs are content hashes, so the bytes behind a URL never change.
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def make_etag(upload_id: UploadID, variant: str | None = None) -> str:
+    tag = upload_id if variant is None else f"{upload_id}-{variant}"
+    return f'"{tag}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison function (RFC 9110, 13.1.2).
+    candidates = (candidate.strip().removeprefix("W/") for candidate in if_none_match.split(","))
+    return etag in candidates
 
 
 class ImageResponse(Response):
-    def __init__(self, content: bytes, media_type: str):
+    def __init__(self, content: bytes, media_type: str, etag: str):
         super().__init__(
             content=content,
             media_type=media_type,
             headers={
                 "Content-Length": str(len(content)),
-                "Cache-Control": "public, max-age=3600",  # Cache images for 1 hour
+                "Cache-Control": IMAGE_CACHE_CONTROL,
+                "ETag": etag,
             },
         )
+
+
+class ImageFileResponse(FileResponse):
+    """Streams an image from disk in fixed-size chunks instead of loading it into memory.
+
+    Single and multipart ``Range`` requests are answered with 206 by ``FileResponse``.
+    """
+
+    def __init__(self, path: str | os.PathLike[str], media_type: str, etag: str):
+        super().__init__(
+            path=path,
+            media_type=media_type,
+            headers={"Cache-Control": IMAGE_CACHE_CONTROL, "ETag": etag},
+        )
+
+
+class NotModifiedResponse(Response):
+    def __init__(self, etag: str):
+        super().__init__(
+            status_code=304,
+            headers={"Cache-Control": IMAGE_CACHE_CONTROL, "ETag": etag},
+        )
+
+
+class ImageHeadResponse(Response):
+    """Headers-only answer to a HEAD probe; ``Content-Length`` is omitted when unknown."""
+
+    def __init__(self, media_type: str, etag: str, content_length: int | None):
+        super().__init__(
+            media_type=media_type,
+            headers={"Cache-Control": IMAGE_CACHE_CONTROL, "ETag": etag},
+        )
+        if content_length is None:
+            del self.headers["Content-Length"]
+        else:
+            self.headers["Content-Length"] = str(content_length)
@@ -1,20 +1,53 @@
 from datetime import UTC, datetime
 
-from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Query, UploadFile
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    File,
+    Header,
+    HTTPException,
+    Query,
+    UploadFile,
+)
 from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import Response
+from sqlmodel import Session
 
 from lenzr_server.dependencies import (
     check_login_valid,
+    get_db_session,
+    get_file_storage,
+    get_ingest_pool,
     get_max_upload_bytes,
     get_tag_service,
     get_thumbnail_service,
     get_upload_service,
     get_webhook_notifier,
 )
-from lenzr_server.responses import NOT_FOUND_RESPONSES, ImageResponse
+from lenzr_server.file_storages.file_storage import FileStorage
+from lenzr_server.image_probe import (
+    ImageTooLargeException,
+    exceeds_pixel_limit,
+    get_max_image_pixels,
+)
+from lenzr_server.jobs import record_image_hashes
+from lenzr_server.pagination import InvalidCursorException, decode_cursor, encode_cursor
+from lenzr_server.perceptual_hash import MAX_SEARCH_DISTANCE
+from lenzr_server.responses import (
+    NOT_FOUND_RESPONSES,
+    NOT_MODIFIED_RESPONSES,
+    ImageFileResponse,
+    ImageHeadResponse,
+    ImageResponse,
+    NotModifiedResponse,
+    etag_matches,
+    make_etag,
+)
 from lenzr_server.schemas import (
     ErrorResponse,
+    SimilarUploadResponse,
+    TagFacetsResponse,
     TagListResponse,
     TagsUpdateRequest,
     UploadMetaDataCreateResponse,
@@ -22,13 +55,47 @@ from lenzr_server.schemas import (
     UploadWithTagsResponse,
 )
 from lenzr_server.tag_service import TagService
-from lenzr_server.thumbnail_service import InvalidImageException, ThumbnailService
+from lenzr_server.thumbnail_service import (
+    DEFAULT_THUMBNAIL_SPEC,
+    InvalidImageException,
+    ThumbnailFormat,
+    ThumbnailService,
+    ThumbnailSize,
+    ThumbnailSpec,
+)
 from lenzr_server.types import TagName, UploadID
-from lenzr_server.upload_service import UploadAlreadyExistingException, UploadService
+from lenzr_server.upload_service import (
+    UploadAlreadyExistingException,
+    UploadService,
+    UploadTooLargeException,
+)
 from lenzr_server.webhook import WebhookNotifier
+from lenzr_server.worker_pool import BoundedWorkerPool
 
 upload_router = APIRouter(prefix="/uploads", tags=["Uploads"])
 
+THUMBNAIL_ETAG_VARIANT = "thumbnail"
+IF_NONE_MATCH_DESCRIPTION = "Return 304 without a body if the ETag matches"
+THUMBNAIL_SIZE_DESCRIPTION = "Maximum width and height in pixels"
+THUMBNAIL_FORMAT_DESCRIPTION = "Output image format"
+
+
+def _load_original(upload_service: UploadService, upload_id: UploadID, max_pixels: int) -> bytes:
+    metadata = upload_service.get_metadata(upload_id)
+    if metadata.width is not None and metadata.height is not None:
+        # Dimensions known from the ingest probe: an image over the limit is
+        # refused without reading or decoding the original.
+        if exceeds_pixel_limit(metadata.width, metadata.height, max_pixels):
+            raise InvalidImageException("Image exceeds the pixel limit")
+    return upload_service.read_upload(metadata).content
+
+
+def _thumbnail_etag(upload_id: UploadID, spec: ThumbnailSpec) -> str:
+    # The default variant keeps its original ETag so client caches stay valid.
+    if spec == DEFAULT_THUMBNAIL_SPEC:
+        return make_etag(upload_id, THUMBNAIL_ETAG_VARIANT)
+    return make_etag(upload_id, f"{THUMBNAIL_ETAG_VARIANT}-{spec.size}-{spec.format}")
+
 
 @upload_router.post(
     "",
@@ -45,6 +112,7 @@ upload_router = APIRouter(prefix="/uploads", tags=["Uploads"])
         },
         400: {"description": "Bad request - invalid file", "model": ErrorResponse},
         413: {"description": "Uploaded file exceeds size limit", "model": ErrorResponse},
+        422: {"description": "Image exceeds the pixel limit", "model": ErrorResponse},
     },
 )
 async def upload_file(
@@ -56,33 +124,58 @@ async def upload_file(
     tag_service: TagService = Depends(get_tag_service),
     webhook_notifier: WebhookNotifier = Depends(get_webhook_notifier),
     max_upload_bytes: int = Depends(get_max_upload_bytes),
+    max_image_pixels: int = Depends(get_max_image_pixels),
+    ingest_pool: BoundedWorkerPool = Depends(get_ingest_pool),
+    thumbnail_service: ThumbnailService = Depends(get_thumbnail_service),
+    file_storage: FileStorage = Depends(get_file_storage),
+    db_session: Session = Depends(get_db_session),
     _login_valid: None = Depends(check_login_valid),
 ):
     if upload.size is not None and upload.size > max_upload_bytes:
         raise HTTPException(status_code=413, detail="Uploaded file exceeds size limit")
 
-    # Read one byte past the limit so we can still reject clients that lie
-    # about (or omit) Content-Length without buffering the whole oversized body.
-    content = await upload.read(max_upload_bytes + 1)
-    if len(content) > max_upload_bytes:
-        raise HTTPException(status_code=413, detail="Uploaded file exceeds size limit")
-
     content_type = upload.content_type
     if content_type is None or not content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Bad request - invalid file")
 
     try:
-        upload_id = upload_service.add_upload(content, content_type).upload_id
+        # The body is streamed in chunks through the hasher into storage; the
+        # size limit is enforced while reading, so clients that lie about (or
+        # omit) Content-Length are rejected before an oversized body is
+        # stored. Starlette has already spooled the multipart body to a
+        # temporary file by the time this handler runs.
+        upload_metadata = await run_in_threadpool(
+            upload_service.add_upload_stream,
+            upload.file,
+            content_type,
+            max_upload_bytes,
+            max_image_pixels,
+        )
+        upload_id = upload_metadata.upload_id
         created = True
     except UploadAlreadyExistingException as aee:
         upload_id = aee.upload_id
         created = False
+    except UploadTooLargeException as exc:
+        raise HTTPException(status_code=413, detail=exc.detail)
+    except ImageTooLargeException as exc:
+        raise HTTPException(status_code=422, detail=exc.detail)
 
     result_tags: list[TagName] = []
     if tags and created:
         result_tags = tag_service.set_tags(upload_id, tags)
 
+    # Commit before scheduling follow-up work, so the ingest job and webhook
+    # receivers always find the row. Whether background tasks run before or
+    # after the get_db_session teardown differs between FastAPI versions.
+    db_session.commit()
+
     if created:
+        # Best effort: if the queue is full the thumbnail is rendered on its
+        # first request and `uploads backfill-hashes` fills in the hashes.
+        background_tasks.add_task(
+            ingest_pool.submit, record_image_hashes, thumbnail_service, file_storage, upload_id
+        )
         background_tasks.add_task(webhook_notifier.send, upload_id, datetime.now(UTC))
 
     response.status_code = 201 if created else 200
@@ -92,51 +185,140 @@ async def upload_file(
 @upload_router.get(
     "/{upload_id}",
     summary="Get image",
-    description="Download an uploaded image by ID",
+    description="Download an uploaded image by ID. Supports `Range` and `If-None-Match`.",
     response_class=ImageResponse,
     status_code=200,
     responses={
         200: {
             "description": "Image content",
         },
+        206: {"description": "Requested byte range of the image"},
+        **NOT_MODIFIED_RESPONSES,
         **NOT_FOUND_RESPONSES,
     },
 )
 async def get_upload(
     upload_id: UploadID,
+    if_none_match: str | None = Header(default=None, description=IF_NONE_MATCH_DESCRIPTION),
+    upload_service: UploadService = Depends(get_upload_service),
+):
+    stored_upload = upload_service.get_upload_file(upload_id)
+    etag = make_etag(upload_id)
+    if etag_matches(if_none_match, etag):
+        return NotModifiedResponse(etag=etag)
+    return ImageFileResponse(
+        path=stored_upload.path, media_type=stored_upload.content_type, etag=etag
+    )
+
+
+@upload_router.head(
+    "/{upload_id}",
+    summary="Probe image",
+    description="Get content type, length and ETag of an uploaded image without its content",
+    response_class=ImageResponse,
+    status_code=200,
+    responses={
+        200: {"description": "Image exists"},
+        **NOT_MODIFIED_RESPONSES,
+        **NOT_FOUND_RESPONSES,
+    },
+)
+async def head_upload(
+    upload_id: UploadID,
+    if_none_match: str | None = Header(default=None, description=IF_NONE_MATCH_DESCRIPTION),
     upload_service: UploadService = Depends(get_upload_service),
 ):
-    upload = upload_service.get_upload(upload_id)
-    return ImageResponse(content=upload.content, media_type=upload.content_type)
+    # FileResponse answers HEAD with the stat()-derived headers only.
+    return await get_upload(upload_id, if_none_match, upload_service)
 
 
 @upload_router.get(
     "/{upload_id}/thumbnail",
     summary="Get image thumbnail",
-    description="Download a 200px max-dimension JPEG thumbnail of an uploaded image",
+    description="Download a thumbnail of an uploaded image that fits within `size` pixels, "
+    "encoded as `format`",
     response_class=ImageResponse,
     status_code=200,
     responses={
         200: {"description": "Thumbnail image content"},
         422: {"description": "Image cannot be decoded", "model": ErrorResponse},
+        **NOT_MODIFIED_RESPONSES,
         **NOT_FOUND_RESPONSES,
     },
 )
 async def get_upload_thumbnail(
     upload_id: UploadID,
+    size: ThumbnailSize = Query(ThumbnailSize.DEFAULT, description=THUMBNAIL_SIZE_DESCRIPTION),
+    format: ThumbnailFormat = Query(ThumbnailFormat.JPEG, description=THUMBNAIL_FORMAT_DESCRIPTION),
+    if_none_match: str | None = Header(default=None, description=IF_NONE_MATCH_DESCRIPTION),
     upload_service: UploadService = Depends(get_upload_service),
     thumbnail_service: ThumbnailService = Depends(get_thumbnail_service),
+    max_image_pixels: int = Depends(get_max_image_pixels),
 ):
-    upload = upload_service.get_upload(upload_id)
-    try:
-        # Pillow decode/encode is CPU-bound; offload to a worker thread so we
-        # don't block the event loop for other requests.
-        thumbnail = await run_in_threadpool(
-            thumbnail_service.get_thumbnail, upload_id, upload.content
-        )
-    except InvalidImageException as exc:
-        raise HTTPException(status_code=422, detail=exc.detail)
-    return ImageResponse(content=thumbnail.content, media_type=thumbnail.content_type)
+    spec = ThumbnailSpec(size=size, format=format)
+    etag = _thumbnail_etag(upload_id, spec)
+    # Cache first: a hit needs neither the database nor the original blob. The
+    # cache may be on disk, so it is read off the event loop.
+    thumbnail = await run_in_threadpool(thumbnail_service.peek, upload_id, spec)
+    if etag_matches(if_none_match, etag):
+        if thumbnail is None:
+            # Metadata lookup only, so deleted uploads still answer 404.
+            upload_service.get_metadata(upload_id)
+        return NotModifiedResponse(etag=etag)
+
+    if thumbnail is None:
+        try:
+            # Pillow decode/encode is CPU-bound; offload to a worker thread so we
+            # don't block the event loop for other requests.
+            thumbnail = await run_in_threadpool(
+                thumbnail_service.get_thumbnail,
+                upload_id,
+                lambda: _load_original(upload_service, upload_id, max_image_pixels),
+                spec,
+            )
+        except InvalidImageException as exc:
+            raise HTTPException(status_code=422, detail=exc.detail)
+    return ImageResponse(content=thumbnail.content, media_type=thumbnail.content_type, etag=etag)
+
+
+@upload_router.head(
+    "/{upload_id}/thumbnail",
+    summary="Probe image thumbnail",
+    description="Get content type and ETag of a thumbnail without generating it. "
+    "`Content-Length` is only sent if the thumbnail is already cached; on a miss it is "
+    "omitted rather than rendering the thumbnail.",
+    response_class=ImageResponse,
+    status_code=200,
+    responses={
+        200: {"description": "Thumbnail can be requested"},
+        422: {"description": "Image is known to be undecodable", "model": ErrorResponse},
+        **NOT_MODIFIED_RESPONSES,
+        **NOT_FOUND_RESPONSES,
+    },
+)
+async def head_upload_thumbnail(
+    upload_id: UploadID,
+    size: ThumbnailSize = Query(ThumbnailSize.DEFAULT, description=THUMBNAIL_SIZE_DESCRIPTION),
+    format: ThumbnailFormat = Query(ThumbnailFormat.JPEG, description=THUMBNAIL_FORMAT_DESCRIPTION),
+    if_none_match: str | None = Header(default=None, description=IF_NONE_MATCH_DESCRIPTION),
+    upload_service: UploadService = Depends(get_upload_service),
+    thumbnail_service: ThumbnailService = Depends(get_thumbnail_service),
+):
+    upload_service.get_metadata(upload_id)
+    spec = ThumbnailSpec(size=size, format=format)
+    etag = _thumbnail_etag(upload_id, spec)
+    if etag_matches(if_none_match, etag):
+        return NotModifiedResponse(etag=etag)
+
+    thumbnail = await run_in_threadpool(thumbnail_service.peek, upload_id, spec)
+    if thumbnail is None and thumbnail_service.is_known_invalid(upload_id):
+        # Same answer as GET, which fails from the negative cache.
+        raise HTTPException(status_code=422, detail=InvalidImageException().detail)
+    return ImageHeadResponse(
+        media_type=spec.content_type,
+        etag=etag,
+        content_length=len(thumbnail.content) if thumbnail is not None else None,
+    )
 
 
 @upload_router.delete(
@@ -205,27 +387,97 @@ async def get_upload_tags(
     return UploadWithTagsResponse.from_upload_with_tags(result)
 
 
+@upload_router.get(
+    "/{upload_id}/similar",
+    summary="Find similar uploads",
+    description="Find near-duplicates of an upload, such as re-encoded or resized copies, "
+    "by the Hamming distance of their perceptual hashes. Closest first. Empty until the "
+    "upload's hash has been computed after ingest.",
+    response_model=list[SimilarUploadResponse],
+    status_code=200,
+    responses={
+        200: {"description": "Similar uploads with their distance"},
+        **NOT_FOUND_RESPONSES,
+    },
+)
+async def get_similar_uploads(
+    upload_id: UploadID,
+    max_distance: int = Query(
+        6,
+        ge=0,
+        le=MAX_SEARCH_DISTANCE,
+        description="Maximum number of differing bits out of 64",
+    ),
+    limit: int = Query(10, ge=1, le=100, description="Maximum number of items to return"),
+    upload_service: UploadService = Depends(get_upload_service),
+    _login_valid: None = Depends(check_login_valid),
+):
+    matches = upload_service.find_similar(upload_id, max_distance=max_distance, limit=limit)
+    return [
+        SimilarUploadResponse(upload_id=match.metadata.upload_id, distance=match.distance)
+        for match in matches
+    ]
+
+
 @upload_router.get(
     "",
     summary="List uploads",
     description="Get a list of uploads in descending order of upload time. "
-    "Optionally filter by tags (AND logic).",
+    "Optionally filter by tags: all of `tags`, at least one of `any_tags` and none of "
+    "`exclude_tags`. A full page carries an `X-Next-Cursor` "
+    "header; pass it as `cursor` to fetch the next page.",
     response_model=list[UploadWithTagsResponse],
     status_code=200,
     responses={
         200: {
             "description": "List of uploads with tags and metadata",
-        }
+            "headers": {
+                "X-Next-Cursor": {
+                    "description": "Cursor of the next page; absent on the last page",
+                    "schema": {"type": "string"},
+                }
+            },
+        },
+        400: {"description": "Invalid cursor", "model": ErrorResponse},
     },
 )
 async def list_uploads(
+    response: Response,
     tags: list[TagName] = Query(default=[], description="Filter by tags (AND logic)"),
+    any_tags: list[TagName] = Query(
+        default=[], description="Only uploads with at least one of these tags (OR logic)"
+    ),
+    exclude_tags: list[TagName] = Query(
+        default=[], description="Leave out uploads with any of these tags"
+    ),
     offset: int = Query(0, ge=0, description="Number of items to skip"),
     limit: int = Query(10, ge=1, le=100, description="Maximum number of items to return"),
+    cursor: str | None = Query(
+        None,
+        description="`X-Next-Cursor` of the previous page. Unlike `offset`, deep pages are "
+        "as fast as the first and do not shift when new uploads arrive.",
+    ),
     tag_service: TagService = Depends(get_tag_service),
     _login_valid: None = Depends(check_login_valid),
 ):
-    results = tag_service.list_with_tags(tag_names=tags, offset=offset, limit=limit)
+    if cursor is not None and offset:
+        raise HTTPException(status_code=400, detail="Use either offset or cursor")
+    try:
+        after = decode_cursor(cursor) if cursor is not None else None
+    except InvalidCursorException as exc:
+        raise HTTPException(status_code=400, detail=exc.detail)
+
+    results = tag_service.list_with_tags(
+        tag_names=tags,
+        offset=offset,
+        limit=limit,
+        after=after,
+        any_tags=any_tags,
+        exclude_tags=exclude_tags,
+    )
+    if len(results) == limit:
+        last = results[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor((last.created_at, last.pk))
     return [UploadWithTagsResponse.from_upload_with_tags(r) for r in results]
 
 
@@ -235,8 +487,10 @@ tag_router = APIRouter(prefix="/tags", tags=["Tags"])
 @tag_router.get(
     "",
     summary="List all tags",
-    description="Get a list of all tag names",
+    description="Get a list of all tag names. With `with_counts`, also the number of "
+    "uploads carrying each tag.",
     response_model=TagListResponse,
+    response_model_exclude_none=True,
     status_code=200,
     responses={
         200: {"description": "List of all tags"},
@@ -245,8 +499,41 @@ tag_router = APIRouter(prefix="/tags", tags=["Tags"])
 async def list_all_tags(
     offset: int = Query(0, ge=0, description="Number of items to skip"),
     limit: int = Query(50, ge=1, le=50, description="Maximum number of items to return"),
+    with_counts: bool = Query(False, description="Include the number of uploads per tag"),
     tag_service: TagService = Depends(get_tag_service),
     _login_valid: None = Depends(check_login_valid),
 ):
+    if with_counts:
+        counts = tag_service.list_tag_counts(offset=offset, limit=limit)
+        return TagListResponse(tags=list(counts), counts=counts)
     tags = tag_service.list_all_tags(offset=offset, limit=limit)
     return TagListResponse(tags=tags)
+
+
+@tag_router.get(
+    "/facets",
+    summary="Count tags of matching uploads",
+    description="Get the number of uploads per tag among the uploads `GET /uploads` returns "
+    "for the same `tags`, `any_tags` and `exclude_tags`, most frequent first.",
+    response_model=TagFacetsResponse,
+    status_code=200,
+    responses={
+        200: {"description": "Upload counts per tag"},
+    },
+)
+async def get_tag_facets(
+    tags: list[TagName] = Query(default=[], description="Filter by tags (AND logic)"),
+    any_tags: list[TagName] = Query(
+        default=[], description="Only uploads with at least one of these tags (OR logic)"
+    ),
+    exclude_tags: list[TagName] = Query(
+        default=[], description="Leave out uploads with any of these tags"
+    ),
+    limit: int = Query(50, ge=1, le=50, description="Maximum number of tags to return"),
+    tag_service: TagService = Depends(get_tag_service),
+    _login_valid: None = Depends(check_login_valid),
+):
+    facets = tag_service.facet_counts(
+        tag_names=tags, any_tags=any_tags, exclude_tags=exclude_tags, limit=limit
+    )
+    return TagFacetsResponse(facets=facets)
@@ -39,6 +39,11 @@ class UploadWithTagsResponse(BaseModel):
     tags: list[TagName]
     created_at: datetime.datetime
     content_type: str
+    width: int | None = None
+    height: int | None = None
+    byte_size: int | None = None
+    image_format: str | None = None
+    blurhash: str | None = None
 
     @classmethod
     def from_upload_with_tags(cls, uwt: UploadWithTags) -> UploadWithTagsResponse:
@@ -47,8 +52,46 @@ class UploadWithTagsResponse(BaseModel):
             tags=uwt.tags,
             created_at=uwt.created_at,
             content_type=uwt.content_type,
+            width=uwt.width,
+            height=uwt.height,
+            byte_size=uwt.byte_size,
+            image_format=uwt.image_format,
+            blurhash=uwt.blurhash,
         )
 
 
+class SimilarUploadResponse(BaseModel):
+    upload_id: UploadID
+    distance: int
+
+
 class TagListResponse(BaseModel):
     tags: list[TagName]
+    counts: dict[TagName, int] | None = None
+
+
+class TagFacetsResponse(BaseModel):
+    facets: dict[TagName, int]
+
+
+class ThumbnailCacheStatsResponse(BaseModel):
+    current_bytes: int
+    max_bytes: int
+    entries: int
+    hits: int
+    misses: int
+    evictions: int
+
+
+class WorkerPoolStatsResponse(BaseModel):
+    workers: int
+    queued: int
+    max_queue: int
+    completed: int
+    failed: int
+    dropped: int
+
+
+class StatsResponse(BaseModel):
+    thumbnail_cache: ThumbnailCacheStatsResponse
+    ingest_queue: WorkerPoolStatsResponse
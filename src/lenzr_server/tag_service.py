@@ -1,15 +1,23 @@
 import datetime
+import uuid
 from dataclasses import dataclass
 
 import sqlalchemy as sa
 import sqlalchemy.exc
+from sqlalchemy.orm import aliased
 from sqlmodel import Session, col, select
 
 from lenzr_server.exceptions import NotFoundException
 from lenzr_server.models.tags import Tag, UploadTag
 from lenzr_server.models.uploads import UploadMetaData
+from lenzr_server.pagination import ListPosition, uploads_after
 from lenzr_server.types import TagName, UploadID
 
+# Tags on at most this many uploads (in total, for ``any_tags``) drive a
+# tag-filtered listing from their own uploads; more common tags are checked
+# per upload instead.
+SELECTIVE_TAG_MAX_UPLOADS = 5_000
+
 
 class TagUploadNotFoundException(NotFoundException):
     def __init__(self):
@@ -22,14 +30,40 @@ class UploadWithTags:
     tags: list[TagName]
     created_at: datetime.datetime
     content_type: str
+    width: int | None = None
+    height: int | None = None
+    byte_size: int | None = None
+    image_format: str | None = None
+    blurhash: str | None = None
+    pk: uuid.UUID | None = None
+
+    @classmethod
+    def from_metadata(cls, upload: UploadMetaData, tags: list[TagName]) -> "UploadWithTags":
+        return cls(
+            upload_id=upload.upload_id,
+            tags=tags,
+            created_at=upload.created_at,
+            content_type=upload.content_type,
+            width=upload.width,
+            height=upload.height,
+            byte_size=upload.byte_size,
+            image_format=upload.image_format,
+            blurhash=upload.blurhash,
+            pk=upload.pk,
+        )
 
 
 class TagService:
     def __init__(self, database_session: Session):
         self._database_session = database_session
 
-    def _get_upload(self, upload_id: UploadID) -> UploadMetaData:
+    def _get_upload(self, upload_id: UploadID, for_update: bool = False) -> UploadMetaData:
         query = select(UploadMetaData).where(col(UploadMetaData.upload_id) == upload_id)
+        if for_update:
+            # Serialises tag writes per upload until commit, so the tags a
+            # writer detaches are the committed ones. SQLite ignores the
+            # clause; it allows only one writer at a time anyway.
+            query = query.with_for_update()
         try:
             return self._database_session.exec(query).one()
         except sqlalchemy.exc.NoResultFound:
@@ -57,30 +91,55 @@ class TagService:
         return tag_map
 
     def set_tags(self, upload_id: UploadID, tag_names: list[TagName]) -> list[TagName]:
-        upload = self._get_upload(upload_id)
-        upload_pk = upload.pk
-
-        self._database_session.exec(
-            sa.delete(UploadTag).where(col(UploadTag.upload_pk) == upload_pk)
-        )
+        upload_pk = self._get_upload(upload_id, for_update=True).pk
+        old_tag_pks = self._detach_tags(upload_pk)
 
         unique_names = list(dict.fromkeys(tag_names))
         tag_map = self._get_or_create_tags(unique_names)
         for name in unique_names:
             self._database_session.add(UploadTag(upload_pk=upload_pk, tag_pk=tag_map[name].pk))
 
+        new_tag_pks = {tag.pk for tag in tag_map.values()}
         self._database_session.flush()
+        deltas = dict.fromkeys(old_tag_pks - new_tag_pks, -1)
+        deltas.update(dict.fromkeys(new_tag_pks - old_tag_pks, 1))
+        self._adjust_upload_counts(deltas)
         return unique_names
 
+    def detach_all(self, upload_id: UploadID) -> None:
+        """Remove all tags from ``upload_id``; ``UploadService.delete_upload`` calls this."""
+        upload_pk = self._get_upload(upload_id, for_update=True).pk
+        self._adjust_upload_counts(dict.fromkeys(self._detach_tags(upload_pk), -1))
+
+    def _detach_tags(self, upload_pk: uuid.UUID) -> set[uuid.UUID]:
+        """Delete the upload's tag links, returning the tag PKs actually removed."""
+        result = self._database_session.exec(
+            sa.delete(UploadTag)
+            .where(col(UploadTag.upload_pk) == upload_pk)
+            .returning(UploadTag.tag_pk)
+        )
+        return set(result.scalars().all())
+
+    def _adjust_upload_counts(self, deltas: dict[uuid.UUID, int]) -> None:
+        """Add ``deltas[tag_pk]`` to each tag's ``upload_count`` in the current transaction.
+
+        ``deltas`` must come from links changed under the upload's row lock,
+        so two writers never both apply the same change. All tags are updated
+        in one statement: two statements would lock the decremented and the
+        incremented tags in separate steps, and writers swapping the same two
+        tags on different uploads could deadlock.
+        """
+        if not deltas:
+            return
+        self._database_session.exec(
+            sa.update(Tag)
+            .where(col(Tag.pk).in_(deltas))
+            .values(upload_count=col(Tag.upload_count) + sa.case(deltas, value=col(Tag.pk)))
+        )
+
     def get_upload_with_tags(self, upload_id: UploadID) -> UploadWithTags:
         upload = self._get_upload(upload_id)
-        tags = self._get_tags_by_upload_pk(upload.pk)
-        return UploadWithTags(
-            upload_id=upload.upload_id,
-            tags=tags,
-            created_at=upload.created_at,
-            content_type=upload.content_type,
-        )
+        return UploadWithTags.from_metadata(upload, self._get_tags_by_upload_pk(upload.pk))
 
     def get_tags(self, upload_id: UploadID) -> list[TagName]:
         upload = self._get_upload(upload_id)
@@ -101,12 +160,7 @@ class TagService:
             tags_by_pk.setdefault(upload_pk, []).append(tag_name)
 
         return [
-            UploadWithTags(
-                upload_id=upload.upload_id,
-                tags=tags_by_pk.get(upload.pk, []),
-                created_at=upload.created_at,
-                content_type=upload.content_type,
-            )
+            UploadWithTags.from_metadata(upload, tags_by_pk.get(upload.pk, []))
             for upload in uploads
         ]
 
@@ -115,24 +169,172 @@ class TagService:
         tag_names: list[TagName] | None = None,
         offset: int = 0,
         limit: int = 10,
+        after: ListPosition | None = None,
+        any_tags: list[TagName] | None = None,
+        exclude_tags: list[TagName] | None = None,
     ) -> list[UploadWithTags]:
-        query = select(UploadMetaData)
+        """Return uploads newest first, filtered by tags.
 
-        if tag_names:
-            unique_names = list(dict.fromkeys(tag_names))
-            # AND logic: only uploads that have ALL requested tags
-            query = (
-                query.join(UploadTag, col(UploadTag.upload_pk) == UploadMetaData.pk)
-                .join(Tag, col(Tag.pk) == UploadTag.tag_pk)
-                .where(col(Tag.name).in_(unique_names))
-                .group_by(col(UploadMetaData.pk))
-                .having(sa.func.count(sa.distinct(col(Tag.name))) == len(unique_names))
-            )
+        Uploads must have all of ``tag_names``, at least one of ``any_tags``
+        and none of ``exclude_tags``; empty lists do not filter. ``after`` is
+        the position of the last upload of the previous page; unlike
+        ``offset`` its cost does not grow with the page number.
+        """
+        query = self._filtered_uploads(select(UploadMetaData), tag_names, any_tags, exclude_tags)
+        if query is None:
+            return []
+        if after is not None:
+            query = query.where(uploads_after(after))
 
-        query = query.order_by(col(UploadMetaData.created_at).desc()).offset(offset).limit(limit)
+        query = (
+            query.order_by(col(UploadMetaData.created_at).desc(), col(UploadMetaData.pk).desc())
+            .offset(offset)
+            .limit(limit)
+        )
         uploads = list(self._database_session.exec(query).all())
         return self._to_uploads_with_tags(uploads)
 
+    def facet_counts(
+        self,
+        tag_names: list[TagName] | None = None,
+        any_tags: list[TagName] | None = None,
+        exclude_tags: list[TagName] | None = None,
+        limit: int = 50,
+    ) -> dict[TagName, int]:
+        """Count the uploads per tag among those matching the filters, most frequent first.
+
+        Without filters the maintained ``Tag.upload_count`` answers in
+        O(tags); otherwise only the tags of the matching uploads are counted.
+        """
+        if not (tag_names or any_tags or exclude_tags):
+            rows = self._database_session.exec(
+                select(Tag.name, Tag.upload_count)
+                .where(col(Tag.upload_count) > 0)
+                .order_by(col(Tag.upload_count).desc(), Tag.name)
+                .limit(limit)
+            ).all()
+            return dict(rows)
+
+        matching = self._filtered_uploads(
+            select(UploadMetaData.pk), tag_names, any_tags, exclude_tags
+        )
+        if matching is None:
+            return {}
+        upload_count = sa.func.count().label("upload_count")
+        rows = self._database_session.exec(
+            select(Tag.name, upload_count)
+            .join(UploadTag, col(UploadTag.tag_pk) == Tag.pk)
+            .where(col(UploadTag.upload_pk).in_(matching))
+            .group_by(Tag.name)
+            .order_by(upload_count.desc(), Tag.name)
+            .limit(limit)
+        ).all()
+        return dict(rows)
+
+    def _filtered_uploads(
+        self,
+        query,
+        tag_names: list[TagName] | None,
+        any_tags: list[TagName] | None,
+        exclude_tags: list[TagName] | None,
+    ):
+        """Restrict an upload ``query`` to the tag filters; None if nothing can match."""
+        tag_counts = []
+        if tag_names:
+            tag_counts = self._tag_counts_by_selectivity(list(dict.fromkeys(tag_names)))
+            if not tag_counts:
+                return None
+            query = self._filter_all_tags(query, tag_counts)
+
+        if any_tags:
+            any_tag_counts = self._resolve_tag_counts(any_tags)
+            if not any_tag_counts:
+                return None
+            any_tag_pks = [tag_pk for tag_pk, _ in any_tag_counts]
+            # Without an AND tag, a rare enough set of tags drives the query
+            # through their uploads; otherwise each upload is probed.
+            drive = (
+                not tag_counts
+                and sum(count for _, count in any_tag_counts) <= SELECTIVE_TAG_MAX_UPLOADS
+            )
+            query = query.where(self._has_any_tag(any_tag_pks, correlated=not drive))
+
+        if exclude_tags:
+            exclude_tag_pks = [tag_pk for tag_pk, _ in self._resolve_tag_counts(exclude_tags)]
+            if exclude_tag_pks:
+                query = query.where(~self._has_any_tag(exclude_tag_pks, correlated=True))
+        return query
+
+    def _tag_counts_by_selectivity(self, names: list[TagName]) -> list[tuple[uuid.UUID, int]]:
+        """Resolve ``names`` to ``(tag_pk, upload count)``, rarest first.
+
+        Empty if any of the tags does not exist, since then nothing can match.
+        """
+        tag_counts = self._resolve_tag_counts(names)
+        if len(tag_counts) < len(names):
+            return []
+        return tag_counts
+
+    def _resolve_tag_counts(self, names: list[TagName]) -> list[tuple[uuid.UUID, int]]:
+        """``(tag_pk, upload count)`` of those of ``names`` that exist, rarest first.
+
+        The counts are the maintained ``Tag.upload_count``, read in the same
+        query, so ranking costs no scan of ``uploadtag``.
+        """
+        query = (
+            select(Tag.pk, Tag.upload_count)
+            .where(col(Tag.name).in_(set(names)))
+            .order_by(Tag.upload_count)
+        )
+        return [(tag_pk, count) for tag_pk, count in self._database_session.exec(query).all()]
+
+    @staticmethod
+    def _has_any_tag(tag_pks: list[uuid.UUID], correlated: bool) -> sa.ColumnElement[bool]:
+        """Uploads carrying at least one of ``tag_pks``.
+
+        ``correlated`` probes the primary key of ``uploadtag`` for each upload
+        (EXISTS); otherwise the tags' uploads are looked up once through
+        ``ix_uploadtag_tag_pk_upload_pk`` (IN).
+        """
+        tagged = aliased(UploadTag)
+        if correlated:
+            return sa.exists().where(
+                col(tagged.upload_pk) == UploadMetaData.pk, col(tagged.tag_pk).in_(tag_pks)
+            )
+        return col(UploadMetaData.pk).in_(
+            select(tagged.upload_pk).where(col(tagged.tag_pk).in_(tag_pks))
+        )
+
+    def _filter_all_tags(self, query, tag_counts: list[tuple[uuid.UUID, int]]):
+        # AND logic. If the rarest tag is selective, its uploads drive the
+        # query and are checked for the other tags. Otherwise every tag is
+        # common, and walking the newest uploads finds a page quickly. The
+        # EXISTS checks are listed rarest first so most rows fail early.
+        tag_pks = [tag_pk for tag_pk, _ in tag_counts]
+        rarest_pk, rarest_count = tag_counts[0]
+        if rarest_count <= SELECTIVE_TAG_MAX_UPLOADS:
+            driving = aliased(UploadTag)
+            query = query.join(
+                driving,
+                sa.and_(
+                    col(driving.upload_pk) == UploadMetaData.pk, col(driving.tag_pk) == rarest_pk
+                ),
+            )
+            tag_pks = tag_pks[1:]
+        for tag_pk in tag_pks:
+            tagged = aliased(UploadTag)
+            query = query.where(
+                sa.exists().where(
+                    col(tagged.upload_pk) == UploadMetaData.pk, col(tagged.tag_pk) == tag_pk
+                )
+            )
+        return query
+
     def list_all_tags(self, offset: int = 0, limit: int = 100) -> list[TagName]:
         query = select(Tag.name).order_by(Tag.name).offset(offset).limit(limit)
         return list(self._database_session.exec(query).all())
+
+    def list_tag_counts(self, offset: int = 0, limit: int = 100) -> dict[TagName, int]:
+        """Return tag names with the number of uploads carrying them, ordered by name."""
+        query = select(Tag.name, Tag.upload_count).order_by(Tag.name).offset(offset).limit(limit)
+        return dict(self._database_session.exec(query).all())
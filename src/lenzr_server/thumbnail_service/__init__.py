@@ -1,21 +1,42 @@
+from lenzr_server.thumbnail_service.factory import thumbnail_service_from_env
 from lenzr_server.thumbnail_service.in_memory import (
-    MAX_CACHE_SIZE,
-    MAX_DIMENSION,
+    MAX_CACHE_BYTES,
     InMemoryThumbnailCache,
     InMemoryThumbnailService,
+    InvalidImageCache,
+    ThumbnailRenderer,
+    render_thumbnail,
 )
+from lenzr_server.thumbnail_service.on_disk import OnDiskThumbnailService, OnDiskThumbnailStore
+from lenzr_server.thumbnail_service.process_pool import ProcessPoolThumbnailRenderer
 from lenzr_server.thumbnail_service.protocol import (
+    DEFAULT_THUMBNAIL_SPEC,
     InvalidImageException,
     Thumbnail,
+    ThumbnailCacheStats,
+    ThumbnailFormat,
     ThumbnailService,
+    ThumbnailSize,
+    ThumbnailSpec,
 )
 
 __all__ = [
-    "MAX_CACHE_SIZE",
-    "MAX_DIMENSION",
+    "DEFAULT_THUMBNAIL_SPEC",
+    "MAX_CACHE_BYTES",
     "InMemoryThumbnailCache",
     "InMemoryThumbnailService",
+    "InvalidImageCache",
     "InvalidImageException",
+    "OnDiskThumbnailService",
+    "OnDiskThumbnailStore",
+    "ProcessPoolThumbnailRenderer",
     "Thumbnail",
+    "ThumbnailCacheStats",
+    "ThumbnailFormat",
+    "ThumbnailRenderer",
     "ThumbnailService",
+    "ThumbnailSize",
+    "ThumbnailSpec",
+    "render_thumbnail",
+    "thumbnail_service_from_env",
 ]
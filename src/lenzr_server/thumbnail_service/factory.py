@@ -0,0 +1,42 @@
+import os
+import pathlib
+from collections.abc import Generator
+from contextlib import contextmanager
+
+from lenzr_server.thumbnail_service.in_memory import MAX_CACHE_BYTES, InMemoryThumbnailCache
+from lenzr_server.thumbnail_service.on_disk import OnDiskThumbnailService, OnDiskThumbnailStore
+from lenzr_server.thumbnail_service.process_pool import ProcessPoolThumbnailRenderer
+from lenzr_server.thumbnail_service.protocol import ThumbnailService
+
+DEFAULT_THUMBNAIL_DIRECTORY = ".thumbnails"
+
+
+def get_thumbnail_storage_path() -> pathlib.Path:
+    storage_path = os.getenv("THUMBNAIL_STORAGE_PATH")
+    if storage_path:
+        return pathlib.Path(storage_path)
+    return pathlib.Path(os.environ["UPLOAD_STORAGE_PATH"]) / DEFAULT_THUMBNAIL_DIRECTORY
+
+
+def get_thumbnail_cache_max_bytes() -> int:
+    return int(os.environ.get("THUMBNAIL_CACHE_MAX_BYTES", MAX_CACHE_BYTES))
+
+
+def get_thumbnail_workers() -> int:
+    return int(os.environ.get("THUMBNAIL_WORKERS", 0))
+
+
+@contextmanager
+def thumbnail_service_from_env() -> Generator[ThumbnailService, None, None]:
+    store = OnDiskThumbnailStore(get_thumbnail_storage_path())
+    cache = InMemoryThumbnailCache(max_bytes=get_thumbnail_cache_max_bytes())
+    workers = get_thumbnail_workers()
+    if workers <= 0:
+        yield OnDiskThumbnailService(cache=cache, store=store)
+        return
+
+    renderer = ProcessPoolThumbnailRenderer(max_workers=workers)
+    try:
+        yield OnDiskThumbnailService(cache=cache, store=store, renderer=renderer)
+    finally:
+        renderer.shutdown()
@@ -1,71 +1,315 @@
 import io
+import sys
 import threading
+import time
 from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import Future
+from dataclasses import dataclass, field
 
 from PIL import Image, UnidentifiedImageError
 
-from lenzr_server.thumbnail_service.protocol import InvalidImageException, Thumbnail
+from lenzr_server.image_probe import exceeds_pixel_limit, get_max_image_pixels
+from lenzr_server.thumbnail_service.protocol import (
+    DEFAULT_THUMBNAIL_SPEC,
+    InvalidImageException,
+    Thumbnail,
+    ThumbnailCacheStats,
+    ThumbnailFormat,
+    ThumbnailSpec,
+)
 from lenzr_server.types import UploadID
 
-MAX_CACHE_SIZE = 1000
-MAX_DIMENSION = 200
-THUMBNAIL_CONTENT_TYPE = "image/jpeg"
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+MAX_INVALID_ENTRIES = 10_000
+# Undecodable uploads are retried after this long, e.g. once a newer Pillow
+# or an additional format plugin is deployed.
+INVALID_IMAGE_TTL_SECONDS = 60 * 60
+# Decode and integer-reduce to at least this multiple of the target size
+# before the final resample, which keeps the result visually identical.
+REDUCING_GAP = 2.0
+
+_PILLOW_FORMATS = {
+    ThumbnailFormat.JPEG: "JPEG",
+    ThumbnailFormat.WEBP: "WEBP",
+    ThumbnailFormat.PNG: "PNG",
+}
+
+
+def render_thumbnail(content: bytes, spec: ThumbnailSpec) -> bytes:
+    size = (int(spec.size), int(spec.size))
+    try:
+        image = Image.open(io.BytesIO(content))
+        # open() only parsed the header; refuse oversized images before
+        # any pixel data is decoded.
+        if exceeds_pixel_limit(image.width, image.height, get_max_image_pixels()):
+            raise InvalidImageException("Image exceeds the pixel limit")
+        if image.format == "JPEG":
+            # Let libjpeg decode at 1/2, 1/4 or 1/8 scale (DCT scaling) so
+            # a 24 MP photo is never materialised at full resolution.
+            draft_size = (int(size[0] * REDUCING_GAP), int(size[1] * REDUCING_GAP))
+            image.draft("RGB", draft_size)
+        # Other formats decode fully; thumbnail() still reduce()s by an
+        # integer factor before the final resample.
+        image.thumbnail(size, reducing_gap=REDUCING_GAP)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as exc:
+        raise InvalidImageException() from exc
+
+    if spec.format == ThumbnailFormat.JPEG:
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA"):
+        # WebP and PNG keep transparency; palette and grayscale sources are
+        # normalised so every variant has the same colours.
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    output = io.BytesIO()
+    image.save(output, format=_PILLOW_FORMATS[spec.format])
+    return output.getvalue()
+
+
+# Takes the original image and the variant to produce, returns its bytes.
+ThumbnailRenderer = Callable[[bytes, ThumbnailSpec], bytes]
+
+_CacheKey = tuple[UploadID, ThumbnailSpec]
+
+
+def _entry_size(key: _CacheKey, value: bytes) -> int:
+    # Count the Python objects, not just the payload, so the budget reflects
+    # what the worker actually holds.
+    return sys.getsizeof(key) + sys.getsizeof(key[0]) + sys.getsizeof(value)
 
 
 class InMemoryThumbnailCache:
-    def __init__(self, max_size: int = MAX_CACHE_SIZE):
-        self._entries: OrderedDict[UploadID, bytes] = OrderedDict()
-        self._max_size = max_size
+    """LRU cache bounded by the total size of its entries in bytes.
+
+    Entries are keyed by upload and variant; ``evict`` drops every variant.
+    """
+
+    def __init__(self, max_bytes: int = MAX_CACHE_BYTES):
+        self._entries: OrderedDict[_CacheKey, bytes] = OrderedDict()
+        self._specs: dict[UploadID, set[ThumbnailSpec]] = {}
+        self._max_bytes = max_bytes
+        self._current_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
         self._lock = threading.Lock()
 
-    def get(self, upload_id: UploadID) -> bytes | None:
+    def get(
+        self, upload_id: UploadID, spec: ThumbnailSpec = DEFAULT_THUMBNAIL_SPEC
+    ) -> bytes | None:
+        key = (upload_id, spec)
         with self._lock:
-            if upload_id not in self._entries:
+            if key not in self._entries:
+                self._misses += 1
                 return None
-            self._entries.move_to_end(upload_id)
-            return self._entries[upload_id]
+            self._hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
 
-    def set(self, upload_id: UploadID, value: bytes) -> None:
+    def set(
+        self, upload_id: UploadID, value: bytes, spec: ThumbnailSpec = DEFAULT_THUMBNAIL_SPEC
+    ) -> None:
+        key = (upload_id, spec)
+        size = _entry_size(key, value)
         with self._lock:
-            self._entries[upload_id] = value
-            self._entries.move_to_end(upload_id)
-            if len(self._entries) > self._max_size:
-                self._entries.popitem(last=False)
+            self._remove(key)
+            if size > self._max_bytes:
+                return
+            self._entries[key] = value
+            self._specs.setdefault(upload_id, set()).add(spec)
+            self._current_bytes += size
+            while self._current_bytes > self._max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
 
     def evict(self, upload_id: UploadID) -> None:
         with self._lock:
-            self._entries.pop(upload_id, None)
+            for spec in list(self._specs.get(upload_id, ())):
+                self._remove((upload_id, spec))
+
+    def stats(self) -> ThumbnailCacheStats:
+        with self._lock:
+            return ThumbnailCacheStats(
+                current_bytes=self._current_bytes,
+                max_bytes=self._max_bytes,
+                entries=len(self._entries),
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+            )
+
+    def _remove(self, key: _CacheKey) -> None:
+        value = self._entries.pop(key, None)
+        if value is None:
+            return
+        self._current_bytes -= _entry_size(key, value)
+        upload_id, spec = key
+        specs = self._specs[upload_id]
+        specs.discard(spec)
+        if not specs:
+            del self._specs[upload_id]
+
+
+class InvalidImageCache:
+    """Bounded set of upload IDs known to be undecodable, with a TTL."""
+
+    def __init__(
+        self,
+        max_entries: int = MAX_INVALID_ENTRIES,
+        ttl_seconds: float = INVALID_IMAGE_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._expiries: OrderedDict[UploadID, float] = OrderedDict()
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def __contains__(self, upload_id: UploadID) -> bool:
+        with self._lock:
+            expiry = self._expiries.get(upload_id)
+            if expiry is None:
+                return False
+            if expiry <= self._clock():
+                del self._expiries[upload_id]
+                return False
+            return True
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._expiries)
+
+    def add(self, upload_id: UploadID) -> None:
+        with self._lock:
+            self._expiries.pop(upload_id, None)
+            # Insertion order equals expiry order, so the oldest entry is the
+            # first to expire and the one to drop when full.
+            self._expiries[upload_id] = self._clock() + self._ttl_seconds
+            while len(self._expiries) > self._max_entries:
+                self._expiries.popitem(last=False)
+
+    def discard(self, upload_id: UploadID) -> None:
+        with self._lock:
+            self._expiries.pop(upload_id, None)
+
+
+@dataclass
+class _InFlight:
+    future: Future[bytes] = field(default_factory=Future)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    evicted: bool = False
 
 
 class InMemoryThumbnailService:
-    def __init__(self, cache: InMemoryThumbnailCache, max_dimension: int = MAX_DIMENSION):
+    def __init__(
+        self,
+        cache: InMemoryThumbnailCache,
+        renderer: ThumbnailRenderer = render_thumbnail,
+        invalid_images: InvalidImageCache | None = None,
+    ):
         self._cache = cache
-        self._max_dimension = max_dimension
-
-    def get_thumbnail(self, upload_id: UploadID, content: bytes) -> Thumbnail:
-        # Concurrent misses for the same id regenerate independently, and a
-        # concurrent evict may race with the trailing cache.set. Both are
-        # acceptable here since the route deletes metadata before evicting,
-        # so a stale entry is never served.
-        cached = self._cache.get(upload_id)
+        self._renderer = renderer
+        self._invalid_images = invalid_images if invalid_images is not None else InvalidImageCache()
+        self._in_flight: dict[_CacheKey, _InFlight] = {}
+        self._in_flight_lock = threading.Lock()
+
+    def get_thumbnail(
+        self,
+        upload_id: UploadID,
+        load_content: Callable[[], bytes],
+        spec: ThumbnailSpec = DEFAULT_THUMBNAIL_SPEC,
+    ) -> Thumbnail:
+        cached = self._lookup(upload_id, spec)
+        if cached is None:
+            if upload_id in self._invalid_images:
+                # Known to be undecodable: fail without reading the original.
+                raise InvalidImageException()
+            cached = self._generate_once(upload_id, spec, load_content)
+        return Thumbnail(content=cached, content_type=spec.content_type)
+
+    def peek(
+        self, upload_id: UploadID, spec: ThumbnailSpec = DEFAULT_THUMBNAIL_SPEC
+    ) -> Thumbnail | None:
+        cached = self._lookup(upload_id, spec)
         if cached is None:
-            cached = self._generate_thumbnail(content)
-            self._cache.set(upload_id, cached)
-        return Thumbnail(content=cached, content_type=THUMBNAIL_CONTENT_TYPE)
+            return None
+        return Thumbnail(content=cached, content_type=spec.content_type)
+
+    def is_known_invalid(self, upload_id: UploadID) -> bool:
+        return upload_id in self._invalid_images
 
     def evict(self, upload_id: UploadID) -> None:
+        self._cancel_store(upload_id)
+        self._invalid_images.discard(upload_id)
         self._cache.evict(upload_id)
 
-    def _generate_thumbnail(self, content: bytes) -> bytes:
-        try:
-            image = Image.open(io.BytesIO(content))
-            image.thumbnail((self._max_dimension, self._max_dimension))
-        except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as exc:
-            raise InvalidImageException() from exc
+    def stats(self) -> ThumbnailCacheStats:
+        return self._cache.stats()
 
-        if image.mode != "RGB":
-            image = image.convert("RGB")
+    def _cancel_store(self, upload_id: UploadID) -> None:
+        with self._in_flight_lock:
+            in_flight = [
+                flight
+                for (flight_id, _), flight in self._in_flight.items()
+                if flight_id == upload_id
+            ]
+        for flight in in_flight:
+            # Waits for a store that is already underway, which the caller's
+            # subsequent eviction then removes.
+            with flight.lock:
+                flight.evicted = True
+
+    def _lookup(self, upload_id: UploadID, spec: ThumbnailSpec) -> bytes | None:
+        return self._cache.get(upload_id, spec)
 
-        output = io.BytesIO()
-        image.save(output, format="JPEG")
-        return output.getvalue()
+    def _store(self, upload_id: UploadID, spec: ThumbnailSpec, thumbnail: bytes) -> None:
+        self._cache.set(upload_id, thumbnail, spec)
+
+    def _generate_once(
+        self, upload_id: UploadID, spec: ThumbnailSpec, load_content: Callable[[], bytes]
+    ) -> bytes:
+        # Concurrent misses for the same variant share one generation: the
+        # first caller renders, the others wait for its result (or exception).
+        key = (upload_id, spec)
+        with self._in_flight_lock:
+            in_flight = self._in_flight.get(key)
+            is_leader = in_flight is None
+            if in_flight is None:
+                in_flight = self._in_flight[key] = _InFlight()
+        if not is_leader:
+            return in_flight.future.result()
+
+        try:
+            # A previous leader may have stored the entry between our miss and
+            # registering this flight.
+            thumbnail = self._lookup(upload_id, spec)
+            if thumbnail is None:
+                thumbnail = self._render(upload_id, spec, load_content(), in_flight)
+                with in_flight.lock:
+                    # An evict() issued while rendering must not be undone by
+                    # storing the result afterwards.
+                    if not in_flight.evicted:
+                        self._store(upload_id, spec, thumbnail)
+        except BaseException as exc:
+            in_flight.future.set_exception(exc)
+            raise
+        else:
+            in_flight.future.set_result(thumbnail)
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+        return thumbnail
+
+    def _render(
+        self, upload_id: UploadID, spec: ThumbnailSpec, content: bytes, in_flight: _InFlight
+    ) -> bytes:
+        try:
+            return self._renderer(content, spec)
+        except InvalidImageException:
+            with in_flight.lock:
+                if not in_flight.evicted:
+                    self._invalid_images.add(upload_id)
+            raise
@@ -0,0 +1,99 @@
+import os
+import pathlib
+import shutil
+import tempfile
+
+from lenzr_server.file_storages.on_disk_file_storage import DEFAULT_FILE_MODE
+from lenzr_server.thumbnail_service.in_memory import (
+    InMemoryThumbnailCache,
+    InMemoryThumbnailService,
+    InvalidImageCache,
+    ThumbnailRenderer,
+    render_thumbnail,
+)
+from lenzr_server.thumbnail_service.protocol import ThumbnailSpec
+from lenzr_server.types import UploadID
+
+THUMBNAIL_STAGING_PREFIX = ".staging-"
+
+
+class OnDiskThumbnailStore:
+    """Thumbnails stored as ``<base>/<id[:2]>/<upload_id>/<variant>``.
+
+    Upload IDs are content hashes, so an entry never goes stale and can be
+    shared by every worker and kept across restarts.
+    """
+
+    def __init__(self, base_path: pathlib.Path | str):
+        self._base_path = pathlib.Path(base_path)
+        self._base_path.mkdir(parents=True, exist_ok=True)
+
+    def get(self, upload_id: UploadID, variant: str) -> bytes | None:
+        try:
+            return (self._upload_dir(upload_id) / variant).read_bytes()
+        except (FileNotFoundError, ValueError):
+            # An ID that cannot name an entry (e.g. "..") is simply not cached;
+            # the caller's database lookup answers 404.
+            return None
+
+    def set(self, upload_id: UploadID, variant: str, value: bytes) -> None:
+        upload_dir = self._upload_dir(upload_id)
+        upload_dir.mkdir(parents=True, exist_ok=True)
+        # Write-then-rename so a concurrent reader in another worker never
+        # sees a partially written JPEG.
+        fd, staging_path = tempfile.mkstemp(dir=upload_dir, prefix=THUMBNAIL_STAGING_PREFIX)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+                os.fchmod(f.fileno(), DEFAULT_FILE_MODE)
+            os.replace(staging_path, upload_dir / variant)
+        except BaseException:
+            pathlib.Path(staging_path).unlink(missing_ok=True)
+            raise
+
+    def evict(self, upload_id: UploadID) -> None:
+        shutil.rmtree(self._upload_dir(upload_id), ignore_errors=True)
+
+    def _upload_dir(self, upload_id: UploadID) -> pathlib.Path:
+        if (
+            upload_id in ("", ".", "..")
+            or os.sep in upload_id
+            or (os.altsep and os.altsep in upload_id)
+        ):
+            raise ValueError(f"Invalid upload_id: {upload_id!r}")
+        return self._base_path / upload_id[:2] / upload_id
+
+
+class OnDiskThumbnailService(InMemoryThumbnailService):
+    """``InMemoryThumbnailService`` backed by an ``OnDiskThumbnailStore``.
+
+    The in-memory LRU answers hot entries; misses fall through to disk before
+    a thumbnail is generated, so each image is rendered once per deployment.
+    """
+
+    def __init__(
+        self,
+        cache: InMemoryThumbnailCache,
+        store: OnDiskThumbnailStore,
+        renderer: ThumbnailRenderer = render_thumbnail,
+        invalid_images: InvalidImageCache | None = None,
+    ):
+        super().__init__(cache=cache, renderer=renderer, invalid_images=invalid_images)
+        self._store_on_disk = store
+
+    def evict(self, upload_id: UploadID) -> None:
+        self._cancel_store(upload_id)
+        self._store_on_disk.evict(upload_id)
+        super().evict(upload_id)
+
+    def _lookup(self, upload_id: UploadID, spec: ThumbnailSpec) -> bytes | None:
+        cached = super()._lookup(upload_id, spec)
+        if cached is None:
+            cached = self._store_on_disk.get(upload_id, spec.variant)
+            if cached is not None:
+                super()._store(upload_id, spec, cached)
+        return cached
+
+    def _store(self, upload_id: UploadID, spec: ThumbnailSpec, thumbnail: bytes) -> None:
+        self._store_on_disk.set(upload_id, spec.variant, thumbnail)
+        super()._store(upload_id, spec, thumbnail)
@@ -0,0 +1,76 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+from lenzr_server.thumbnail_service.in_memory import render_thumbnail
+from lenzr_server.thumbnail_service.protocol import InvalidImageException, ThumbnailSpec
+
+
+def _render_from_shared_memory(name: str, size: int, spec: ThumbnailSpec) -> bytes:
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        with block.buf[:size] as view:
+            content = bytes(view)
+    finally:
+        block.close()
+    return render_thumbnail(content, spec)
+
+
+class ProcessPoolThumbnailRenderer:
+    """Renders thumbnails in worker processes, outside this process's GIL.
+
+    Originals are handed to the worker through shared memory instead of being
+    pickled through the executor's pipe; the much smaller thumbnail comes back
+    as the task result. The calling thread blocks until its thumbnail is done.
+
+    A worker that dies (a decoder crash, the OOM killer) breaks the whole
+    pool; it is replaced, and the image being rendered is reported invalid.
+    """
+
+    def __init__(self, max_workers: int):
+        self._max_workers = max_workers
+        self._executor_lock = threading.Lock()
+        self._executor = self._create_executor()
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # spawn: forking a process that runs threads (the server) is unsafe.
+        return ProcessPoolExecutor(
+            max_workers=self._max_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def _replace_broken(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            # Every caller of a broken pool gets here; only the first replaces it.
+            if self._executor is broken:
+                logging.warning("Thumbnail worker process died, restarting the pool")
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._create_executor()
+            return self._executor
+
+    def __call__(self, content: bytes, spec: ThumbnailSpec) -> bytes:
+        block = shared_memory.SharedMemory(create=True, size=max(len(content), 1))
+        try:
+            block.buf[: len(content)] = content
+            executor = self._executor
+            try:
+                future = executor.submit(_render_from_shared_memory, block.name, len(content), spec)
+            except BrokenProcessPool:
+                # Broken by an earlier render, not by this image.
+                executor = self._replace_broken(executor)
+                future = executor.submit(_render_from_shared_memory, block.name, len(content), spec)
+            try:
+                return future.result()
+            except BrokenProcessPool as exc:
+                self._replace_broken(executor)
+                # Lands in the negative cache, so the image is not retried
+                # (and the pool not crashed again) on every request.
+                raise InvalidImageException() from exc
+        finally:
+            block.close()
+            block.unlink()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(cancel_futures=True)
@@ -1,15 +1,69 @@
+from collections.abc import Callable
 from dataclasses import dataclass
+from enum import IntEnum, StrEnum
 from typing import Protocol
 
 from lenzr_server.types import UploadID
 
 
+class ThumbnailSize(IntEnum):
+    """Allowed bounding boxes in pixels; fixed buckets keep the cache small."""
+
+    GRID = 120
+    DEFAULT = 200
+    GRID_2X = 240
+    DEFAULT_2X = 400
+    DETAIL = 800
+    DETAIL_2X = 1600
+
+
+class ThumbnailFormat(StrEnum):
+    JPEG = "jpeg"
+    WEBP = "webp"
+    PNG = "png"
+
+
+_FILE_EXTENSIONS = {
+    ThumbnailFormat.JPEG: "jpg",
+    ThumbnailFormat.WEBP: "webp",
+    ThumbnailFormat.PNG: "png",
+}
+
+
+@dataclass(frozen=True)
+class ThumbnailSpec:
+    size: int = ThumbnailSize.DEFAULT
+    format: ThumbnailFormat = ThumbnailFormat.JPEG
+
+    @property
+    def content_type(self) -> str:
+        return f"image/{self.format}"
+
+    @property
+    def variant(self) -> str:
+        """File name of this variant, e.g. ``200.jpg``."""
+        return f"{int(self.size)}.{_FILE_EXTENSIONS[self.format]}"
+
+
+DEFAULT_THUMBNAIL_SPEC = ThumbnailSpec()
+
+
 @dataclass(frozen=True)
 class Thumbnail:
     content: bytes
     content_type: str
 
 
+@dataclass(frozen=True)
+class ThumbnailCacheStats:
+    current_bytes: int
+    max_bytes: int
+    entries: int
+    hits: int
+    misses: int
+    evictions: int
+
+
 class InvalidImageException(Exception):
     def __init__(self, detail: str = "Image cannot be decoded"):
         self.detail = detail
@@ -17,13 +71,33 @@ class InvalidImageException(Exception):
 
 
 class ThumbnailService(Protocol):
-    def get_thumbnail(self, upload_id: UploadID, content: bytes) -> Thumbnail:
-        """Return the thumbnail for ``upload_id``, generating from ``content`` on cache miss.
+    def get_thumbnail(
+        self,
+        upload_id: UploadID,
+        load_content: Callable[[], bytes],
+        spec: ThumbnailSpec = DEFAULT_THUMBNAIL_SPEC,
+    ) -> Thumbnail:
+        """Return the ``spec`` thumbnail for ``upload_id``, generating it on cache miss.
 
-        Raises ``InvalidImageException`` if ``content`` cannot be decoded as an image.
+        ``load_content`` is only called on a miss and must return the original image.
+        Raises ``InvalidImageException`` if that content cannot be decoded as an image.
         """
         ...
 
+    def peek(
+        self, upload_id: UploadID, spec: ThumbnailSpec = DEFAULT_THUMBNAIL_SPEC
+    ) -> Thumbnail | None:
+        """Return the cached ``spec`` thumbnail for ``upload_id`` without generating it."""
+        ...
+
+    def is_known_invalid(self, upload_id: UploadID) -> bool:
+        """Whether a recent attempt found the original of ``upload_id`` undecodable."""
+        ...
+
     def evict(self, upload_id: UploadID) -> None:
-        """Drop any cached thumbnail for ``upload_id``. No-op if absent."""
+        """Drop all cached thumbnail variants for ``upload_id``. No-op if absent."""
+        ...
+
+    def stats(self) -> ThumbnailCacheStats:
+        """Return counters of the in-memory cache for capacity tuning."""
         ...
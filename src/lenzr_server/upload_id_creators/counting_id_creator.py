@@ -1,5 +1,17 @@
 from lenzr_server.types import UploadID
-from lenzr_server.upload_id_creators.id_creator import IDCreator
+from lenzr_server.upload_id_creators.id_creator import IDCreator, UploadIDHasher
+
+
+class CountingUploadIDHasher(UploadIDHasher):
+    def __init__(self, id_creator: "CountingIdCreator"):
+        self._id_creator = id_creator
+        self._content = bytearray()
+
+    def update(self, chunk: bytes) -> None:
+        self._content.extend(chunk)
+
+    def upload_id(self) -> UploadID:
+        return self._id_creator.create_upload_id(bytes(self._content))
 
 
 class CountingIdCreator(IDCreator):
@@ -16,5 +28,8 @@ class CountingIdCreator(IDCreator):
         upload_id: UploadID = str(content_id)
         return upload_id
 
+    def create_hasher(self) -> CountingUploadIDHasher:
+        return CountingUploadIDHasher(self)
+
     def reset(self):
         self.__init__()
@@ -2,7 +2,21 @@ import base64
 import hashlib
 
 from lenzr_server.types import UploadID
-from lenzr_server.upload_id_creators.id_creator import IDCreator
+from lenzr_server.upload_id_creators.id_creator import IDCreator, UploadIDHasher
+
+
+class HashingUploadIDHasher(UploadIDHasher):
+    def __init__(self, seed: int):
+        self._hash = hashlib.sha3_256()
+        self._hash.update(seed.to_bytes(32, "big"))
+
+    def update(self, chunk: bytes) -> None:
+        self._hash.update(chunk)
+
+    def upload_id(self) -> UploadID:
+        id_restricted = base64.b32encode(self._hash.digest()).decode("utf-8")[:32]
+        upload_id: UploadID = id_restricted
+        return upload_id
 
 
 class HashingIDCreator(IDCreator):
@@ -10,10 +24,9 @@ class HashingIDCreator(IDCreator):
         self._seed = seed
 
     def create_upload_id(self, content: bytes) -> UploadID:
-        sha256hashlib = hashlib.sha3_256()
-        sha256hashlib.update(self._seed.to_bytes(32, "big"))
-        sha256hashlib.update(content)
+        hasher = self.create_hasher()
+        hasher.update(content)
+        return hasher.upload_id()
 
-        id_restricted = base64.b32encode(sha256hashlib.digest()).decode("utf-8")[:32]
-        upload_id: UploadID = id_restricted
-        return upload_id
+    def create_hasher(self) -> HashingUploadIDHasher:
+        return HashingUploadIDHasher(self._seed)
@@ -3,6 +3,17 @@ from typing import Protocol
 from lenzr_server.types import UploadID
 
 
+class UploadIDHasher(Protocol):
+    def update(self, chunk: bytes) -> None:
+        pass
+
+    def upload_id(self) -> UploadID:
+        pass
+
+
 class IDCreator(Protocol):
     def create_upload_id(self, content: bytes) -> UploadID:
         pass
+
+    def create_hasher(self) -> UploadIDHasher:
+        pass
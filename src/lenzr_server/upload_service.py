@@ -1,15 +1,34 @@
+import datetime
+import io
 import logging
+import os
+import pathlib
+import shutil
 from dataclasses import dataclass
+from typing import BinaryIO
 
+import sqlalchemy as sa
 import sqlalchemy.exc
 from sqlmodel import Session, select
 
 from lenzr_server.exceptions import AlreadyExistingException, NotFoundException
-from lenzr_server.file_storages.file_storage import FileID, FileStorage
+from lenzr_server.file_storages.file_storage import FileID, FileStorage, StagedFile
+from lenzr_server.image_probe import ImageInfo, ImageTooLargeException, probe_image
+from lenzr_server.keyed_lock import KeyedLock
 from lenzr_server.models.uploads import UploadMetaData
+from lenzr_server.pagination import ListPosition, uploads_after
+from lenzr_server.perceptual_hash import (
+    candidate_chunks,
+    hamming_distance,
+    join_hash,
+    split_hash,
+)
+from lenzr_server.tag_service import TagService, TagUploadNotFoundException
 from lenzr_server.types import UploadID
 from lenzr_server.upload_id_creators.id_creator import IDCreator
 
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
 
 @dataclass(frozen=True)
 class Upload:
@@ -17,6 +36,18 @@ class Upload:
     content_type: str
 
 
+@dataclass(frozen=True)
+class StoredUpload:
+    path: pathlib.Path
+    content_type: str
+
+
+@dataclass(frozen=True)
+class SimilarUpload:
+    metadata: UploadMetaData
+    distance: int
+
+
 class UploadAlreadyExistingException(AlreadyExistingException):
     def __init__(self, upload_id: UploadID):
         self.upload_id = upload_id
@@ -28,65 +59,207 @@ class UploadNotFoundException(NotFoundException):
         super().__init__(detail="Upload not found")
 
 
+class UploadTooLargeException(Exception):
+    def __init__(self, detail: str = "Uploaded file exceeds size limit"):
+        self.detail = detail
+        super().__init__(detail)
+
+
+def _apply_file_info(
+    upload_metadata: UploadMetaData, byte_size: int, image_info: ImageInfo | None
+) -> None:
+    upload_metadata.byte_size = byte_size
+    if image_info is not None:
+        upload_metadata.width = image_info.width
+        upload_metadata.height = image_info.height
+        upload_metadata.image_format = image_info.format
+
+
+def _dhash_of(upload_metadata: UploadMetaData) -> int | None:
+    chunks = (
+        upload_metadata.dhash_0,
+        upload_metadata.dhash_1,
+        upload_metadata.dhash_2,
+        upload_metadata.dhash_3,
+    )
+    if any(chunk is None for chunk in chunks):
+        return None
+    return join_hash(chunks)
+
+
+_HELD_INGEST_LOCKS = "held_ingest_locks"
+
+
+def _release_ingest_locks(session: Session, transaction) -> None:
+    if transaction.parent is not None:
+        return
+    held = session.info.get(_HELD_INGEST_LOCKS, set())
+    for ingest_locks, upload_id in held:
+        ingest_locks.release(upload_id)
+    held.clear()
+
+
 class UploadService:
     def __init__(
         self,
         file_storage: FileStorage,
         database_session: Session,
         upload_id_creator: IDCreator,
+        ingest_locks: KeyedLock | None = None,
     ):
         self._database_session = database_session
         self._file_storage = file_storage
         self._upload_id_creator = upload_id_creator
+        self._ingest_locks = ingest_locks if ingest_locks is not None else KeyedLock()
 
     def add_upload(self, content: bytes, content_type: str) -> UploadMetaData:
-        upload_id = self._upload_id_creator.create_upload_id(content)
-        file_id = FileID(upload_id)
+        return self.add_upload_stream(io.BytesIO(content), content_type)
 
-        self._file_storage.add_file(file_id, content)
+    def add_upload_stream(
+        self,
+        stream: BinaryIO,
+        content_type: str,
+        max_bytes: int | None = None,
+        max_pixels: int | None = None,
+    ) -> UploadMetaData:
+        """Store ``stream`` chunk by chunk under the hash of its content.
 
+        Seekable streams are hashed before anything is written, so content
+        that is already stored is never staged. Raises ``UploadTooLargeException``
+        as soon as more than ``max_bytes`` were read, and ``ImageTooLargeException``
+        if the image header declares more than ``max_pixels`` pixels.
+        """
+        image_info = self._probe(stream, max_pixels)
+        # Non-seekable streams can only be read once and are hashed while
+        # they are staged.
+        prehashed = stream.seekable()
+        if prehashed:
+            upload_id, byte_size = self._read(stream, max_bytes)
+            stream.seek(0)
+            if self._upload_exists(upload_id):
+                logging.info("Upload %s already stored, skipping write", upload_id)
+                raise UploadAlreadyExistingException(upload_id=upload_id)
+
+        staged_file = self._file_storage.stage_file()
         try:
-            upload_metadata = UploadMetaData(
-                upload_id=upload_id,
-                content_type=content_type,
-            )
+            if prehashed:
+                shutil.copyfileobj(stream, staged_file, UPLOAD_CHUNK_SIZE)
+            else:
+                upload_id, byte_size = self._read(stream, max_bytes, staged_file)
+            self._hold_ingest_lock(upload_id)
+            return self._persist(upload_id, staged_file, content_type, byte_size, image_info)
+        finally:
+            staged_file.discard()
+
+    def _hold_ingest_lock(self, upload_id: UploadID) -> None:
+        # Single-flight per content ID within this process: the key stays held
+        # until this session's transaction commits or rolls back, so a
+        # concurrent identical upload waits for the winner's row and takes the
+        # existence fast path. Acquired on the caller's (worker) thread and
+        # released wherever the transaction ends, never blocking the event loop.
+        session = self._database_session
+        session.connection()
+        held = session.info.get(_HELD_INGEST_LOCKS)
+        if held is None:
+            held = session.info[_HELD_INGEST_LOCKS] = set()
+            sa.event.listen(session, "after_transaction_end", _release_ingest_locks)
+        key = (self._ingest_locks, upload_id)
+        if key not in held:
+            self._ingest_locks.acquire(upload_id)
+            held.add(key)
+
+    def _probe(self, stream: BinaryIO, max_pixels: int | None) -> ImageInfo | None:
+        # Header only, so oversized images are refused before anything is
+        # stored or decoded. Non-seekable streams cannot be rewound and are
+        # stored unprobed.
+        if not stream.seekable():
+            return None
+        try:
+            return probe_image(stream, max_pixels)
+        finally:
+            stream.seek(0)
+
+    def _persist(
+        self,
+        upload_id: UploadID,
+        staged_file: StagedFile,
+        content_type: str,
+        byte_size: int,
+        image_info: ImageInfo | None,
+    ) -> UploadMetaData:
+        self._lock_upload_id_in_database(upload_id)
+        if self._upload_exists(upload_id):
+            # Common re-upload case: skip the blob write and the doomed
+            # insert. The IntegrityError path below only covers races.
+            logging.info("Upload %s already stored, skipping write", upload_id)
+            raise UploadAlreadyExistingException(upload_id=upload_id)
+
+        try:
+            upload_metadata = UploadMetaData(upload_id=upload_id, content_type=content_type)
+            _apply_file_info(upload_metadata, byte_size, image_info)
             self._database_session.add(upload_metadata)
             self._database_session.flush()
             self._database_session.refresh(upload_metadata)
         except sqlalchemy.exc.IntegrityError:
+            # Another writer won the race. Its blob lives at the same path, so
+            # only our staged copy is dropped, never the committed file.
             self._database_session.rollback()
             logging.error(f"Upload {upload_id} already stored")
-            self._file_storage.delete_file_content(file_id)
             raise UploadAlreadyExistingException(upload_id=upload_id)
         except Exception:
             self._database_session.rollback()
             logging.exception("Failed to persist metadata for upload %s", upload_id)
-            self._delete_orphan_file(file_id)
             raise
 
-        return upload_metadata
-
-    def _delete_orphan_file(self, file_id: FileID) -> None:
         try:
-            self._file_storage.delete_file_content(file_id)
+            staged_file.commit(FileID(upload_id))
         except Exception:
-            # The metadata insert already failed; surface the original error
-            # rather than the cleanup failure, but log so an operator can
-            # collect the leaked blob.
-            logging.exception("Failed to clean up orphaned file %s", file_id)
+            self._database_session.rollback()
+            logging.exception("Failed to store file for upload %s", upload_id)
+            raise
+
+        return upload_metadata
+
+    def _lock_upload_id_in_database(self, upload_id: UploadID) -> None:
+        # Cross-worker coordination: on Postgres, a transaction-scoped advisory
+        # lock makes a concurrent ingest of the same content in another worker
+        # wait until the winner commits, so it then takes the existence fast
+        # path. Other backends only coordinate within a process (see
+        # _hold_ingest_lock); across workers the IntegrityError path remains.
+        if self._database_session.get_bind().dialect.name == "postgresql":
+            self._database_session.exec(
+                sa.select(sa.func.pg_advisory_xact_lock(sa.func.hashtext(upload_id)))
+            )
+
+    def _upload_exists(self, upload_id: UploadID) -> bool:
+        query = select(UploadMetaData.pk).where(UploadMetaData.upload_id == upload_id)
+        return self._database_session.exec(query).first() is not None
+
+    def _read(
+        self, stream: BinaryIO, max_bytes: int | None, staged_file: StagedFile | None = None
+    ) -> tuple[UploadID, int]:
+        """Hash ``stream`` to its end, writing it to ``staged_file`` if given."""
+        hasher = self._upload_id_creator.create_hasher()
+        size = 0
+        while chunk := stream.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                raise UploadTooLargeException()
+            hasher.update(chunk)
+            if staged_file is not None:
+                staged_file.write(chunk)
+        return hasher.upload_id(), size
 
     def get_id_for_content(self, content: bytes) -> UploadID:
         upload_id = self._upload_id_creator.create_upload_id(content)
         return upload_id
 
     def get_upload(self, upload_id: UploadID) -> Upload:
-        query = select(UploadMetaData).where(UploadMetaData.upload_id == upload_id)
-        try:
-            metadata_entry = self._database_session.exec(query).one()
-        except sqlalchemy.exc.NoResultFound:
-            logging.error(f"Upload {upload_id} not found in database")
-            raise UploadNotFoundException()
+        return self.read_upload(self.get_metadata(upload_id))
 
+    def read_upload(self, metadata_entry: UploadMetaData) -> Upload:
+        """Read the stored blob of an already fetched ``metadata_entry``."""
+        upload_id = metadata_entry.upload_id
         try:
             file_id = FileID(upload_id)
             content = self._file_storage.get_file_content(file_id)
@@ -96,14 +269,156 @@ class UploadService:
 
         return Upload(content=content, content_type=metadata_entry.content_type)
 
-    def delete_upload(self, upload_id: UploadID) -> UploadMetaData:
-        # DB is source of truth, orphaned file is acceptable
+    def get_upload_file(self, upload_id: UploadID) -> StoredUpload:
+        """Locate the stored blob without reading it, so it can be streamed to the client."""
+        metadata_entry = self.get_metadata(upload_id)
+
+        try:
+            path = self._file_storage.get_file_path(FileID(upload_id))
+        except FileNotFoundError:
+            logging.error(f"Upload {upload_id} not found on disk")
+            raise UploadNotFoundException()
+
+        return StoredUpload(path=path, content_type=metadata_entry.content_type)
+
+    def get_metadata(self, upload_id: UploadID) -> UploadMetaData:
         query = select(UploadMetaData).where(UploadMetaData.upload_id == upload_id)
         try:
-            upload = self._database_session.exec(query).one()
+            return self._database_session.exec(query).one()
         except sqlalchemy.exc.NoResultFound:
+            logging.error(f"Upload {upload_id} not found in database")
+            raise UploadNotFoundException()
+
+    def list_metadata(
+        self,
+        limit: int,
+        since: datetime.datetime | None = None,
+        until: datetime.datetime | None = None,
+        after: ListPosition | None = None,
+        missing_file_info: bool = False,
+        missing_hashes: bool = False,
+    ) -> list[UploadMetaData]:
+        """Return uploads newest first, optionally created within ``[since, until)``.
+
+        ``after`` is the ``(created_at, pk)`` of the last upload of a previous
+        page; listing continues with the uploads that follow it. With
+        ``missing_file_info`` only uploads stored before their size and image
+        header were recorded are returned, with ``missing_hashes`` only uploads
+        without a BlurHash placeholder or dHash.
+        """
+        query = select(UploadMetaData)
+        if missing_file_info:
+            query = query.where(UploadMetaData.byte_size.is_(None))
+        if missing_hashes:
+            query = query.where(
+                sa.or_(UploadMetaData.blurhash.is_(None), UploadMetaData.dhash_0.is_(None))
+            )
+        if since is not None:
+            query = query.where(UploadMetaData.created_at >= since)
+        if until is not None:
+            query = query.where(UploadMetaData.created_at < until)
+        if after is not None:
+            query = query.where(uploads_after(after))
+        query = query.order_by(
+            sa.desc(UploadMetaData.created_at), sa.desc(UploadMetaData.pk)
+        ).limit(limit)
+        return list(self._database_session.exec(query).all())
+
+    def probe_stored_file(self, upload_id: UploadID) -> tuple[int, ImageInfo | None]:
+        """Measure and probe the stored blob of ``upload_id`` without touching the database.
+
+        Raises ``FileNotFoundError`` if the blob is missing.
+        """
+        path = self._file_storage.get_file_path(FileID(upload_id))
+        with path.open("rb") as stream:
+            byte_size = os.fstat(stream.fileno()).st_size
+            try:
+                # Already accepted, so no pixel limit: record what is there.
+                image_info = probe_image(stream)
+            except ImageTooLargeException:
+                image_info = None
+        return byte_size, image_info
+
+    def set_file_info(
+        self, upload_id: UploadID, byte_size: int, image_info: ImageInfo | None
+    ) -> UploadMetaData:
+        upload_metadata = self.get_metadata(upload_id)
+        _apply_file_info(upload_metadata, byte_size, image_info)
+        self._database_session.add(upload_metadata)
+        self._database_session.flush()
+        return upload_metadata
+
+    def set_blurhash(self, upload_id: UploadID, blurhash: str) -> UploadMetaData:
+        upload_metadata = self.get_metadata(upload_id)
+        upload_metadata.blurhash = blurhash
+        self._database_session.add(upload_metadata)
+        self._database_session.flush()
+        return upload_metadata
+
+    def set_dhash(self, upload_id: UploadID, value: int) -> UploadMetaData:
+        upload_metadata = self.get_metadata(upload_id)
+        (
+            upload_metadata.dhash_0,
+            upload_metadata.dhash_1,
+            upload_metadata.dhash_2,
+            upload_metadata.dhash_3,
+        ) = split_hash(value)
+        self._database_session.add(upload_metadata)
+        self._database_session.flush()
+        return upload_metadata
+
+    def find_similar(
+        self, upload_id: UploadID, max_distance: int, limit: int
+    ) -> list[SimilarUpload]:
+        """Return uploads whose dHash is within ``max_distance`` bits of ``upload_id``'s.
+
+        Closest first. Empty if the upload has no hash yet. Only rows sharing a
+        nearby chunk with the query are read, via the per-chunk indexes.
+        """
+        upload_metadata = self.get_metadata(upload_id)
+        value = _dhash_of(upload_metadata)
+        if value is None:
+            return []
+
+        chunk_columns = [
+            UploadMetaData.dhash_0,
+            UploadMetaData.dhash_1,
+            UploadMetaData.dhash_2,
+            UploadMetaData.dhash_3,
+        ]
+        query = select(UploadMetaData).where(
+            UploadMetaData.pk != upload_metadata.pk,
+            sa.or_(
+                *(
+                    column.in_(candidates)
+                    for column, candidates in zip(
+                        chunk_columns, candidate_chunks(value, max_distance), strict=True
+                    )
+                )
+            ),
+        )
+        matches = []
+        for candidate in self._database_session.exec(query):
+            distance = hamming_distance(value, _dhash_of(candidate))
+            if distance <= max_distance:
+                matches.append(SimilarUpload(metadata=candidate, distance=distance))
+        # Closest first, newest first among equally close ones.
+        matches.sort(key=lambda match: match.metadata.created_at, reverse=True)
+        matches.sort(key=lambda match: match.distance)
+        return matches[:limit]
+
+    def delete_upload(self, upload_id: UploadID) -> UploadMetaData:
+        # Detaching the tags first keeps the per-tag upload counts exact; the
+        # links would otherwise disappear through the cascade uncounted.
+        try:
+            TagService(self._database_session).detach_all(upload_id)
+        except TagUploadNotFoundException:
             raise UploadNotFoundException()
 
+        # DB is source of truth, orphaned file is acceptable
+        query = select(UploadMetaData).where(UploadMetaData.upload_id == upload_id)
+        upload = self._database_session.exec(query).one()
+
         self._database_session.delete(upload)
 
         try:
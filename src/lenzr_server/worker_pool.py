@@ -0,0 +1,118 @@
+import functools
+import logging
+import os
+import queue
+import threading
+from collections.abc import Callable, Generator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+DEFAULT_INGEST_WORKERS = 2
+DEFAULT_INGEST_QUEUE_SIZE = 100
+
+
+@dataclass(frozen=True)
+class WorkerPoolStats:
+    workers: int
+    queued: int
+    max_queue: int
+    completed: int
+    failed: int
+    dropped: int
+
+
+class BoundedWorkerPool:
+    """Fixed set of daemon threads draining a bounded job queue.
+
+    ``submit`` never blocks: when the queue is full the job is dropped and
+    counted, so a burst of uploads cannot back up into request handling.
+    Jobs are best effort; failures are logged and counted.
+    """
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_INGEST_WORKERS,
+        max_queue: int = DEFAULT_INGEST_QUEUE_SIZE,
+        name: str = "worker",
+    ):
+        self._queue: queue.Queue[Callable[[], object] | None] = queue.Queue(maxsize=max_queue)
+        self._max_queue = max_queue
+        self._completed = 0
+        self._failed = 0
+        self._dropped = 0
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn: Callable[..., object], *args: object) -> bool:
+        """Queue ``fn(*args)``. Returns False if the queue is full and the job was dropped."""
+        try:
+            self._queue.put_nowait(functools.partial(fn, *args))
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+            logging.warning("Worker queue full, dropping %s", getattr(fn, "__name__", fn))
+            return False
+        return True
+
+    def join(self) -> None:
+        """Block until every queued job has finished."""
+        self._queue.join()
+
+    def shutdown(self) -> None:
+        # Pending jobs are discarded rather than delaying shutdown; running
+        # jobs finish.
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def stats(self) -> WorkerPoolStats:
+        with self._lock:
+            return WorkerPoolStats(
+                workers=len(self._threads),
+                queued=self._queue.qsize(),
+                max_queue=self._max_queue,
+                completed=self._completed,
+                failed=self._failed,
+                dropped=self._dropped,
+            )
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                job()
+                with self._lock:
+                    self._completed += 1
+            except Exception:
+                with self._lock:
+                    self._failed += 1
+                logging.exception("Background job failed")
+            finally:
+                self._queue.task_done()
+
+
+@contextmanager
+def ingest_pool_from_env() -> Generator[BoundedWorkerPool, None, None]:
+    pool = BoundedWorkerPool(
+        workers=int(os.environ.get("INGEST_WORKERS", DEFAULT_INGEST_WORKERS)),
+        max_queue=int(os.environ.get("INGEST_QUEUE_SIZE", DEFAULT_INGEST_QUEUE_SIZE)),
+        name="ingest",
+    )
+    try:
+        yield pool
+    finally:
+        pool.shutdown()
@@ -11,6 +11,7 @@ from sqlmodel import Session, SQLModel
 
 from lenzr_server.main import app
 from lenzr_server.thumbnail_service import InMemoryThumbnailCache, InMemoryThumbnailService
+from lenzr_server.worker_pool import BoundedWorkerPool
 
 os.environ["ENVIRONMENT"] = "development"
 os.environ["UPLOAD_STORAGE_PATH"] = tempfile.mkdtemp()
@@ -38,9 +39,17 @@ def set_env_variables(mocker):
 
 
 @pytest.fixture
-def client(thumbnail_cache):
+def ingest_pool():
+    pool = BoundedWorkerPool(workers=1, max_queue=10)
+    yield pool
+    pool.shutdown()
+
+
+@pytest.fixture
+def client(thumbnail_service, ingest_pool):
     with TestClient(app) as c:
-        app.state.thumbnail_cache = thumbnail_cache
+        app.state.thumbnail_service = thumbnail_service
+        app.state.ingest_pool = ingest_pool
         yield c
 
 
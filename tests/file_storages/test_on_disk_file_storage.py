@@ -1,9 +1,10 @@
+import os
 import pathlib
 
 import pytest
 
 from lenzr_server.file_storages.file_storage import FileID
-from lenzr_server.file_storages.on_disk_file_storage import OnDiskFileStorage
+from lenzr_server.file_storages.on_disk_file_storage import STAGING_PREFIX, OnDiskFileStorage
 
 
 @pytest.fixture
@@ -38,6 +39,19 @@ def test__get_file_content__nonexistent_file__raises_file_not_found_error(on_dis
         on_disk_file_storage.get_file_content(file_id)
 
 
+def test__get_file_path__existing_file__returns_path_with_content(on_disk_file_storage):
+    on_disk_file_storage.add_file(FileID("test_file"), b"test_content")
+
+    path = on_disk_file_storage.get_file_path(FileID("test_file"))
+
+    assert path.read_bytes() == b"test_content"
+
+
+def test__get_file_path__nonexistent_file__raises_file_not_found_error(on_disk_file_storage):
+    with pytest.raises(FileNotFoundError):
+        on_disk_file_storage.get_file_path(FileID("nonexistent_file"))
+
+
 @pytest.mark.parametrize(
     "file_id",
     [
@@ -62,3 +76,60 @@ def test__add_file__cannot_escape_base_path(on_disk_file_storage, tmp_path):
         on_disk_file_storage.add_file(FileID(".."), b"x")
 
     assert not (sibling / "x").exists()
+
+
+def test__stage_file__commit__moves_content_to_file_id(on_disk_file_storage, tmp_path):
+    staged_file = on_disk_file_storage.stage_file()
+    staged_file.write(b"first ")
+    staged_file.write(b"second")
+
+    staged_file.commit(FileID("test_file"))
+
+    assert on_disk_file_storage.get_file_content(FileID("test_file")) == b"first second"
+    assert [p.name for p in tmp_path.iterdir()] == ["test_file"]
+
+
+def test__stage_file__discard__removes_staging_file(on_disk_file_storage, tmp_path):
+    staged_file = on_disk_file_storage.stage_file()
+    staged_file.write(b"content")
+
+    staged_file.discard()
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test__stage_file__commit_with_traversal_id__raises(on_disk_file_storage):
+    staged_file = on_disk_file_storage.stage_file()
+
+    with pytest.raises(ValueError):
+        staged_file.commit(FileID("../escape"))
+    staged_file.discard()
+
+
+def test__stage_file__commit__same_mode_as_add_file(on_disk_file_storage, tmp_path):
+    on_disk_file_storage.add_file(FileID("added"), b"content")
+    staged_file = on_disk_file_storage.stage_file()
+    staged_file.write(b"content")
+
+    staged_file.commit(FileID("staged"))
+
+    assert (tmp_path / "staged").stat().st_mode == (tmp_path / "added").stat().st_mode
+
+
+def test__remove_stale_staging_files__removes_only_old_staging_files(
+    on_disk_file_storage, tmp_path
+):
+    stale = tmp_path / f"{STAGING_PREFIX}stale"
+    stale.write_bytes(b"left over")
+    os.utime(stale, (0, 0))
+    in_progress = on_disk_file_storage.stage_file()
+    on_disk_file_storage.add_file(FileID("old_upload"), b"content")
+    os.utime(tmp_path / "old_upload", (0, 0))
+
+    removed = on_disk_file_storage.remove_stale_staging_files()
+
+    assert removed == 1
+    assert not stale.exists()
+    assert (tmp_path / "old_upload").exists()
+    assert len(list(tmp_path.glob(f"{STAGING_PREFIX}*"))) == 1
+    in_progress.discard()
@@ -6,12 +6,21 @@ import httpx
 import pytest
 from fastapi.testclient import TestClient
 from PIL import Image
-from sqlmodel import SQLModel
+from sqlmodel import Session, SQLModel, select
 
 from lenzr_server.db import engine
-from lenzr_server.dependencies import get_id_creator, get_webhook_notifier
+from lenzr_server.dependencies import get_file_storage, get_id_creator, get_webhook_notifier
+from lenzr_server.file_storages.on_disk_file_storage import OnDiskFileStorage
+from lenzr_server.jobs import record_image_hashes, warm_recent_thumbnails
 from lenzr_server.main import app
+from lenzr_server.models.uploads import UploadMetaData
+from lenzr_server.thumbnail_service import (
+    InMemoryThumbnailCache,
+    OnDiskThumbnailService,
+    OnDiskThumbnailStore,
+)
 from lenzr_server.upload_id_creators.counting_id_creator import CountingIdCreator
+from lenzr_server.upload_service import UploadService
 from lenzr_server.webhook import HttpWebhookNotifier
 
 WEBHOOK_URL = "http://localhost/hook"
@@ -69,6 +78,26 @@ def test__api_health__returns_200_ok_without_auth(client):
     assert response.json() == {"status": "ok"}
 
 
+def test__api_stats__without_auth__returns_401(client):
+    response = client.get("/stats")
+
+    assert response.status_code == 401
+
+
+def test__api_stats__after_thumbnail__reports_thumbnail_cache(client, create_test_image):
+    upload_id = _create_upload(client, content=create_test_image(400, 300))
+    client.get(f"/uploads/{upload_id}/thumbnail")
+
+    response = client.get("/stats", headers=get_auth_headers())
+
+    assert response.status_code == 200
+    cache_stats = response.json()["thumbnail_cache"]
+    assert cache_stats["entries"] == 1
+    assert 0 < cache_stats["current_bytes"] <= cache_stats["max_bytes"]
+    assert cache_stats["evictions"] == 0
+    assert response.json()["ingest_queue"]["max_queue"] == 10
+
+
 def test__api_post_upload__upload_image_file__returns_201_with_id(client):
     response = client.post(
         "/uploads",
@@ -138,6 +167,19 @@ def test__api_post_upload__file_exceeds_size_limit__returns_413(client, monkeypa
     assert response.json()["detail"] == "Uploaded file exceeds size limit"
 
 
+def test__api_post_upload__image_over_pixel_limit__returns_422(client, monkeypatch):
+    monkeypatch.setenv("MAX_IMAGE_PIXELS", str(800 * 600 - 1))
+
+    response = client.post(
+        "/uploads",
+        files={"upload": ("photo.png", _create_real_image(800, 600), "image/png")},
+        headers=get_auth_headers(),
+    )
+
+    assert response.status_code == 422
+    assert response.json() == {"detail": "Image exceeds the pixel limit"}
+
+
 def test__api_post_upload__file_at_size_limit__accepted(client, monkeypatch):
     monkeypatch.setenv("MAX_UPLOAD_BYTES", "16")
 
@@ -166,6 +208,97 @@ def test__api_get_upload_upload_id___get_upload_after_post_with_id__returns_200_
     assert response.content == b"Hello, world!"
 
 
+def test__api_get_upload_upload_id__streams_file__sets_length_and_cache_headers(client):
+    content = _create_real_image()
+    upload_id = _create_upload(client, content, "photo.png")
+
+    response = client.get(f"/uploads/{upload_id}")
+
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["content-length"] == str(len(content))
+    assert "max-age" in response.headers["cache-control"]
+
+
+def test__api_get_upload_upload_id__sets_etag_and_immutable_caching(client):
+    upload_id = _create_upload(client)
+
+    response = client.get(f"/uploads/{upload_id}")
+
+    assert response.headers["etag"] == f'"{upload_id}"'
+    assert "immutable" in response.headers["cache-control"]
+
+
+def test__api_get_upload_upload_id__matching_if_none_match__returns_304_without_body(client):
+    upload_id = _create_upload(client)
+
+    response = client.get(f"/uploads/{upload_id}", headers={"If-None-Match": f'"{upload_id}"'})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == f'"{upload_id}"'
+
+
+def test__api_get_upload_upload_id__stale_if_none_match__returns_200(client):
+    upload_id = _create_upload(client)
+
+    response = client.get(f"/uploads/{upload_id}", headers={"If-None-Match": '"other"'})
+
+    assert response.status_code == 200
+    assert response.content == b"Hello, world!"
+
+
+def test__api_get_upload_upload_id__if_none_match_for_deleted_upload__returns_404(client):
+    upload_id = _create_upload(client)
+    client.delete(f"/uploads/{upload_id}", headers=get_auth_headers())
+
+    response = client.get(f"/uploads/{upload_id}", headers={"If-None-Match": f'"{upload_id}"'})
+
+    assert response.status_code == 404
+
+
+def test__api_get_upload_upload_id__range_request__returns_206_partial_content(client):
+    upload_id = _create_upload(client)
+
+    response = client.get(f"/uploads/{upload_id}", headers={"Range": "bytes=0-4"})
+
+    assert response.status_code == 206
+    assert response.content == b"Hello"
+    assert response.headers["content-range"] == "bytes 0-4/13"
+
+
+def test__api_head_upload_upload_id__returns_headers_without_reading_content(
+    client, ingest_pool, mocker
+):
+    content = _create_real_image()
+    upload_id = _create_upload(client, content, "photo.png")
+    ingest_pool.join()
+    get_file_content = mocker.spy(OnDiskFileStorage, "get_file_content")
+
+    response = client.head(f"/uploads/{upload_id}")
+
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["content-length"] == str(len(content))
+    assert response.headers["etag"] == f'"{upload_id}"'
+    get_file_content.assert_not_called()
+
+
+def test__api_head_upload_upload_id__matching_if_none_match__returns_304(client):
+    upload_id = _create_upload(client)
+
+    response = client.head(f"/uploads/{upload_id}", headers={"If-None-Match": f'"{upload_id}"'})
+
+    assert response.status_code == 304
+
+
+def test__api_head_upload_upload_id__nonexistent_upload__returns_404(client):
+    response = client.head("/uploads/999")
+
+    assert response.status_code == 404
+
+
 def test__api_get_upload_upload_id__get_upload_with_invalid_id__returns_404(client):
     response = client.get("/uploads/999")
     assert response.status_code == 404
@@ -281,6 +414,96 @@ def test__api_get_uploads__pagination(
     assert upload_ids == expected_upload_ids
 
 
+def test__api_get_uploads__cursor__walks_pages_without_overlap(client):
+    for i in range(5):
+        _create_upload(client, f"File {i}".encode(), f"test{i}.png")
+
+    first = client.get("/uploads", headers=get_auth_headers(), params={"limit": 2})
+    second = client.get(
+        "/uploads",
+        headers=get_auth_headers(),
+        params={"limit": 2, "cursor": first.headers["x-next-cursor"]},
+    )
+    _create_upload(client, b"File 5", "test5.png")
+    third = client.get(
+        "/uploads",
+        headers=get_auth_headers(),
+        params={"limit": 2, "cursor": second.headers["x-next-cursor"]},
+    )
+
+    pages = [[item["upload_id"] for item in page.json()] for page in (first, second, third)]
+    assert pages == [["5", "4"], ["3", "2"], ["1"]]
+    assert "x-next-cursor" not in third.headers
+
+
+def test__api_get_uploads__any_and_exclude_tags__filters(client):
+    tags_by_upload = {
+        "landscape": ["landscape"],
+        "portrait": ["portrait"],
+        "night": ["landscape", "night"],
+    }
+    upload_ids = {}
+    for name, tags in tags_by_upload.items():
+        upload_ids[name] = _create_upload(client, name.encode(), f"{name}.png")
+        client.put(
+            f"/uploads/{upload_ids[name]}/tags", json={"tags": tags}, headers=get_auth_headers()
+        )
+
+    response = client.get(
+        "/uploads",
+        headers=get_auth_headers(),
+        params={"any_tags": ["landscape", "portrait"], "exclude_tags": "night"},
+    )
+
+    assert response.status_code == 200
+    assert {item["upload_id"] for item in response.json()} == {
+        upload_ids["landscape"],
+        upload_ids["portrait"],
+    }
+
+
+def test__api_get_uploads__invalid_cursor__returns_400(client):
+    response = client.get("/uploads", headers=get_auth_headers(), params={"cursor": "garbage"})
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
+
+
+def test__api_get_uploads__cursor_with_offset__returns_400(client):
+    _create_upload(client)
+    first = client.get("/uploads", headers=get_auth_headers(), params={"limit": 1})
+
+    response = client.get(
+        "/uploads",
+        headers=get_auth_headers(),
+        params={"offset": 1, "cursor": first.headers["x-next-cursor"]},
+    )
+
+    assert response.status_code == 400
+
+
+def test__api_get_uploads__includes_image_file_info(client):
+    content = _create_real_image(320, 240)
+    upload_id = _create_upload(client, content, "photo.png")
+
+    response = client.get("/uploads", headers=get_auth_headers())
+
+    item = next(item for item in response.json() if item["upload_id"] == upload_id)
+    assert item["width"] == 320
+    assert item["height"] == 240
+    assert item["byte_size"] == len(content)
+    assert item["image_format"] == "PNG"
+
+
+def test__api_get_upload_tags__includes_image_file_info(client):
+    upload_id = _create_upload(client, _create_real_image(320, 240), "photo.png")
+
+    response = client.get(f"/uploads/{upload_id}/tags", headers=get_auth_headers())
+
+    data = response.json()
+    assert (data["width"], data["height"], data["image_format"]) == (320, 240, "PNG")
+
+
 def test__api_put_upload_tags__set_tags__returns_200_with_tags(client):
     upload_id = _create_upload(client)
 
@@ -594,6 +817,63 @@ def test__api_get_tags__empty__returns_empty(client):
     assert response.json()["tags"] == []
 
 
+def test__api_get_tags__with_counts__returns_uploads_per_tag(client):
+    upload_id1 = _create_upload(client, b"file1", "f1.png")
+    upload_id2 = _create_upload(client, b"file2", "f2.png")
+    client.put(
+        f"/uploads/{upload_id1}/tags",
+        json={"tags": ["nature", "landscape"]},
+        headers=get_auth_headers(),
+    )
+    client.put(f"/uploads/{upload_id2}/tags", json={"tags": ["nature"]}, headers=get_auth_headers())
+    client.delete(f"/uploads/{upload_id1}", headers=get_auth_headers())
+
+    response = client.get("/tags", params={"with_counts": True}, headers=get_auth_headers())
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "tags": ["landscape", "nature"],
+        "counts": {"landscape": 0, "nature": 1},
+    }
+
+
+def test__api_get_tags__without_counts__omits_counts(client):
+    response = client.get("/tags", headers=get_auth_headers())
+
+    assert "counts" not in response.json()
+
+
+def test__api_get_tag_facets__filtered__counts_tags_of_matching_uploads(client):
+    upload_id1 = _create_upload(client, b"file1", "f1.png")
+    upload_id2 = _create_upload(client, b"file2", "f2.png")
+    _create_upload(client, b"file3", "f3.png")
+    client.put(
+        f"/uploads/{upload_id1}/tags",
+        json={"tags": ["nature", "landscape"]},
+        headers=get_auth_headers(),
+    )
+    client.put(
+        f"/uploads/{upload_id2}/tags",
+        json={"tags": ["nature", "urban"]},
+        headers=get_auth_headers(),
+    )
+
+    response = client.get(
+        "/tags/facets",
+        params={"tags": ["nature"], "exclude_tags": ["urban"]},
+        headers=get_auth_headers(),
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"facets": {"landscape": 1, "nature": 1}}
+
+
+def test__api_get_tag_facets__without_auth__returns_401(client):
+    response = client.get("/tags/facets")
+
+    assert response.status_code == 401
+
+
 def test__api_get_tags__without_auth__returns_401(client):
     response = client.get("/tags")
 
@@ -703,12 +983,193 @@ def test__api_get_upload_thumbnail__valid_upload__returns_200_jpeg(client):
     assert max(thumb.size) == 200
 
 
+def test__api_get_upload_thumbnail__size_and_format__returns_variant(client):
+    upload_id = _create_upload(client, _create_real_image(), "photo.png")
+
+    response = client.get(f"/uploads/{upload_id}/thumbnail", params={"size": 800, "format": "webp"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert response.headers["etag"] == f'"{upload_id}-thumbnail-800-webp"'
+    thumb = Image.open(io.BytesIO(response.content))
+    assert thumb.format == "WEBP"
+    assert max(thumb.size) == 800
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        pytest.param({"size": 300}, id="size_not_in_allowlist"),
+        pytest.param({"format": "gif"}, id="unsupported_format"),
+    ],
+)
+def test__api_get_upload_thumbnail__invalid_variant__returns_422(client, params):
+    upload_id = _create_upload(client, _create_real_image(), "photo.png")
+
+    response = client.get(f"/uploads/{upload_id}/thumbnail", params=params)
+
+    assert response.status_code == 422
+
+
+def test__api_head_upload_thumbnail__format__returns_variant_content_type(client):
+    upload_id = _create_upload(client, _create_real_image(), "photo.png")
+
+    response = client.head(f"/uploads/{upload_id}/thumbnail", params={"format": "png"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+
+
+def test__api_post_upload__new_upload__thumbnail_generated_in_background(
+    client, thumbnail_cache, ingest_pool, mocker
+):
+    upload_id = _create_upload(client, _create_real_image(), "photo.png")
+    ingest_pool.join()
+    get_file_content = mocker.spy(OnDiskFileStorage, "get_file_content")
+
+    response = client.get(f"/uploads/{upload_id}/thumbnail")
+
+    assert thumbnail_cache.get(upload_id) == response.content
+    get_file_content.assert_not_called()
+    assert ingest_pool.stats().completed == 1
+
+
+def test__api_post_upload__new_upload__placeholder_listed_after_ingest(client, ingest_pool):
+    upload_id = _create_upload(client, _create_real_image(), "photo.png")
+    ingest_pool.join()
+
+    response = client.get("/uploads", headers=get_auth_headers())
+
+    item = next(item for item in response.json() if item["upload_id"] == upload_id)
+    assert len(item["blurhash"]) == 28
+
+
+def test__api_post_upload__not_an_image__no_placeholder(client, ingest_pool):
+    upload_id = _create_upload(client, b"not an image", "broken.png")
+    ingest_pool.join()
+
+    response = client.get(f"/uploads/{upload_id}/tags", headers=get_auth_headers())
+
+    assert response.json()["blurhash"] is None
+
+
+def test__record_image_hashes__upload_deleted__returns_false(
+    client, thumbnail_service, ingest_pool
+):
+    upload_id = _create_upload(client, _create_real_image(), "photo.png")
+    ingest_pool.join()
+    client.delete(f"/uploads/{upload_id}", headers=get_auth_headers())
+
+    assert not record_image_hashes(thumbnail_service, get_file_storage(), upload_id)
+
+
+def test__api_get_similar_uploads__resized_copy__found(client, ingest_pool):
+    upload_id = _create_upload(client, _create_real_image(800, 600), "photo.png")
+    copy_id = _create_upload(client, _create_real_image(400, 300), "copy.png")
+    ingest_pool.join()
+
+    response = client.get(f"/uploads/{upload_id}/similar", headers=get_auth_headers())
+
+    assert response.status_code == 200
+    assert {"upload_id": copy_id, "distance": 0} in response.json()
+
+
+def test__api_get_similar_uploads__nonexistent_upload__returns_404(client):
+    response = client.get("/uploads/nonexistent/similar", headers=get_auth_headers())
+
+    assert response.status_code == 404
+
+
+def test__api_get_similar_uploads__distance_above_maximum__returns_422(client):
+    upload_id = _create_upload(client, _create_real_image(), "photo.png")
+
+    response = client.get(
+        f"/uploads/{upload_id}/similar",
+        params={"max_distance": 64},
+        headers=get_auth_headers(),
+    )
+
+    assert response.status_code == 422
+
+
+def test__api_get_similar_uploads__without_auth__returns_401(client):
+    upload_id = _create_upload(client, _create_real_image(), "photo.png")
+
+    response = client.get(f"/uploads/{upload_id}/similar")
+
+    assert response.status_code == 401
+
+
+def test__api_post_upload__existing_upload__no_thumbnail_job(client, ingest_pool, mocker):
+    _create_upload(client, _create_real_image(), "photo.png")
+    ingest_pool.join()
+    submit = mocker.spy(ingest_pool, "submit")
+
+    _create_upload(client, _create_real_image(), "photo.png")
+
+    submit.assert_not_called()
+
+
+def test__api_post_upload__ingest_job_submitted__upload_already_committed(
+    client, ingest_pool, mocker
+):
+    committed_at_submit = []
+
+    def submit(*args):
+        # A separate session only sees committed rows.
+        with Session(engine) as session:
+            committed_at_submit.append(session.exec(select(UploadMetaData)).first() is not None)
+        return True
+
+    mocker.patch.object(ingest_pool, "submit", side_effect=submit)
+
+    _create_upload(client, _create_real_image(), "photo.png")
+
+    assert committed_at_submit == [True]
+
+
+def test__api_post_upload__ingest_queue_full__upload_still_succeeds(client, ingest_pool, mocker):
+    mocker.patch.object(ingest_pool, "submit", return_value=False)
+
+    upload_id = _create_upload(client, _create_real_image(), "photo.png")
+    response = client.get(f"/uploads/{upload_id}/thumbnail")
+
+    assert response.status_code == 200
+
+
+def test__warm_recent_thumbnails__warms_most_recent_uploads(client, thumbnail_service, ingest_pool):
+    older = _create_upload(client, _create_real_image(100, 100), "older.png")
+    newer = _create_upload(client, _create_real_image(200, 200), "newer.png")
+    ingest_pool.join()
+    thumbnail_service.evict(older)
+    thumbnail_service.evict(newer)
+
+    warm_recent_thumbnails(thumbnail_service, count=1)
+
+    assert thumbnail_service.peek(newer) is not None
+    assert thumbnail_service.peek(older) is None
+
+
 def test__api_get_upload_thumbnail__nonexistent_upload__returns_404(client):
     response = client.get("/uploads/nonexistent/thumbnail")
 
     assert response.status_code == 404
 
 
+@pytest.mark.parametrize("upload_id", ["%2E", "%2E%2E"])
+@pytest.mark.parametrize("method", ["GET", "HEAD"])
+def test__api_upload_thumbnail__dot_upload_id_with_disk_cache__returns_404(
+    client, tmp_path, upload_id, method
+):
+    app.state.thumbnail_service = OnDiskThumbnailService(
+        cache=InMemoryThumbnailCache(), store=OnDiskThumbnailStore(tmp_path)
+    )
+
+    response = client.request(method, f"/uploads/{upload_id}/thumbnail")
+
+    assert response.status_code == 404
+
+
 def test__api_get_upload_thumbnail__cached_on_second_request__same_content(client):
     upload_id = _create_upload(client, _create_real_image(), "photo.png")
 
@@ -718,6 +1179,106 @@ def test__api_get_upload_thumbnail__cached_on_second_request__same_content(clien
     assert first.content == second.content
 
 
+def test__api_get_upload_thumbnail__sets_etag_and_immutable_caching(client):
+    upload_id = _create_upload(client, _create_real_image(), "photo.png")
+
+    response = client.get(f"/uploads/{upload_id}/thumbnail")
+
+    assert response.headers["etag"] == f'"{upload_id}-thumbnail"'
+    assert "immutable" in response.headers["cache-control"]
+
+
+def test__api_get_upload_thumbnail__matching_if_none_match__returns_304_without_reading(
+    client, ingest_pool, mocker
+):
+    upload_id = _create_upload(client, _create_real_image(), "photo.png")
+    ingest_pool.join()
+    get_file_content = mocker.spy(OnDiskFileStorage, "get_file_content")
+
+    response = client.get(
+        f"/uploads/{upload_id}/thumbnail",
+        headers={"If-None-Match": f'"{upload_id}-thumbnail"'},
+    )
+
+    assert response.status_code == 304
+    get_file_content.assert_not_called()
+
+
+def test__api_head_upload_thumbnail__not_cached__omits_length_and_does_not_generate(
+    client, thumbnail_cache, ingest_pool
+):
+    upload_id = _create_upload(client, _create_real_image(), "photo.png")
+    ingest_pool.join()
+    thumbnail_cache.evict(upload_id)
+
+    response = client.head(f"/uploads/{upload_id}/thumbnail")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    assert response.headers["etag"] == f'"{upload_id}-thumbnail"'
+    assert "content-length" not in response.headers
+    assert thumbnail_cache.get(upload_id) is None
+
+
+def test__api_head_upload_thumbnail__cached__returns_length(client):
+    upload_id = _create_upload(client, _create_real_image(), "photo.png")
+    thumbnail = client.get(f"/uploads/{upload_id}/thumbnail")
+
+    response = client.head(f"/uploads/{upload_id}/thumbnail")
+
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(len(thumbnail.content))
+
+
+def test__api_head_upload_thumbnail__known_corrupted_image__returns_422_like_get(
+    client, ingest_pool
+):
+    upload_id = _create_upload(client, b"not an image", "broken.png")
+    ingest_pool.join()
+    get_response = client.get(f"/uploads/{upload_id}/thumbnail")
+
+    response = client.head(f"/uploads/{upload_id}/thumbnail")
+
+    assert get_response.status_code == 422
+    assert response.status_code == 422
+
+
+def test__api_head_upload_thumbnail__nonexistent_upload__returns_404(client):
+    response = client.head("/uploads/nonexistent/thumbnail")
+
+    assert response.status_code == 404
+
+
+def test__api_get_upload_thumbnail__cache_hit__skips_database_and_storage(
+    client, ingest_pool, mocker
+):
+    upload_id = _create_upload(client, _create_real_image(), "photo.png")
+    ingest_pool.join()
+    first = client.get(f"/uploads/{upload_id}/thumbnail")
+    get_metadata = mocker.spy(UploadService, "get_metadata")
+    get_file_content = mocker.spy(OnDiskFileStorage, "get_file_content")
+
+    second = client.get(f"/uploads/{upload_id}/thumbnail")
+
+    assert second.content == first.content
+    get_metadata.assert_not_called()
+    get_file_content.assert_not_called()
+
+
+def test__api_get_upload_thumbnail__cache_miss__reads_metadata_once(
+    client, thumbnail_cache, ingest_pool, mocker
+):
+    upload_id = _create_upload(client, _create_real_image(), "photo.png")
+    ingest_pool.join()
+    thumbnail_cache.evict(upload_id)
+    get_metadata = mocker.spy(UploadService, "get_metadata")
+
+    response = client.get(f"/uploads/{upload_id}/thumbnail")
+
+    assert response.status_code == 200
+    assert get_metadata.call_count == 1
+
+
 def test__api_get_upload_thumbnail__after_delete__returns_404(client):
     upload_id = _create_upload(client, _create_real_image(), "photo.png")
 
@@ -736,6 +1297,37 @@ def test__api_get_upload_thumbnail__corrupted_image_bytes__returns_422(client):
     assert response.status_code == 422
 
 
+def test__api_get_upload_thumbnail__known_corrupted_image__returns_422_without_reading(
+    client, ingest_pool, mocker
+):
+    upload_id = _create_upload(client, b"not an image", "broken.png")
+    ingest_pool.join()
+    client.get(f"/uploads/{upload_id}/thumbnail")
+    read_upload = mocker.spy(UploadService, "read_upload")
+    get_file_content = mocker.spy(OnDiskFileStorage, "get_file_content")
+
+    response = client.get(f"/uploads/{upload_id}/thumbnail")
+
+    assert response.status_code == 422
+    read_upload.assert_not_called()
+    get_file_content.assert_not_called()
+
+
+def test__api_get_upload_thumbnail__stored_dimensions_over_limit__422_without_reading(
+    client, ingest_pool, monkeypatch, mocker
+):
+    upload_id = _create_upload(client, _create_real_image(800, 600), "photo.png")
+    ingest_pool.join()
+    # Limit lowered after ingest; the stored dimensions answer without a read.
+    monkeypatch.setenv("MAX_IMAGE_PIXELS", "1000")
+    get_file_content = mocker.spy(OnDiskFileStorage, "get_file_content")
+
+    response = client.get(f"/uploads/{upload_id}/thumbnail", params={"size": 800})
+
+    assert response.status_code == 422
+    get_file_content.assert_not_called()
+
+
 @pytest.fixture
 def webhook_route(respx_mock):
     return respx_mock.post(WEBHOOK_URL).mock(return_value=httpx.Response(200))
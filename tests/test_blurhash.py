@@ -0,0 +1,39 @@
+import io
+
+import pytest
+from PIL import Image, UnidentifiedImageError
+
+from lenzr_server.blurhash import _BASE83, encode_blurhash
+
+
+def _gradient_image() -> bytes:
+    image = Image.new("RGB", (32, 24))
+    image.putdata([(x * 8, y * 10, 128) for y in range(24) for x in range(32)])
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+def test__encode_blurhash__matches_reference_encoder():
+    # Reference value from the upstream blurhash package for the same pixels.
+    assert encode_blurhash(_gradient_image()) == "LxH27k2swxX8mHWWjtf7gJfjfQfj"
+
+
+def test__encode_blurhash__length_follows_components(create_test_image):
+    blurhash = encode_blurhash(create_test_image(), x_components=5, y_components=4)
+
+    assert len(blurhash) == 4 + 2 * 5 * 4
+
+
+def test__encode_blurhash__solid_colour__average_colour_encoded(create_test_image):
+    blurhash = encode_blurhash(create_test_image(color=(255, 0, 0)))
+
+    average = 0
+    for char in blurhash[2:6]:
+        average = average * 83 + _BASE83.index(char)
+    assert average == 0xFF0000
+
+
+def test__encode_blurhash__not_an_image__raises():
+    with pytest.raises(UnidentifiedImageError):
+        encode_blurhash(b"Hello, world!")
@@ -0,0 +1,289 @@
+import contextlib
+import datetime
+
+import pytest
+
+from lenzr_server import cli
+from lenzr_server.cli import (
+    BackfillCheckpoint,
+    backfill_file_info,
+    backfill_image_hashes,
+    backfill_thumbnails,
+)
+from lenzr_server.file_storages.on_disk_file_storage import OnDiskFileStorage
+from lenzr_server.thumbnail_service import ThumbnailFormat, ThumbnailSize, ThumbnailSpec
+from lenzr_server.upload_id_creators.hashing_id_creator import HashingIDCreator
+from lenzr_server.upload_service import UploadService
+
+SPECS = [ThumbnailSpec(), ThumbnailSpec(size=120, format=ThumbnailFormat.WEBP)]
+
+
+@pytest.fixture
+def file_storage(tmp_path):
+    return OnDiskFileStorage(tmp_path / "uploads")
+
+
+@pytest.fixture
+def upload_service(database_session, file_storage):
+    return UploadService(file_storage, database_session, HashingIDCreator(0))
+
+
+@pytest.fixture
+def uploads(upload_service, database_session, create_test_image):
+    created = []
+    for hour in range(1, 6):
+        upload = upload_service.add_upload(create_test_image(100 + hour, 100), "image/png")
+        upload.created_at = datetime.datetime(2026, 1, 1, hour, tzinfo=datetime.UTC)
+        database_session.add(upload)
+        created.append(upload)
+    database_session.commit()
+    return created
+
+
+def _backfill(upload_service, thumbnail_service, file_storage, **kwargs):
+    return backfill_thumbnails(
+        upload_service=upload_service,
+        thumbnail_service=thumbnail_service,
+        file_storage=file_storage,
+        specs=SPECS,
+        workers=2,
+        batch_size=2,
+        **kwargs,
+    )
+
+
+def test__backfill_thumbnails__generates_all_specs(
+    upload_service, thumbnail_service, file_storage, uploads
+):
+    progress = _backfill(upload_service, thumbnail_service, file_storage)
+
+    assert progress.uploads == 5
+    assert progress.thumbnails == 10
+    assert progress.failed == 0
+    for upload in uploads:
+        assert all(thumbnail_service.peek(upload.upload_id, spec) for spec in SPECS)
+
+
+def test__backfill_thumbnails__undecodable_upload__counted_as_failed(
+    upload_service, thumbnail_service, file_storage, uploads
+):
+    upload_service.add_upload(b"not an image", "image/png")
+
+    progress = _backfill(upload_service, thumbnail_service, file_storage)
+
+    assert progress.uploads == 6
+    assert progress.failed == 2
+
+
+def test__backfill_thumbnails__limit__processes_most_recent(
+    upload_service, thumbnail_service, file_storage, uploads
+):
+    progress = _backfill(upload_service, thumbnail_service, file_storage, limit=3)
+
+    assert progress.uploads == 3
+    assert thumbnail_service.peek(uploads[-1].upload_id) is not None
+    assert thumbnail_service.peek(uploads[0].upload_id) is None
+
+
+def test__backfill_thumbnails__date_range__only_matching_uploads(
+    upload_service, thumbnail_service, file_storage, uploads
+):
+    progress = _backfill(
+        upload_service,
+        thumbnail_service,
+        file_storage,
+        since=datetime.datetime(2026, 1, 1, 2, tzinfo=datetime.UTC),
+        until=datetime.datetime(2026, 1, 1, 4, tzinfo=datetime.UTC),
+    )
+
+    assert progress.uploads == 2
+    assert thumbnail_service.peek(uploads[1].upload_id) is not None
+    assert thumbnail_service.peek(uploads[3].upload_id) is None
+
+
+def test__backfill_thumbnails__reports_progress_per_batch(
+    upload_service, thumbnail_service, file_storage, uploads
+):
+    reported: list[int] = []
+
+    _backfill(
+        upload_service,
+        thumbnail_service,
+        file_storage,
+        report=lambda progress: reported.append(progress.uploads),
+    )
+
+    assert reported == [2, 4, 5]
+
+
+def test__backfill_thumbnails__checkpoint__resumes_after_last_batch(
+    upload_service, thumbnail_service, file_storage, uploads, tmp_path
+):
+    checkpoint = BackfillCheckpoint(tmp_path / "checkpoint.json")
+    _backfill(upload_service, thumbnail_service, file_storage, limit=2, checkpoint=checkpoint)
+
+    resumed = _backfill(upload_service, thumbnail_service, file_storage, checkpoint=checkpoint)
+
+    assert resumed.uploads == 3
+    assert all(thumbnail_service.peek(upload.upload_id) for upload in uploads)
+
+
+@pytest.fixture
+def legacy_uploads(uploads, database_session):
+    for upload in uploads:
+        upload.width = upload.height = upload.byte_size = upload.image_format = None
+        database_session.add(upload)
+    database_session.commit()
+    return uploads
+
+
+def _backfill_file_info(upload_service, **kwargs):
+    return backfill_file_info(
+        upload_services=lambda: contextlib.nullcontext(upload_service),
+        workers=2,
+        batch_size=2,
+        **kwargs,
+    )
+
+
+def test__backfill_file_info__records_size_dimensions_and_format(
+    upload_service, file_storage, legacy_uploads
+):
+    progress = _backfill_file_info(upload_service)
+
+    assert progress.uploads == 5
+    assert progress.failed == 0
+    for upload in legacy_uploads:
+        stored = upload_service.get_metadata(upload.upload_id)
+        assert stored.byte_size == len(file_storage.get_file_content(upload.upload_id))
+        assert (stored.height, stored.image_format) == (100, "PNG")
+        assert stored.width is not None
+
+
+def test__backfill_file_info__skips_rows_already_recorded(upload_service, legacy_uploads, mocker):
+    probe = mocker.spy(upload_service, "probe_stored_file")
+    _backfill_file_info(upload_service, limit=2)
+
+    progress = _backfill_file_info(upload_service)
+
+    assert progress.uploads == 3
+    assert probe.call_count == 5
+
+
+def test__backfill_file_info__missing_file__counted_as_failed(
+    upload_service, file_storage, legacy_uploads
+):
+    file_storage.delete_file_content(legacy_uploads[0].upload_id)
+
+    progress = _backfill_file_info(upload_service)
+
+    assert progress.uploads == 5
+    assert progress.failed == 1
+    assert upload_service.get_metadata(legacy_uploads[0].upload_id).byte_size is None
+
+
+def _backfill_image_hashes(upload_service, thumbnail_service, file_storage, **kwargs):
+    return backfill_image_hashes(
+        upload_services=lambda: contextlib.nullcontext(upload_service),
+        thumbnail_service=thumbnail_service,
+        file_storage=file_storage,
+        workers=2,
+        batch_size=2,
+        **kwargs,
+    )
+
+
+def test__backfill_image_hashes__records_blurhash_and_dhash(
+    upload_service, thumbnail_service, file_storage, uploads
+):
+    progress = _backfill_image_hashes(upload_service, thumbnail_service, file_storage)
+
+    assert progress.uploads == 5
+    assert progress.failed == 0
+    for upload in uploads:
+        stored = upload_service.get_metadata(upload.upload_id)
+        assert stored.blurhash is not None
+        assert stored.dhash_0 is not None
+
+
+def test__backfill_image_hashes__skips_uploads_already_hashed(
+    upload_service, thumbnail_service, file_storage, uploads
+):
+    _backfill_image_hashes(upload_service, thumbnail_service, file_storage, limit=2)
+
+    progress = _backfill_image_hashes(upload_service, thumbnail_service, file_storage)
+
+    assert progress.uploads == 3
+
+
+def test__backfill_image_hashes__undecodable_upload__visited_once_and_counted_as_failed(
+    upload_service, thumbnail_service, file_storage, uploads, mocker
+):
+    undecodable = upload_service.add_upload(b"not an image", "image/png")
+    get_thumbnail = mocker.spy(thumbnail_service, "get_thumbnail")
+
+    progress = _backfill_image_hashes(upload_service, thumbnail_service, file_storage)
+
+    assert progress.uploads == 6
+    assert progress.failed == 1
+    assert get_thumbnail.call_count == 6
+    assert upload_service.get_metadata(undecodable.upload_id).blurhash is None
+
+
+def test__checkpoint_load__missing_file__returns_none(tmp_path):
+    assert BackfillCheckpoint(tmp_path / "missing.json").load() is None
+
+
+def test__main__backfill_command__passes_options(mocker):
+    backfill = mocker.patch.object(cli, "backfill_thumbnails")
+    mocker.patch.object(cli, "thumbnail_service_from_env")
+    mocker.patch.object(cli, "upload_service_scope")
+
+    cli.main(
+        [
+            "thumbnails",
+            "backfill",
+            "--size",
+            "120",
+            "--size",
+            "800",
+            "--format",
+            "webp",
+            "--since",
+            "2026-01-01",
+            "--workers",
+            "3",
+        ]
+    )
+
+    kwargs = backfill.call_args.kwargs
+    assert kwargs["specs"] == [
+        ThumbnailSpec(size=ThumbnailSize.GRID, format=ThumbnailFormat.WEBP),
+        ThumbnailSpec(size=ThumbnailSize.DETAIL, format=ThumbnailFormat.WEBP),
+    ]
+    assert kwargs["since"] == datetime.datetime(2026, 1, 1, tzinfo=datetime.UTC)
+    assert kwargs["workers"] == 3
+    assert kwargs["checkpoint"] is None
+
+
+def test__main__backfill_file_info_command__passes_options(mocker):
+    backfill = mocker.patch.object(cli, "backfill_file_info")
+
+    cli.main(["uploads", "backfill-file-info", "--workers", "4", "--limit", "10"])
+
+    kwargs = backfill.call_args.kwargs
+    assert kwargs["upload_services"] is cli.upload_service_scope
+    assert kwargs["workers"] == 4
+    assert kwargs["limit"] == 10
+
+
+def test__main__backfill_hashes_command__passes_options(mocker):
+    backfill = mocker.patch.object(cli, "backfill_image_hashes")
+    mocker.patch.object(cli, "thumbnail_service_from_env")
+
+    cli.main(["uploads", "backfill-hashes", "--workers", "4", "--batch-size", "50"])
+
+    kwargs = backfill.call_args.kwargs
+    assert kwargs["upload_services"] is cli.upload_service_scope
+    assert kwargs["workers"] == 4
+    assert kwargs["batch_size"] == 50
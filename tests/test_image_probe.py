@@ -0,0 +1,63 @@
+import io
+
+import pytest
+from PIL import Image, ImageFile
+
+from lenzr_server.image_probe import (
+    ImageInfo,
+    ImageTooLargeException,
+    exceeds_pixel_limit,
+    get_max_image_pixels,
+    probe_image,
+)
+
+
+@pytest.mark.parametrize("image_format", ["PNG", "JPEG", "WEBP", "GIF"])
+def test__probe_image__valid_image__returns_dimensions_and_format(create_test_image, image_format):
+    content = create_test_image(320, 240, image_format=image_format)
+
+    assert probe_image(io.BytesIO(content)) == ImageInfo(320, 240, image_format)
+
+
+def test__probe_image__does_not_decode_pixels(create_test_image, mocker):
+    content = create_test_image(320, 240, image_format="JPEG")
+    load = mocker.spy(ImageFile.ImageFile, "load")
+
+    probe_image(io.BytesIO(content))
+
+    load.assert_not_called()
+
+
+def test__probe_image__not_an_image__returns_none():
+    assert probe_image(io.BytesIO(b"Hello, world!")) is None
+
+
+def test__probe_image__over_pixel_limit__raises(create_test_image):
+    content = create_test_image(200, 100)
+
+    with pytest.raises(ImageTooLargeException):
+        probe_image(io.BytesIO(content), max_pixels=200 * 100 - 1)
+
+
+def test__probe_image__at_pixel_limit__accepted(create_test_image):
+    content = create_test_image(200, 100)
+
+    assert probe_image(io.BytesIO(content), max_pixels=200 * 100) is not None
+
+
+def test__probe_image__beyond_pillow_bomb_limit__raises(create_test_image, monkeypatch):
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    content = create_test_image(200, 100)
+
+    with pytest.raises(ImageTooLargeException):
+        probe_image(io.BytesIO(content))
+
+
+def test__exceeds_pixel_limit__no_limit__false():
+    assert not exceeds_pixel_limit(100_000, 100_000, None)
+
+
+def test__get_max_image_pixels__from_env(monkeypatch):
+    monkeypatch.setenv("MAX_IMAGE_PIXELS", "1234")
+
+    assert get_max_image_pixels() == 1234
@@ -0,0 +1,89 @@
+import threading
+import time
+
+from lenzr_server.keyed_lock import KeyedLock
+
+
+def test__hold__same_key__serialises_holders():
+    locks = KeyedLock()
+    active = 0
+    max_active = 0
+    counter_lock = threading.Lock()
+
+    def worker():
+        nonlocal active, max_active
+        with locks.hold("key"):
+            with counter_lock:
+                active += 1
+                max_active = max(max_active, active)
+            time.sleep(0.01)
+            with counter_lock:
+                active -= 1
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert max_active == 1
+
+
+def test__hold__different_keys__do_not_block_each_other():
+    locks = KeyedLock()
+    entered = threading.Event()
+
+    def worker():
+        with locks.hold("other"):
+            entered.set()
+
+    with locks.hold("key"):
+        thread = threading.Thread(target=worker)
+        thread.start()
+        assert entered.wait(timeout=1)
+    thread.join()
+
+
+def test__hold__released__forgets_key():
+    locks = KeyedLock()
+
+    with locks.hold("key"):
+        assert len(locks) == 1
+
+    assert len(locks) == 0
+
+
+def test__hold__exception_inside__releases_lock():
+    locks = KeyedLock()
+
+    try:
+        with locks.hold("key"):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+
+    with locks.hold("key"):
+        pass
+    assert len(locks) == 0
+
+
+def test__release__from_other_thread__wakes_waiter():
+    locks = KeyedLock()
+    locks.acquire("key")
+    acquired = threading.Event()
+
+    def waiter():
+        with locks.hold("key"):
+            acquired.set()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    assert not acquired.wait(timeout=0.05)
+
+    releaser = threading.Thread(target=locks.release, args=("key",))
+    releaser.start()
+    releaser.join()
+
+    assert acquired.wait(timeout=1)
+    thread.join()
+    assert len(locks) == 0
@@ -0,0 +1,169 @@
+import stat
+from unittest.mock import MagicMock
+
+import pytest
+
+from lenzr_server.file_storages.on_disk_file_storage import DEFAULT_FILE_MODE
+from lenzr_server.thumbnail_service import (
+    InMemoryThumbnailCache,
+    OnDiskThumbnailService,
+    OnDiskThumbnailStore,
+    ThumbnailFormat,
+    ThumbnailSpec,
+    thumbnail_service_from_env,
+)
+from lenzr_server.thumbnail_service.factory import get_thumbnail_storage_path
+
+
+@pytest.fixture
+def store(tmp_path) -> OnDiskThumbnailStore:
+    return OnDiskThumbnailStore(tmp_path / "thumbnails")
+
+
+@pytest.fixture
+def on_disk_service(store) -> OnDiskThumbnailService:
+    return OnDiskThumbnailService(cache=InMemoryThumbnailCache(), store=store)
+
+
+def test__store_get__missing_entry__returns_none(store):
+    assert store.get("upload1", "200.jpg") is None
+
+
+def test__store_set__then_get__returns_value(store):
+    store.set("upload1", "200.jpg", b"thumbnail")
+
+    assert store.get("upload1", "200.jpg") == b"thumbnail"
+
+
+def test__store_set__umask_default_mode(store, tmp_path):
+    store.set("upload1", "200.jpg", b"thumbnail")
+
+    mode = (tmp_path / "thumbnails" / "up" / "upload1" / "200.jpg").stat().st_mode
+    assert stat.S_IMODE(mode) == DEFAULT_FILE_MODE
+
+
+def test__store_evict__removes_all_variants(store):
+    store.set("upload1", "200.jpg", b"small")
+    store.set("upload1", "800.jpg", b"large")
+
+    store.evict("upload1")
+
+    assert store.get("upload1", "200.jpg") is None
+    assert store.get("upload1", "800.jpg") is None
+
+
+def test__store_evict__missing_entry__no_error(store):
+    store.evict("upload1")
+
+
+@pytest.mark.parametrize(
+    "upload_id",
+    [
+        pytest.param("", id="empty"),
+        pytest.param("..", id="parent_dir"),
+        pytest.param("../escape", id="parent_traversal"),
+    ],
+)
+def test__store__rejects_traversal_attempts(store, upload_id):
+    with pytest.raises(ValueError):
+        store.set(upload_id, "200.jpg", b"x")
+
+
+@pytest.mark.parametrize("upload_id", [".", ".."])
+def test__peek__invalid_upload_id__miss(on_disk_service, store, upload_id):
+    assert store.get(upload_id, "200.jpg") is None
+    assert on_disk_service.peek(upload_id) is None
+
+
+def test__get_thumbnail__miss__persists_to_store(on_disk_service, store, create_test_image):
+    thumbnail = on_disk_service.get_thumbnail("upload1", lambda: create_test_image(800, 600))
+
+    assert store.get("upload1", "200.jpg") == thumbnail.content
+
+
+def test__get_thumbnail__new_worker__served_from_disk_without_loading(
+    on_disk_service, store, create_test_image
+):
+    first = on_disk_service.get_thumbnail("upload1", lambda: create_test_image(800, 600))
+    other_worker = OnDiskThumbnailService(cache=InMemoryThumbnailCache(), store=store)
+    load_content = MagicMock()
+
+    second = other_worker.get_thumbnail("upload1", load_content)
+
+    assert second.content == first.content
+    load_content.assert_not_called()
+
+
+def test__peek__only_on_disk__returns_thumbnail(on_disk_service, store):
+    store.set("upload1", "200.jpg", b"thumbnail")
+
+    thumbnail = on_disk_service.peek("upload1")
+
+    assert thumbnail is not None
+    assert thumbnail.content == b"thumbnail"
+
+
+def test__evict__removes_memory_and_disk_entries(on_disk_service, store, create_test_image):
+    on_disk_service.get_thumbnail("upload1", lambda: create_test_image(800, 600))
+
+    on_disk_service.evict("upload1")
+
+    assert on_disk_service.peek("upload1") is None
+    assert store.get("upload1", "200.jpg") is None
+
+
+def test__thumbnail_storage_path__configured__uses_env(monkeypatch, tmp_path):
+    monkeypatch.setenv("THUMBNAIL_STORAGE_PATH", str(tmp_path / "custom"))
+
+    assert get_thumbnail_storage_path() == tmp_path / "custom"
+
+
+def test__thumbnail_storage_path__unset__defaults_next_to_uploads(monkeypatch, tmp_path):
+    monkeypatch.delenv("THUMBNAIL_STORAGE_PATH", raising=False)
+    monkeypatch.setenv("UPLOAD_STORAGE_PATH", str(tmp_path))
+
+    assert get_thumbnail_storage_path() == tmp_path / ".thumbnails"
+
+
+def test__thumbnail_service_from_env__returns_on_disk_service(monkeypatch, tmp_path):
+    monkeypatch.setenv("THUMBNAIL_STORAGE_PATH", str(tmp_path))
+
+    with thumbnail_service_from_env() as service:
+        assert isinstance(service, OnDiskThumbnailService)
+
+
+def test__get_thumbnail__evicted_during_generation__not_persisted(
+    on_disk_service, store, create_test_image
+):
+    original = create_test_image(800, 600)
+
+    def load_content() -> bytes:
+        on_disk_service.evict("upload1")
+        return original
+
+    on_disk_service.get_thumbnail("upload1", load_content)
+
+    assert store.get("upload1", "200.jpg") is None
+
+
+def test__get_thumbnail__variant__persisted_under_its_own_name(
+    on_disk_service, store, create_test_image
+):
+    spec = ThumbnailSpec(size=800, format=ThumbnailFormat.WEBP)
+
+    thumbnail = on_disk_service.get_thumbnail(
+        "upload1", lambda: create_test_image(1600, 1200), spec
+    )
+
+    assert store.get("upload1", "800.webp") == thumbnail.content
+    assert store.get("upload1", "200.jpg") is None
+
+
+def test__evict__drops_all_variants_on_disk(on_disk_service, store, create_test_image):
+    for spec in (ThumbnailSpec(), ThumbnailSpec(size=120, format=ThumbnailFormat.PNG)):
+        on_disk_service.get_thumbnail("upload1", lambda: create_test_image(800, 600), spec)
+
+    on_disk_service.evict("upload1")
+
+    assert store.get("upload1", "200.jpg") is None
+    assert store.get("upload1", "120.png") is None
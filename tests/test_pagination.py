@@ -0,0 +1,33 @@
+import datetime
+import uuid
+
+import pytest
+
+from lenzr_server.pagination import InvalidCursorException, decode_cursor, encode_cursor
+
+
+def test__encode_cursor__round_trips_position():
+    position = (datetime.datetime(2026, 1, 2, 3, 4, 5, 678901), uuid.uuid4())
+
+    assert decode_cursor(encode_cursor(position)) == position
+
+
+def test__encode_cursor__url_safe():
+    cursor = encode_cursor((datetime.datetime(2026, 1, 1), uuid.uuid4()))
+
+    assert cursor.replace("-", "").replace("_", "").isalnum()
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        pytest.param("", id="empty"),
+        pytest.param("not a cursor!", id="not_base64"),
+        pytest.param("bm90IGpzb24", id="not_json"),
+        pytest.param("WzFd", id="wrong_shape"),
+        pytest.param("WyJ5ZXN0ZXJkYXkiLCAieCJd", id="wrong_values"),
+    ],
+)
+def test__decode_cursor__malformed__raises(cursor):
+    with pytest.raises(InvalidCursorException):
+        decode_cursor(cursor)
@@ -0,0 +1,80 @@
+import io
+import random
+
+import pytest
+from PIL import Image, ImageFilter, UnidentifiedImageError
+
+from lenzr_server.perceptual_hash import (
+    CHUNKS,
+    candidate_chunks,
+    chunk_neighbours,
+    dhash,
+    hamming_distance,
+    join_hash,
+    split_hash,
+)
+
+
+def _photo(width: int = 640, height: int = 480, seed: int = 1) -> Image.Image:
+    # Blurred noise has structure at every scale, like a photo.
+    rng = random.Random(seed)
+    noise = Image.new("L", (64, 48))
+    noise.putdata([rng.randrange(256) for _ in range(64 * 48)])
+    return noise.filter(ImageFilter.GaussianBlur(3)).resize((width, height)).convert("RGB")
+
+
+def _encode(image: Image.Image, image_format: str = "PNG", **options) -> bytes:
+    output = io.BytesIO()
+    image.save(output, format=image_format, **options)
+    return output.getvalue()
+
+
+def test__dhash__resized_and_reencoded_copy__within_small_distance():
+    original = _photo()
+    copy = original.resize((320, 240))
+
+    distance = hamming_distance(dhash(_encode(original)), dhash(_encode(copy, "JPEG", quality=60)))
+
+    assert distance <= 4
+
+
+def test__dhash__different_images__far_apart():
+    distance = hamming_distance(dhash(_encode(_photo(seed=1))), dhash(_encode(_photo(seed=2))))
+
+    assert distance > 16
+
+
+def test__dhash__is_64_bits():
+    assert dhash(_encode(_photo())).bit_length() <= 64
+
+
+def test__dhash__not_an_image__raises():
+    with pytest.raises(UnidentifiedImageError):
+        dhash(b"Hello, world!")
+
+
+def test__split_hash__join_hash__round_trip():
+    value = 0x0123_4567_89AB_CDEF
+
+    assert split_hash(value) == (0x0123, 0x4567, 0x89AB, 0xCDEF)
+    assert join_hash(split_hash(value)) == value
+
+
+def test__chunk_neighbours__counts_values_within_distance():
+    neighbours = list(chunk_neighbours(0, 2))
+
+    assert len(neighbours) == 1 + 16 + 120
+    assert len(set(neighbours)) == len(neighbours)
+
+
+def test__candidate_chunks__every_hash_within_distance_shares_a_candidate_chunk():
+    rng = random.Random(7)
+    value = rng.getrandbits(64)
+    candidates = [set(chunk) for chunk in candidate_chunks(value, 11)]
+
+    for _ in range(500):
+        other = value
+        for bit in rng.sample(range(64), rng.randint(0, 11)):
+            other ^= 1 << bit
+        chunks = split_hash(other)
+        assert any(chunks[index] in candidates[index] for index in range(CHUNKS))
@@ -0,0 +1,101 @@
+import io
+import os
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from PIL import Image
+
+from lenzr_server.thumbnail_service import (
+    DEFAULT_THUMBNAIL_SPEC,
+    InMemoryThumbnailCache,
+    InMemoryThumbnailService,
+    InvalidImageException,
+    ProcessPoolThumbnailRenderer,
+    render_thumbnail,
+    thumbnail_service_from_env,
+)
+
+
+@pytest.fixture(scope="module")
+def renderer():
+    renderer = ProcessPoolThumbnailRenderer(max_workers=1)
+    yield renderer
+    renderer.shutdown()
+
+
+def test__render__matches_in_process_rendering(renderer, create_test_image):
+    original = create_test_image(800, 600, image_format="JPEG")
+
+    assert renderer(original, DEFAULT_THUMBNAIL_SPEC) == render_thumbnail(
+        original, DEFAULT_THUMBNAIL_SPEC
+    )
+
+
+def test__render__invalid_image__raises_invalid_image_exception(renderer):
+    with pytest.raises(InvalidImageException):
+        renderer(b"not an image", DEFAULT_THUMBNAIL_SPEC)
+
+
+def test__render__empty_content__raises_invalid_image_exception(renderer):
+    with pytest.raises(InvalidImageException):
+        renderer(b"", DEFAULT_THUMBNAIL_SPEC)
+
+
+def test__get_thumbnail__with_process_pool__caches_and_evicts(renderer, create_test_image):
+    cache = InMemoryThumbnailCache()
+    service = InMemoryThumbnailService(cache=cache, renderer=renderer)
+
+    thumbnail = service.get_thumbnail("upload1", lambda: create_test_image(800, 600))
+
+    assert Image.open(io.BytesIO(thumbnail.content)).size == (200, 150)
+    assert cache.get("upload1") == thumbnail.content
+    service.evict("upload1")
+    assert cache.get("upload1") is None
+
+
+def test__thumbnail_service_from_env__workers_set__renders_in_process_pool(
+    monkeypatch, tmp_path, create_test_image, mocker
+):
+    monkeypatch.setenv("THUMBNAIL_STORAGE_PATH", str(tmp_path))
+    monkeypatch.setenv("THUMBNAIL_WORKERS", "1")
+    render = mocker.spy(ProcessPoolThumbnailRenderer, "__call__")
+    shutdown = mocker.spy(ProcessPoolThumbnailRenderer, "shutdown")
+
+    with thumbnail_service_from_env() as service:
+        service.get_thumbnail("upload1", lambda: create_test_image(800, 600))
+
+    render.assert_called_once()
+    shutdown.assert_called_once()
+
+
+@pytest.fixture
+def own_renderer():
+    renderer = ProcessPoolThumbnailRenderer(max_workers=1)
+    yield renderer
+    renderer.shutdown()
+
+
+def test__render__pool_broken_earlier__restarts_pool_and_renders(own_renderer, create_test_image):
+    with pytest.raises(BrokenProcessPool):
+        own_renderer._executor.submit(os._exit, 1).result()
+
+    thumbnail = own_renderer(create_test_image(800, 600), DEFAULT_THUMBNAIL_SPEC)
+
+    assert Image.open(io.BytesIO(thumbnail)).size == (200, 150)
+
+
+def test__render__worker_dies_while_rendering__raises_invalid_image_and_restarts(
+    own_renderer, create_test_image, mocker
+):
+    broken = own_renderer._executor
+    crashed: Future[bytes] = Future()
+    crashed.set_exception(BrokenProcessPool("worker died"))
+    mocker.patch.object(broken, "submit", return_value=crashed)
+
+    with pytest.raises(InvalidImageException):
+        own_renderer(b"crashes the decoder", DEFAULT_THUMBNAIL_SPEC)
+
+    assert own_renderer._executor is not broken
+    thumbnail = own_renderer(create_test_image(800, 600), DEFAULT_THUMBNAIL_SPEC)
+    assert Image.open(io.BytesIO(thumbnail)).size == (200, 150)
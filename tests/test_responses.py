@@ -0,0 +1,27 @@
+import pytest
+
+from lenzr_server.responses import etag_matches, make_etag
+
+
+def test__make_etag__without_variant__quotes_upload_id():
+    assert make_etag("ABC") == '"ABC"'
+
+
+def test__make_etag__with_variant__appends_variant():
+    assert make_etag("ABC", "thumbnail") == '"ABC-thumbnail"'
+
+
+@pytest.mark.parametrize(
+    "if_none_match,expected",
+    [
+        pytest.param(None, False, id="missing_header"),
+        pytest.param('"ABC"', True, id="exact_match"),
+        pytest.param('W/"ABC"', True, id="weak_match"),
+        pytest.param('"XYZ", "ABC"', True, id="match_in_list"),
+        pytest.param("*", True, id="wildcard"),
+        pytest.param('"XYZ"', False, id="different_tag"),
+        pytest.param("ABC", False, id="unquoted"),
+    ],
+)
+def test__etag_matches(if_none_match, expected):
+    assert etag_matches(if_none_match, '"ABC"') is expected
@@ -1,5 +1,9 @@
+import datetime
+
 import pytest
+import sqlalchemy as sa
 
+from lenzr_server import tag_service as tag_service_module
 from lenzr_server.models.uploads import UploadMetaData
 from lenzr_server.tag_service import TagService, TagUploadNotFoundException
 
@@ -232,3 +236,286 @@ def test__list_all_tags__shared_tags_not_duplicated(tag_service, database_sessio
     result = tag_service.list_all_tags()
 
     assert result == ["landscape", "nature", "urban"]
+
+
+def test__get_upload_with_tags__includes_file_info(tag_service, database_session):
+    model = UploadMetaData(
+        upload_id="sized",
+        content_type="image/png",
+        width=640,
+        height=480,
+        byte_size=1234,
+        image_format="PNG",
+    )
+    database_session.add(model)
+    database_session.commit()
+
+    result = tag_service.get_upload_with_tags("sized")
+
+    assert (result.width, result.height, result.byte_size, result.image_format) == (
+        640,
+        480,
+        1234,
+        "PNG",
+    )
+
+
+def _add_uploads_at_same_time(database_session, count: int) -> list[UploadMetaData]:
+    created_at = datetime.datetime(2026, 1, 1, tzinfo=datetime.UTC)
+    uploads = [
+        UploadMetaData(upload_id=f"upload{index}", content_type="image/png", created_at=created_at)
+        for index in range(count)
+    ]
+    database_session.add_all(uploads)
+    database_session.commit()
+    return uploads
+
+
+def test__list_with_tags__after__walks_all_uploads_once(tag_service, database_session):
+    # Identical timestamps: the pk tie-breaker keeps pages disjoint.
+    uploads = _add_uploads_at_same_time(database_session, 5)
+
+    seen = []
+    after = None
+    while page := tag_service.list_with_tags([], limit=2, after=after):
+        seen.extend(result.upload_id for result in page)
+        after = (page[-1].created_at, page[-1].pk)
+
+    assert sorted(seen) == sorted(upload.upload_id for upload in uploads)
+
+
+def test__list_with_tags__after_with_tags__continues_filtered_listing(
+    tag_service, database_session
+):
+    uploads = _add_uploads_at_same_time(database_session, 4)
+    for upload in uploads[:3]:
+        tag_service.set_tags(upload.upload_id, ["landscape"])
+
+    first = tag_service.list_with_tags(["landscape"], limit=2)
+    rest = tag_service.list_with_tags(
+        ["landscape"], limit=2, after=(first[-1].created_at, first[-1].pk)
+    )
+
+    assert len(first) == 2
+    assert len(rest) == 1
+    assert {r.upload_id for r in first + rest} == {u.upload_id for u in uploads[:3]}
+
+
+@pytest.mark.parametrize(
+    "selective_max_uploads",
+    [
+        pytest.param(0, id="all_tags_common"),
+        pytest.param(1_000, id="rarest_tag_drives"),
+    ],
+)
+def test__list_with_tags__common_and_rare_tag__returns_uploads_with_both(
+    tag_service, database_session, monkeypatch, selective_max_uploads
+):
+    monkeypatch.setattr(tag_service_module, "SELECTIVE_TAG_MAX_UPLOADS", selective_max_uploads)
+    uploads = _add_uploads_at_same_time(database_session, 6)
+    for upload in uploads[:5]:
+        tag_service.set_tags(upload.upload_id, ["common"])
+    tag_service.set_tags(uploads[1].upload_id, ["common", "rare"])
+    tag_service.set_tags(uploads[5].upload_id, ["rare"])
+
+    results = tag_service.list_with_tags(["common", "rare"])
+
+    assert [r.upload_id for r in results] == [uploads[1].upload_id]
+    assert sorted(results[0].tags) == ["common", "rare"]
+
+
+def test__list_with_tags__ranks_tags_by_maintained_counts_without_counting(
+    tag_service, tagged_uploads, database_session
+):
+    statements: list[str] = []
+    sa.event.listen(
+        database_session.get_bind(),
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+
+    results = tag_service.list_with_tags(["landscape", "night"], any_tags=["night", "portrait"])
+
+    assert [r.upload_id for r in results] == ["night"]
+    assert not any("count(" in statement.lower() for statement in statements)
+
+
+def test__list_with_tags__one_tag_unknown__returns_empty(tag_service, upload):
+    tag_service.set_tags(upload.upload_id, ["landscape"])
+
+    assert tag_service.list_with_tags(["landscape", "nonexistent"]) == []
+
+
+@pytest.fixture
+def tagged_uploads(tag_service, database_session) -> dict[str, str]:
+    tags_by_upload = {
+        "landscape": ["landscape"],
+        "portrait": ["portrait"],
+        "both": ["landscape", "portrait"],
+        "night": ["landscape", "night"],
+        "untagged": [],
+    }
+    for index, (upload_id, tags) in enumerate(tags_by_upload.items()):
+        created_at = datetime.datetime(2026, 1, 1, index, tzinfo=datetime.UTC)
+        database_session.add(
+            UploadMetaData(upload_id=upload_id, content_type="image/png", created_at=created_at)
+        )
+        database_session.flush()
+        tag_service.set_tags(upload_id, tags)
+    database_session.commit()
+    return tags_by_upload
+
+
+@pytest.mark.parametrize(
+    "selective_max_uploads",
+    [
+        pytest.param(0, id="probe_each_upload"),
+        pytest.param(1_000, id="drive_from_tags"),
+    ],
+)
+def test__list_with_tags__any_tags__returns_uploads_with_at_least_one(
+    tag_service, tagged_uploads, monkeypatch, selective_max_uploads
+):
+    monkeypatch.setattr(tag_service_module, "SELECTIVE_TAG_MAX_UPLOADS", selective_max_uploads)
+
+    results = tag_service.list_with_tags(any_tags=["portrait", "night"])
+
+    assert [r.upload_id for r in results] == ["night", "both", "portrait"]
+
+
+def test__list_with_tags__any_tags_all_unknown__returns_empty(tag_service, tagged_uploads):
+    assert tag_service.list_with_tags(any_tags=["nonexistent"]) == []
+
+
+def test__list_with_tags__any_tags_partly_unknown__ignores_unknown(tag_service, tagged_uploads):
+    results = tag_service.list_with_tags(any_tags=["night", "nonexistent"])
+
+    assert [r.upload_id for r in results] == ["night"]
+
+
+def test__list_with_tags__exclude_tags__leaves_out_uploads_with_any(tag_service, tagged_uploads):
+    results = tag_service.list_with_tags(exclude_tags=["portrait", "night"])
+
+    assert [r.upload_id for r in results] == ["untagged", "landscape"]
+
+
+def test__list_with_tags__exclude_unknown_tag__no_filter(tag_service, tagged_uploads):
+    results = tag_service.list_with_tags(exclude_tags=["nonexistent"])
+
+    assert len(results) == len(tagged_uploads)
+
+
+def test__list_with_tags__all_any_and_exclude__combined(tag_service, tagged_uploads):
+    results = tag_service.list_with_tags(
+        ["landscape"], any_tags=["portrait", "night"], exclude_tags=["night"]
+    )
+
+    assert [r.upload_id for r in results] == ["both"]
+
+
+def test__list_with_tags__exclude_tags_with_after__continues_filtered_listing(
+    tag_service, tagged_uploads
+):
+    first = tag_service.list_with_tags(exclude_tags=["night"], limit=2)
+    rest = tag_service.list_with_tags(
+        exclude_tags=["night"], limit=2, after=(first[-1].created_at, first[-1].pk)
+    )
+
+    assert [r.upload_id for r in first + rest] == ["untagged", "both", "portrait", "landscape"]
+
+
+def test__set_tags__maintains_upload_counts(tag_service, database_session):
+    for upload_id in ("a", "b"):
+        database_session.add(UploadMetaData(upload_id=upload_id, content_type="image/png"))
+    database_session.flush()
+
+    tag_service.set_tags("a", ["landscape", "night"])
+    tag_service.set_tags("b", ["landscape", "landscape"])
+    tag_service.set_tags("a", ["landscape", "portrait"])
+    tag_service.set_tags("b", [])
+
+    assert tag_service.list_tag_counts() == {"landscape": 1, "night": 0, "portrait": 1}
+
+
+def test__set_tags__swapping_tags__updates_counts_in_one_statement(
+    tag_service, upload, database_session
+):
+    tag_service.set_tags(upload.upload_id, ["landscape", "night"])
+    statements: list[str] = []
+    sa.event.listen(
+        database_session.get_bind(),
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+
+    tag_service.set_tags(upload.upload_id, ["night", "portrait"])
+
+    assert sum(statement.startswith("UPDATE tag") for statement in statements) == 1
+    assert tag_service.list_tag_counts() == {"landscape": 0, "night": 1, "portrait": 1}
+
+
+def test__set_tags__set_set_then_detach_all__counts_match_links(tag_service, upload):
+    tag_service.set_tags(upload.upload_id, ["landscape", "night"])
+    tag_service.set_tags(upload.upload_id, ["night", "portrait"])
+    tag_service.detach_all(upload.upload_id)
+
+    assert tag_service.list_tag_counts() == {"landscape": 0, "night": 0, "portrait": 0}
+    assert tag_service.get_tags(upload.upload_id) == []
+
+
+def test__detach_all__decrements_only_the_uploads_tags(tag_service, tagged_uploads):
+    tag_service.detach_all("night")
+
+    assert tag_service.list_tag_counts() == {"landscape": 2, "night": 0, "portrait": 2}
+
+
+def test__detach_all__nonexistent_upload__raises_not_found(tag_service):
+    with pytest.raises(TagUploadNotFoundException):
+        tag_service.detach_all("nonexistent")
+
+
+@pytest.mark.parametrize("write", ["set_tags", "detach_all"])
+def test__tag_writes__lock_upload_row(tag_service, upload, mocker, write):
+    with_for_update = mocker.spy(sa.Select, "with_for_update")
+
+    if write == "set_tags":
+        tag_service.set_tags(upload.upload_id, ["landscape"])
+    else:
+        tag_service.detach_all(upload.upload_id)
+
+    with_for_update.assert_called_once()
+
+
+def test__list_tag_counts__paginates_by_name(tag_service, tagged_uploads):
+    assert tag_service.list_tag_counts(offset=1, limit=2) == {"night": 1, "portrait": 2}
+
+
+def test__facet_counts__no_filter__uses_maintained_counts_most_frequent_first(
+    tag_service, tagged_uploads
+):
+    tag_service.set_tags("night", [])
+
+    facets = tag_service.facet_counts()
+
+    assert list(facets.items()) == [("landscape", 2), ("portrait", 2)]
+
+
+@pytest.mark.parametrize(
+    ("filters", "expected"),
+    [
+        pytest.param({"tag_names": ["landscape"]}, {"landscape": 3, "night": 1, "portrait": 1}),
+        pytest.param(
+            {"any_tags": ["portrait", "night"]}, {"landscape": 2, "night": 1, "portrait": 2}
+        ),
+        pytest.param({"exclude_tags": ["portrait"]}, {"landscape": 2, "night": 1}),
+        pytest.param({"tag_names": ["nonexistent"]}, {}),
+    ],
+)
+def test__facet_counts__filtered__counts_tags_of_matching_uploads(
+    tag_service, tagged_uploads, filters, expected
+):
+    assert tag_service.facet_counts(**filters) == expected
+
+
+def test__facet_counts__limit__keeps_most_frequent(tag_service, tagged_uploads):
+    assert tag_service.facet_counts(["landscape"], limit=1) == {"landscape": 3}
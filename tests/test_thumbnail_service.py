@@ -1,21 +1,23 @@
 import io
 import threading
+import time
+from unittest.mock import MagicMock
 
 import pytest
-from PIL import Image
+from PIL import Image, ImageFile
+from PIL.JpegImagePlugin import JpegImageFile
 
 from lenzr_server.thumbnail_service import (
     InMemoryThumbnailCache,
     InMemoryThumbnailService,
+    InvalidImageCache,
     InvalidImageException,
+    ThumbnailFormat,
+    ThumbnailSpec,
 )
 
 TEST_MAX_DIMENSION = 100
-
-
-@pytest.fixture
-def sized_service(thumbnail_cache) -> InMemoryThumbnailService:
-    return InMemoryThumbnailService(cache=thumbnail_cache, max_dimension=TEST_MAX_DIMENSION)
+TEST_SPEC = ThumbnailSpec(size=TEST_MAX_DIMENSION)
 
 
 @pytest.mark.parametrize(
@@ -28,10 +30,10 @@ def sized_service(thumbnail_cache) -> InMemoryThumbnailService:
         pytest.param((500, 1000), (50, TEST_MAX_DIMENSION), id="preserves_aspect_ratio_tall"),
     ],
 )
-def test__get_thumbnail__sizing(sized_service, create_test_image, source_size, expected_size):
+def test__get_thumbnail__sizing(thumbnail_service, create_test_image, source_size, expected_size):
     original = create_test_image(*source_size)
 
-    thumbnail = sized_service.get_thumbnail("upload1", original)
+    thumbnail = thumbnail_service.get_thumbnail("upload1", lambda: original, TEST_SPEC)
 
     thumb = Image.open(io.BytesIO(thumbnail.content))
     assert thumb.size == expected_size
@@ -51,85 +53,253 @@ def test__get_thumbnail__default_max_dimension(
 ):
     original = create_test_image(*source_size)
 
-    thumbnail = thumbnail_service.get_thumbnail("upload1", original)
+    thumbnail = thumbnail_service.get_thumbnail("upload1", lambda: original)
 
     thumb = Image.open(io.BytesIO(thumbnail.content))
     assert thumb.size == expected_size
 
 
+@pytest.mark.parametrize(
+    "image_format,pillow_format",
+    [
+        pytest.param(ThumbnailFormat.JPEG, "JPEG", id="jpeg"),
+        pytest.param(ThumbnailFormat.WEBP, "WEBP", id="webp"),
+        pytest.param(ThumbnailFormat.PNG, "PNG", id="png"),
+    ],
+)
+def test__get_thumbnail__output_format(
+    thumbnail_service, create_test_image, image_format, pillow_format
+):
+    spec = ThumbnailSpec(size=120, format=image_format)
+
+    thumbnail = thumbnail_service.get_thumbnail(
+        "upload1", lambda: create_test_image(800, 600), spec
+    )
+
+    thumb = Image.open(io.BytesIO(thumbnail.content))
+    assert thumb.format == pillow_format
+    assert thumb.size == (120, 90)
+    assert thumbnail.content_type == f"image/{image_format}"
+
+
+@pytest.mark.parametrize("image_format", [ThumbnailFormat.WEBP, ThumbnailFormat.PNG])
+def test__get_thumbnail__transparent_source__keeps_alpha(
+    thumbnail_service, create_test_image, image_format
+):
+    original = create_test_image(400, 400, mode="RGBA", color=(255, 0, 0, 128))
+    spec = ThumbnailSpec(format=image_format)
+
+    thumbnail = thumbnail_service.get_thumbnail("upload1", lambda: original, spec)
+
+    assert Image.open(io.BytesIO(thumbnail.content)).mode == "RGBA"
+
+
+def test__get_thumbnail__variants__cached_separately(thumbnail_service, create_test_image):
+    original = create_test_image(800, 600)
+    small = ThumbnailSpec(size=120)
+    small_webp = ThumbnailSpec(size=120, format=ThumbnailFormat.WEBP)
+
+    default = thumbnail_service.get_thumbnail("upload1", lambda: original)
+    thumbnail_service.get_thumbnail("upload1", lambda: original, small)
+    thumbnail_service.get_thumbnail("upload1", lambda: original, small_webp)
+
+    assert thumbnail_service.peek("upload1") == default
+    assert Image.open(io.BytesIO(thumbnail_service.peek("upload1", small).content)).size == (
+        120,
+        90,
+    )
+    assert thumbnail_service.peek("upload1", small_webp).content_type == "image/webp"
+    assert thumbnail_service.stats().entries == 3
+
+
+def test__evict__drops_all_variants(thumbnail_service, create_test_image):
+    original = create_test_image(800, 600)
+    specs = [ThumbnailSpec(), ThumbnailSpec(size=800, format=ThumbnailFormat.PNG)]
+    for spec in specs:
+        thumbnail_service.get_thumbnail("upload1", lambda: original, spec)
+    thumbnail_service.get_thumbnail("upload2", lambda: original)
+
+    thumbnail_service.evict("upload1")
+
+    assert all(thumbnail_service.peek("upload1", spec) is None for spec in specs)
+    assert thumbnail_service.peek("upload2") is not None
+    assert thumbnail_service.stats().entries == 1
+
+
 def test__get_thumbnail__caches_result(thumbnail_service, create_test_image):
     original = create_test_image(800, 600)
     other = create_test_image(400, 300)
 
-    first = thumbnail_service.get_thumbnail("upload1", original)
-    second = thumbnail_service.get_thumbnail("upload1", other)
+    first = thumbnail_service.get_thumbnail("upload1", lambda: original)
+    second = thumbnail_service.get_thumbnail("upload1", lambda: other)
 
     assert first.content == second.content
 
 
+def test__get_thumbnail__cache_hit__does_not_load_content(thumbnail_service, create_test_image):
+    original = create_test_image(800, 600)
+    thumbnail_service.get_thumbnail("upload1", lambda: original)
+    load_content = MagicMock()
+
+    thumbnail_service.get_thumbnail("upload1", load_content)
+
+    load_content.assert_not_called()
+
+
 def test__get_thumbnail__different_ids__separate_cache_entries(
     thumbnail_service, create_test_image
 ):
     img1 = create_test_image(100, 100)
     img2 = create_test_image(50, 50)
 
-    thumb1 = thumbnail_service.get_thumbnail("upload1", img1)
-    thumb2 = thumbnail_service.get_thumbnail("upload2", img2)
+    thumb1 = thumbnail_service.get_thumbnail("upload1", lambda: img1)
+    thumb2 = thumbnail_service.get_thumbnail("upload2", lambda: img2)
 
     assert thumb1.content != thumb2.content
 
 
 def test__evict__removes_cache_entry(thumbnail_service, create_test_image):
     original = create_test_image(800, 600)
-    thumbnail_service.get_thumbnail("upload1", original)
+    thumbnail_service.get_thumbnail("upload1", lambda: original)
     thumbnail_service.evict("upload1")
 
     different = create_test_image(100, 80)
-    thumb = thumbnail_service.get_thumbnail("upload1", different)
+    thumb = thumbnail_service.get_thumbnail("upload1", lambda: different)
     assert Image.open(io.BytesIO(thumb.content)).size == (100, 80)
 
 
+def test__peek__not_cached__returns_none(thumbnail_service):
+    assert thumbnail_service.peek("upload1") is None
+
+
+def test__peek__cached__returns_thumbnail(thumbnail_service, create_test_image):
+    generated = thumbnail_service.get_thumbnail("upload1", lambda: create_test_image(800, 600))
+
+    assert thumbnail_service.peek("upload1") == generated
+
+
 def test__evict__nonexistent_id__no_error(thumbnail_service):
     thumbnail_service.evict("nonexistent")
 
 
-def test__get_thumbnail__exceeds_max_cache_size__evicts_lru_entry(create_test_image):
-    cache = InMemoryThumbnailCache(max_size=2)
-    service = InMemoryThumbnailService(cache=cache)
-    service.get_thumbnail("upload1", create_test_image(100, 100))
-    service.get_thumbnail("upload2", create_test_image(200, 200))
-    service.get_thumbnail("upload3", create_test_image(300, 300))
+def _entry_bytes(upload_id: str, value: bytes) -> int:
+    probe = InMemoryThumbnailCache()
+    probe.set(upload_id, value)
+    return probe.stats().current_bytes
+
+
+def test__cache_set__tracks_current_bytes_and_entries():
+    cache = InMemoryThumbnailCache()
+    cache.set("upload1", b"x" * 1000)
+    cache.set("upload2", b"y" * 500)
+
+    stats = cache.stats()
+    assert stats.entries == 2
+    assert stats.current_bytes >= 1500
+    assert stats.current_bytes == _entry_bytes("upload1", b"x" * 1000) + _entry_bytes(
+        "upload2", b"y" * 500
+    )
+
+
+def test__cache_set__same_key_twice__replaces_accounting():
+    cache = InMemoryThumbnailCache()
+    cache.set("upload1", b"x" * 1000)
+    cache.set("upload1", b"x" * 10)
+
+    assert cache.stats().entries == 1
+    assert cache.stats().current_bytes == _entry_bytes("upload1", b"x" * 10)
+
+
+def test__cache_set__exceeds_byte_budget__evicts_lru_entries():
+    value = b"x" * 1000
+    cache = InMemoryThumbnailCache(max_bytes=2 * _entry_bytes("upload1", value))
+    cache.set("upload1", value)
+    cache.set("upload2", value)
+    cache.set("upload3", value)
 
     assert cache.get("upload1") is None
     assert cache.get("upload2") is not None
     assert cache.get("upload3") is not None
+    assert cache.stats().evictions == 1
+    assert cache.stats().current_bytes <= cache.stats().max_bytes
 
 
-def test__get_thumbnail__cache_hit_refreshes_lru_order(create_test_image):
-    cache = InMemoryThumbnailCache(max_size=2)
-    service = InMemoryThumbnailService(cache=cache)
+def test__cache_set__large_entry__evicts_as_many_as_needed():
+    small = b"x" * 100
+    large = b"y" * 1000
+    cache = InMemoryThumbnailCache(max_bytes=_entry_bytes("upload9", large))
+    for i in range(3):
+        cache.set(f"upload{i}", small)
+
+    cache.set("upload9", large)
+
+    assert cache.stats().entries == 1
+    assert cache.stats().evictions == 3
+    assert cache.get("upload9") == large
+
+
+def test__cache_set__entry_larger_than_budget__not_cached():
+    cache = InMemoryThumbnailCache(max_bytes=100)
+    cache.set("upload1", b"x" * 1000)
+
+    assert cache.get("upload1") is None
+    assert cache.stats().current_bytes == 0
+
+
+def test__cache_evict__releases_bytes():
+    cache = InMemoryThumbnailCache()
+    cache.set("upload1", b"x" * 1000)
+    cache.evict("upload1")
+
+    assert cache.stats().entries == 0
+    assert cache.stats().current_bytes == 0
+    assert cache.stats().evictions == 0
+
 
-    service.get_thumbnail("upload1", create_test_image(100, 100))
-    service.get_thumbnail("upload2", create_test_image(200, 200))
+def test__cache_get__counts_hits_and_misses():
+    cache = InMemoryThumbnailCache()
+    cache.set("upload1", b"x")
+    cache.get("upload1")
+    cache.get("upload1")
+    cache.get("upload2")
+
+    assert cache.stats().hits == 2
+    assert cache.stats().misses == 1
+
+
+def test__get_thumbnail__cache_hit_refreshes_lru_order():
+    value = b"x" * 1000
+    cache = InMemoryThumbnailCache(max_bytes=2 * _entry_bytes("upload1", value))
+    service = InMemoryThumbnailService(cache=cache)
+    cache.set("upload1", value)
+    cache.set("upload2", value)
     # Access upload1 — moves it to most-recently-used
-    service.get_thumbnail("upload1", create_test_image(100, 100))
+    service.get_thumbnail("upload1", lambda: pytest.fail("cached"))
     # Inserting upload3 should evict upload2, not upload1
-    service.get_thumbnail("upload3", create_test_image(300, 300))
+    cache.set("upload3", value)
 
     assert cache.get("upload1") is not None
     assert cache.get("upload2") is None
     assert cache.get("upload3") is not None
 
 
+def test__stats__reflects_cache(thumbnail_service, create_test_image):
+    thumbnail_service.get_thumbnail("upload1", lambda: create_test_image(800, 600))
+
+    stats = thumbnail_service.stats()
+    assert stats.entries == 1
+    assert stats.current_bytes > 0
+
+
 def test__concurrent_get_and_evict__no_errors(create_test_image):
-    service = InMemoryThumbnailService(cache=InMemoryThumbnailCache(max_size=5))
+    service = InMemoryThumbnailService(cache=InMemoryThumbnailCache(max_bytes=50_000))
     images = [create_test_image(100 + i * 10, 100 + i * 10) for i in range(10)]
     errors: list[Exception] = []
 
     def worker(i: int):
         try:
             upload_id = f"upload{i % 5}"
-            service.get_thumbnail(upload_id, images[i % len(images)])
+            service.get_thumbnail(upload_id, lambda: images[i % len(images)])
             if i % 3 == 0:
                 service.evict(upload_id)
         except Exception as e:
@@ -144,10 +314,128 @@ def test__concurrent_get_and_evict__no_errors(create_test_image):
     assert errors == []
 
 
+def _start_threads(count: int, target) -> list[threading.Thread]:
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for t in threads:
+        t.start()
+    return threads
+
+
+def test__get_thumbnail__concurrent_misses__generates_once(thumbnail_service, create_test_image):
+    original = create_test_image(800, 600)
+    release = threading.Event()
+    loads: list[str] = []
+    results: list[bytes] = []
+
+    def load_content() -> bytes:
+        loads.append("upload1")
+        release.wait(timeout=5)
+        return original
+
+    def worker():
+        results.append(thumbnail_service.get_thumbnail("upload1", load_content).content)
+
+    threads = _start_threads(10, worker)
+    while not loads:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(loads) == 1
+    assert len(results) == 10
+    assert len(set(results)) == 1
+
+
+def test__get_thumbnail__concurrent_misses_invalid_image__all_raise(thumbnail_service):
+    release = threading.Event()
+    loads: list[str] = []
+    errors: list[Exception] = []
+
+    def load_content() -> bytes:
+        loads.append("upload1")
+        release.wait(timeout=5)
+        return b"not an image"
+
+    def worker():
+        try:
+            thumbnail_service.get_thumbnail("upload1", load_content)
+        except InvalidImageException as exc:
+            errors.append(exc)
+
+    threads = _start_threads(5, worker)
+    while not loads:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(loads) == 1
+    assert len(errors) == 5
+
+
+def test__get_thumbnail__evicted_during_generation__result_not_cached(
+    thumbnail_service, create_test_image
+):
+    original = create_test_image(800, 600)
+
+    def load_content() -> bytes:
+        thumbnail_service.evict("upload1")
+        return original
+
+    thumbnail = thumbnail_service.get_thumbnail("upload1", load_content)
+
+    assert thumbnail.content
+    assert thumbnail_service.peek("upload1") is None
+
+
+def test__get_thumbnail__after_failed_generation__retries(thumbnail_cache, create_test_image):
+    # A zero TTL disables the negative cache, isolating the in-flight cleanup.
+    service = InMemoryThumbnailService(
+        cache=thumbnail_cache, invalid_images=InvalidImageCache(ttl_seconds=0)
+    )
+    with pytest.raises(InvalidImageException):
+        service.get_thumbnail("upload1", lambda: b"not an image")
+
+    thumbnail = service.get_thumbnail("upload1", lambda: create_test_image(800, 600))
+
+    assert thumbnail.content
+
+
+def test__get_thumbnail__large_jpeg__decodes_at_reduced_scale(
+    thumbnail_service, create_test_image, mocker
+):
+    original = create_test_image(4000, 3000, image_format="JPEG")
+    draft = mocker.spy(JpegImageFile, "draft")
+
+    thumbnail = thumbnail_service.get_thumbnail("upload1", lambda: original)
+
+    draft.assert_any_call(mocker.ANY, "RGB", (400, 400))
+    assert Image.open(io.BytesIO(thumbnail.content)).size == (200, 150)
+
+
+def test__get_thumbnail__grayscale_jpeg__converts_to_rgb_jpeg(thumbnail_service, create_test_image):
+    original = create_test_image(1600, 1200, image_format="JPEG", mode="L", color=128)
+
+    thumbnail = thumbnail_service.get_thumbnail("upload1", lambda: original)
+
+    thumb = Image.open(io.BytesIO(thumbnail.content))
+    assert thumb.mode == "RGB"
+    assert thumb.size == (200, 150)
+
+
+def test__get_thumbnail__png__skips_jpeg_draft(thumbnail_service, create_test_image, mocker):
+    draft = mocker.spy(JpegImageFile, "draft")
+
+    thumbnail_service.get_thumbnail("upload1", lambda: create_test_image(800, 600))
+
+    draft.assert_not_called()
+
+
 def test__get_thumbnail__rgba_image__converts_to_rgb_jpeg(thumbnail_service, create_test_image):
     original = create_test_image(400, 400, mode="RGBA", color=(255, 0, 0, 128))
 
-    thumbnail = thumbnail_service.get_thumbnail("upload1", original)
+    thumbnail = thumbnail_service.get_thumbnail("upload1", lambda: original)
 
     thumb = Image.open(io.BytesIO(thumbnail.content))
     assert thumb.mode == "RGB"
@@ -168,7 +456,7 @@ def test__get_thumbnail__non_rgb_modes__converts_to_rgb_jpeg(
 ):
     original = create_test_image(400, 400, image_format=image_format, mode=mode, color=color)
 
-    thumbnail = thumbnail_service.get_thumbnail("upload1", original)
+    thumbnail = thumbnail_service.get_thumbnail("upload1", lambda: original)
 
     thumb = Image.open(io.BytesIO(thumbnail.content))
     assert thumb.mode == "RGB"
@@ -177,7 +465,7 @@ def test__get_thumbnail__non_rgb_modes__converts_to_rgb_jpeg(
 
 def test__get_thumbnail__corrupted_bytes__raises_invalid_image(thumbnail_service):
     with pytest.raises(InvalidImageException):
-        thumbnail_service.get_thumbnail("upload1", b"not an image")
+        thumbnail_service.get_thumbnail("upload1", lambda: b"not an image")
 
 
 def test__get_thumbnail__truncated_bytes__raises_invalid_image(
@@ -186,7 +474,7 @@ def test__get_thumbnail__truncated_bytes__raises_invalid_image(
     truncated = create_test_image(400, 400)[:50]
 
     with pytest.raises(InvalidImageException):
-        thumbnail_service.get_thumbnail("upload1", truncated)
+        thumbnail_service.get_thumbnail("upload1", lambda: truncated)
 
 
 def test__get_thumbnail__decompression_bomb__raises_invalid_image(
@@ -196,4 +484,104 @@ def test__get_thumbnail__decompression_bomb__raises_invalid_image(
     oversized = create_test_image(400, 400)
 
     with pytest.raises(InvalidImageException):
-        thumbnail_service.get_thumbnail("upload1", oversized)
+        thumbnail_service.get_thumbnail("upload1", lambda: oversized)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test__get_thumbnail__known_invalid_image__raises_without_loading(thumbnail_service):
+    with pytest.raises(InvalidImageException):
+        thumbnail_service.get_thumbnail("upload1", lambda: b"not an image")
+    load_content = MagicMock()
+
+    with pytest.raises(InvalidImageException):
+        thumbnail_service.get_thumbnail("upload1", load_content, ThumbnailSpec(size=800))
+
+    load_content.assert_not_called()
+
+
+def test__get_thumbnail__invalid_image_after_ttl__retries(thumbnail_cache, create_test_image):
+    clock = FakeClock()
+    service = InMemoryThumbnailService(
+        cache=thumbnail_cache, invalid_images=InvalidImageCache(ttl_seconds=60, clock=clock)
+    )
+    with pytest.raises(InvalidImageException):
+        service.get_thumbnail("upload1", lambda: b"not an image")
+
+    clock.now = 61
+    thumbnail = service.get_thumbnail("upload1", lambda: create_test_image(800, 600))
+
+    assert thumbnail.content
+
+
+def test__is_known_invalid__after_failed_render__true(thumbnail_service):
+    assert not thumbnail_service.is_known_invalid("upload1")
+    with pytest.raises(InvalidImageException):
+        thumbnail_service.get_thumbnail("upload1", lambda: b"not an image")
+
+    assert thumbnail_service.is_known_invalid("upload1")
+
+
+def test__evict__forgets_invalid_image(thumbnail_service, create_test_image):
+    with pytest.raises(InvalidImageException):
+        thumbnail_service.get_thumbnail("upload1", lambda: b"not an image")
+
+    thumbnail_service.evict("upload1")
+    thumbnail = thumbnail_service.get_thumbnail("upload1", lambda: create_test_image(800, 600))
+
+    assert thumbnail.content
+
+
+def test__get_thumbnail__evicted_while_failing__not_remembered_as_invalid(
+    thumbnail_service, create_test_image
+):
+    def load_content() -> bytes:
+        thumbnail_service.evict("upload1")
+        return b"not an image"
+
+    with pytest.raises(InvalidImageException):
+        thumbnail_service.get_thumbnail("upload1", load_content)
+    thumbnail = thumbnail_service.get_thumbnail("upload1", lambda: create_test_image(800, 600))
+
+    assert thumbnail.content
+
+
+def test__invalid_image_cache__exceeds_max_entries__drops_oldest():
+    invalid_images = InvalidImageCache(max_entries=2)
+    for upload_id in ("upload1", "upload2", "upload3"):
+        invalid_images.add(upload_id)
+
+    assert "upload1" not in invalid_images
+    assert "upload2" in invalid_images
+    assert "upload3" in invalid_images
+    assert len(invalid_images) == 2
+
+
+def test__invalid_image_cache__expired_entry__removed_on_lookup():
+    clock = FakeClock()
+    invalid_images = InvalidImageCache(ttl_seconds=10, clock=clock)
+    invalid_images.add("upload1")
+
+    clock.now = 10
+
+    assert "upload1" not in invalid_images
+    assert len(invalid_images) == 0
+
+
+def test__get_thumbnail__over_pixel_limit__raises_without_decoding(
+    thumbnail_service, create_test_image, monkeypatch, mocker
+):
+    content = create_test_image(800, 600)
+    monkeypatch.setenv("MAX_IMAGE_PIXELS", "1000")
+    load = mocker.spy(ImageFile.ImageFile, "load")
+
+    with pytest.raises(InvalidImageException, match="pixel limit"):
+        thumbnail_service.get_thumbnail("upload1", lambda: content)
+
+    load.assert_not_called()
@@ -1,16 +1,25 @@
+import datetime
+import io
 import os
+import threading
 from unittest.mock import MagicMock
 
 import pytest
-from sqlmodel import select
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlmodel import Session, SQLModel, select
 
 from lenzr_server.file_storages.on_disk_file_storage import OnDiskFileStorage
+from lenzr_server.image_probe import ImageInfo, ImageTooLargeException
+from lenzr_server.keyed_lock import KeyedLock
 from lenzr_server.models.uploads import UploadMetaData
+from lenzr_server.tag_service import TagService
 from lenzr_server.upload_id_creators.hashing_id_creator import HashingIDCreator
 from lenzr_server.upload_service import (
     UploadAlreadyExistingException,
     UploadNotFoundException,
     UploadService,
+    UploadTooLargeException,
 )
 
 
@@ -67,7 +76,7 @@ def test__add_upload__file_write_fails__no_dangling_db_record(
     database_session, id_creator, tmp_path
 ):
     file_storage = OnDiskFileStorage(tmp_path)
-    file_storage.add_file = MagicMock(side_effect=OSError("disk full"))
+    file_storage.stage_file = MagicMock(side_effect=OSError("disk full"))
     service = UploadService(file_storage, database_session, id_creator)
 
     with pytest.raises(OSError):
@@ -120,6 +129,141 @@ def test__add_upload__duplicate_entry__cleans_up_orphan_file(
     assert not os.path.exists(file_path)
 
 
+def test__add_upload_stream__multiple_chunks__stores_content_under_hash_id(
+    upload_service, file_storage, id_creator, mocker
+):
+    mocker.patch("lenzr_server.upload_service.UPLOAD_CHUNK_SIZE", 4)
+    content = b"streamed content in several chunks"
+
+    upload = upload_service.add_upload_stream(io.BytesIO(content), "image/png")
+
+    assert upload.upload_id == id_creator.create_upload_id(content)
+    with open(os.path.join(file_storage._base_path, upload.upload_id), "rb") as f:
+        assert f.read() == content
+
+
+def test__add_upload_stream__exceeds_max_bytes__raises_and_leaves_no_files(
+    upload_service, database_session, file_storage, mocker
+):
+    mocker.patch("lenzr_server.upload_service.UPLOAD_CHUNK_SIZE", 4)
+
+    with pytest.raises(UploadTooLargeException):
+        upload_service.add_upload_stream(io.BytesIO(b"x" * 17), "image/png", max_bytes=16)
+
+    assert os.listdir(file_storage._base_path) == []
+    assert database_session.exec(select(UploadMetaData)).first() is None
+
+
+def test__add_upload_stream__at_max_bytes__accepted(upload_service):
+    upload = upload_service.add_upload_stream(io.BytesIO(b"x" * 16), "image/png", max_bytes=16)
+
+    assert upload.upload_id is not None
+
+
+def test__add_upload__duplicate_entry__skips_staging_and_rollback(
+    upload_service, database_session, file_storage, mocker
+):
+    content = b"test_content"
+    upload_service.add_upload(content, "text/plain")
+    stage_file = mocker.spy(OnDiskFileStorage, "stage_file")
+    rollback = mocker.spy(database_session, "rollback")
+
+    with pytest.raises(UploadAlreadyExistingException):
+        upload_service.add_upload(content, "text/plain")
+
+    stage_file.assert_not_called()
+    rollback.assert_not_called()
+    assert len(os.listdir(file_storage._base_path)) == 1
+
+
+def test__add_upload_stream__non_seekable_duplicate__discards_staged_copy(
+    upload_service, file_storage
+):
+    content = b"test_content"
+    upload = upload_service.add_upload(content, "text/plain")
+    read_end, write_end = os.pipe()
+    os.write(write_end, content)
+    os.close(write_end)
+    stream = os.fdopen(read_end, "rb")
+
+    with pytest.raises(UploadAlreadyExistingException):
+        upload_service.add_upload_stream(stream, "text/plain")
+    stream.close()
+
+    assert os.listdir(file_storage._base_path) == [upload.upload_id]
+
+
+def test__add_upload__duplicate_missed_by_existence_check__falls_back_to_integrity_error(
+    upload_service, mocker
+):
+    content = b"test_content"
+    upload_service.add_upload(content, "text/plain")
+    mocker.patch.object(upload_service, "_upload_exists", return_value=False)
+
+    with pytest.raises(UploadAlreadyExistingException):
+        upload_service.add_upload(content, "text/plain")
+
+
+def test__add_upload__lost_insert_race__keeps_winners_file(upload_service, file_storage, mocker):
+    content = b"test_content"
+    upload = upload_service.add_upload(content, "text/plain")
+    mocker.patch.object(upload_service, "_upload_exists", return_value=False)
+
+    with pytest.raises(UploadAlreadyExistingException):
+        upload_service.add_upload(content, "text/plain")
+
+    assert os.listdir(file_storage._base_path) == [upload.upload_id]
+    assert file_storage.get_file_content(upload.upload_id) == content
+
+
+def test__add_upload__concurrent_identical_uploads__single_writer(tmp_path, id_creator, mocker):
+    rollback = mocker.spy(Session, "rollback")
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite3'}")
+    SQLModel.metadata.create_all(engine)
+    file_storage = OnDiskFileStorage(tmp_path / "files")
+    ingest_locks = KeyedLock()
+    start = threading.Barrier(4)
+    outcomes: list[str] = []
+
+    def worker():
+        with Session(engine, expire_on_commit=False) as session:
+            service = UploadService(file_storage, session, id_creator, ingest_locks=ingest_locks)
+            start.wait()
+            try:
+                service.add_upload(b"same content", "image/png")
+                outcomes.append("created")
+            except UploadAlreadyExistingException:
+                outcomes.append("existing")
+            session.commit()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(outcomes) == ["created", "existing", "existing", "existing"]
+    upload_id = id_creator.create_upload_id(b"same content")
+    assert os.listdir(tmp_path / "files") == [upload_id]
+    assert len(ingest_locks) == 0
+    # Followers waited for the winner's commit instead of racing its insert.
+    rollback.assert_not_called()
+
+
+@pytest.mark.parametrize("end", ["commit", "rollback", "close"])
+def test__add_upload__holds_ingest_lock_until_transaction_ends(
+    database_session, file_storage, id_creator, end
+):
+    ingest_locks = KeyedLock()
+    service = UploadService(file_storage, database_session, id_creator, ingest_locks=ingest_locks)
+
+    service.add_upload(b"content", "image/png")
+    assert len(ingest_locks) == 1
+    getattr(database_session, end)()
+
+    assert len(ingest_locks) == 0
+
+
 def test__get_upload__valid_id__returns_content_and_type(
     upload_service, database_session, file_storage
 ):
@@ -138,6 +282,28 @@ def test__get_upload__missing_database_entry__raises_not_found_exception(upload_
         upload_service.get_upload("missing_upload_id")
 
 
+def test__get_upload_file__valid_id__returns_path_and_type(upload_service):
+    upload = upload_service.add_upload(b"test_content", "image/png")
+
+    stored_upload = upload_service.get_upload_file(upload.upload_id)
+
+    assert stored_upload.path.read_bytes() == b"test_content"
+    assert stored_upload.content_type == "image/png"
+
+
+def test__get_upload_file__missing_database_entry__raises_not_found_exception(upload_service):
+    with pytest.raises(UploadNotFoundException):
+        upload_service.get_upload_file("missing_upload_id")
+
+
+def test__get_upload_file__missing_file__raises_not_found_exception(upload_service, file_storage):
+    upload = upload_service.add_upload(b"test_content", "image/png")
+    os.remove(os.path.join(file_storage._base_path, upload.upload_id))
+
+    with pytest.raises(UploadNotFoundException):
+        upload_service.get_upload_file(upload.upload_id)
+
+
 def test__delete_upload__valid_id__deletes_from_database_and_disk(
     upload_service, database_session, file_storage
 ):
@@ -158,6 +324,18 @@ def test__delete_upload__valid_id__deletes_from_database_and_disk(
     assert not os.path.exists(file_path)
 
 
+def test__delete_upload__tagged_upload__decrements_tag_counts(upload_service, database_session):
+    tag_service = TagService(database_session)
+    kept = upload_service.add_upload(b"kept", "text/plain")
+    deleted = upload_service.add_upload(b"deleted", "text/plain")
+    tag_service.set_tags(kept.upload_id, ["landscape"])
+    tag_service.set_tags(deleted.upload_id, ["landscape", "night"])
+
+    upload_service.delete_upload(deleted.upload_id)
+
+    assert tag_service.list_tag_counts() == {"landscape": 1, "night": 0}
+
+
 def test__delete_upload__missing_id__raises_upload_not_found_exception(upload_service):
     with pytest.raises(UploadNotFoundException):
         upload_service.delete_upload("missing_upload_id")
@@ -198,3 +376,196 @@ def test__delete_upload__file_delete_raises__removes_db_row(database_session, id
         ).first()
         is None
     )
+
+
+def _add_upload_created_at(upload_service, database_session, content: bytes, hour: int):
+    upload = upload_service.add_upload(content, "image/png")
+    upload.created_at = datetime.datetime(2026, 1, 1, hour, tzinfo=datetime.UTC)
+    database_session.add(upload)
+    database_session.commit()
+    return upload
+
+
+def test__list_metadata__returns_newest_first(upload_service, database_session):
+    for hour in (1, 3, 2):
+        _add_upload_created_at(upload_service, database_session, f"c{hour}".encode(), hour)
+
+    uploads = upload_service.list_metadata(limit=10)
+
+    assert [u.created_at.hour for u in uploads] == [3, 2, 1]
+
+
+def test__list_metadata__date_range__filters_half_open(upload_service, database_session):
+    for hour in (1, 2, 3):
+        _add_upload_created_at(upload_service, database_session, f"c{hour}".encode(), hour)
+
+    uploads = upload_service.list_metadata(
+        limit=10,
+        since=datetime.datetime(2026, 1, 1, 2, tzinfo=datetime.UTC),
+        until=datetime.datetime(2026, 1, 1, 3, tzinfo=datetime.UTC),
+    )
+
+    assert [u.created_at.hour for u in uploads] == [2]
+
+
+def test__list_metadata__after_position__continues_without_gaps(upload_service, database_session):
+    # Same timestamps force the pk tie-breaker.
+    for i in range(5):
+        _add_upload_created_at(upload_service, database_session, f"c{i}".encode(), 1)
+
+    first_page = upload_service.list_metadata(limit=2)
+    last = first_page[-1]
+    rest = upload_service.list_metadata(limit=10, after=(last.created_at, last.pk))
+
+    all_ids = [u.upload_id for u in first_page + rest]
+    assert len(all_ids) == 5
+    assert len(set(all_ids)) == 5
+
+
+def test__add_upload__image__stores_probed_dimensions(upload_service):
+    image = Image.new("RGB", (320, 240))
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+
+    content = output.getvalue()
+
+    upload = upload_service.add_upload(content, "image/png")
+
+    assert (upload.width, upload.height) == (320, 240)
+    assert upload.image_format == "PNG"
+    assert upload.byte_size == len(content)
+
+
+def test__add_upload__not_an_image__stored_without_dimensions(upload_service):
+    upload = upload_service.add_upload(b"test_content", "image/png")
+
+    assert upload.width is None
+    assert upload.height is None
+    assert upload.image_format is None
+    assert upload.byte_size == len(b"test_content")
+
+
+def test__add_upload_stream__over_pixel_limit__rejected_before_storing(
+    upload_service, file_storage, database_session
+):
+    image = Image.new("RGB", (320, 240))
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    output.seek(0)
+    stage_file = MagicMock(wraps=file_storage.stage_file)
+    file_storage.stage_file = stage_file
+
+    with pytest.raises(ImageTooLargeException):
+        upload_service.add_upload_stream(output, "image/png", max_pixels=320 * 240 - 1)
+
+    stage_file.assert_not_called()
+    assert database_session.exec(select(UploadMetaData)).all() == []
+
+
+def test__probe_stored_file__returns_size_and_image_info(upload_service, database_session):
+    image = Image.new("RGB", (64, 32))
+    output = io.BytesIO()
+    image.save(output, format="GIF")
+    upload = upload_service.add_upload(output.getvalue(), "image/gif")
+
+    byte_size, image_info = upload_service.probe_stored_file(upload.upload_id)
+
+    assert byte_size == len(output.getvalue())
+    assert (image_info.width, image_info.height, image_info.format) == (64, 32, "GIF")
+
+
+def test__probe_stored_file__missing_file__raises(upload_service, file_storage):
+    upload = upload_service.add_upload(b"test_content", "image/png")
+    file_storage.delete_file_content(upload.upload_id)
+
+    with pytest.raises(FileNotFoundError):
+        upload_service.probe_stored_file(upload.upload_id)
+
+
+def test__list_metadata__missing_file_info__only_rows_without_byte_size(
+    upload_service, database_session
+):
+    recorded = upload_service.add_upload(b"recorded", "image/png")
+    legacy = upload_service.add_upload(b"legacy", "image/png")
+    legacy.byte_size = None
+    database_session.add(legacy)
+    database_session.flush()
+
+    result = upload_service.list_metadata(limit=10, missing_file_info=True)
+
+    assert [upload.upload_id for upload in result] == [legacy.upload_id]
+    assert recorded.byte_size is not None
+
+
+def test__set_file_info__updates_row(upload_service):
+    upload = upload_service.add_upload(b"legacy", "image/png")
+
+    updated = upload_service.set_file_info(upload.upload_id, 42, ImageInfo(10, 20, "WEBP"))
+
+    stored = upload_service.get_metadata(upload.upload_id)
+    assert stored is updated
+    assert (stored.byte_size, stored.width, stored.height, stored.image_format) == (
+        42,
+        10,
+        20,
+        "WEBP",
+    )
+
+
+def test__set_blurhash__updates_row(upload_service):
+    upload = upload_service.add_upload(b"test_content", "image/png")
+
+    upload_service.set_blurhash(upload.upload_id, "LxH27k2swxX8mHWWjtf7gJfjfQfj")
+
+    assert upload_service.get_metadata(upload.upload_id).blurhash == "LxH27k2swxX8mHWWjtf7gJfjfQfj"
+
+
+def _add_upload_with_dhash(upload_service, content: bytes, value: int) -> UploadMetaData:
+    upload = upload_service.add_upload(content, "image/png")
+    return upload_service.set_dhash(upload.upload_id, value)
+
+
+def test__find_similar__returns_uploads_within_distance_closest_first(upload_service):
+    query = _add_upload_with_dhash(upload_service, b"query", 0x0123_4567_89AB_CDEF)
+    far = _add_upload_with_dhash(upload_service, b"far", 0xFEDC_BA98_7654_3210)
+    two_bits = _add_upload_with_dhash(upload_service, b"two", 0x0123_4567_89AB_CDEF ^ 0b101)
+    one_bit = _add_upload_with_dhash(upload_service, b"one", 0x0123_4567_89AB_CDEF ^ (1 << 63))
+
+    result = upload_service.find_similar(query.upload_id, max_distance=4, limit=10)
+
+    assert [(match.metadata.upload_id, match.distance) for match in result] == [
+        (one_bit.upload_id, 1),
+        (two_bits.upload_id, 2),
+    ]
+    assert far.upload_id not in {match.metadata.upload_id for match in result}
+
+
+def test__find_similar__differences_in_every_chunk__still_found(upload_service):
+    value = 0x0123_4567_89AB_CDEF
+    query = _add_upload_with_dhash(upload_service, b"query", value)
+    # Two bits flipped in each chunk: no chunk matches exactly.
+    spread = _add_upload_with_dhash(upload_service, b"spread", value ^ 0x0003_0003_0003_0003)
+
+    result = upload_service.find_similar(query.upload_id, max_distance=8, limit=10)
+
+    assert [match.metadata.upload_id for match in result] == [spread.upload_id]
+
+
+def test__find_similar__respects_limit(upload_service):
+    query = _add_upload_with_dhash(upload_service, b"query", 0)
+    for index in range(3):
+        _add_upload_with_dhash(upload_service, f"copy{index}".encode(), 1 << index)
+
+    assert len(upload_service.find_similar(query.upload_id, max_distance=2, limit=2)) == 2
+
+
+def test__find_similar__without_hash__returns_empty(upload_service):
+    upload = upload_service.add_upload(b"test_content", "image/png")
+    _add_upload_with_dhash(upload_service, b"other", 0)
+
+    assert upload_service.find_similar(upload.upload_id, max_distance=8, limit=10) == []
+
+
+def test__find_similar__nonexistent_upload__raises(upload_service):
+    with pytest.raises(UploadNotFoundException):
+        upload_service.find_similar("nonexistent", max_distance=8, limit=10)
@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+from lenzr_server.worker_pool import BoundedWorkerPool, ingest_pool_from_env
+
+
+@pytest.fixture
+def pool():
+    pool = BoundedWorkerPool(workers=2, max_queue=4)
+    yield pool
+    pool.shutdown()
+
+
+def test__submit__runs_job_with_arguments(pool):
+    results: list[int] = []
+
+    assert pool.submit(results.append, 1)
+    pool.join()
+
+    assert results == [1]
+    assert pool.stats().completed == 1
+
+
+def test__submit__failing_job__counted_and_worker_keeps_running(pool):
+    results: list[int] = []
+
+    def fail() -> None:
+        raise RuntimeError("boom")
+
+    pool.submit(fail)
+    pool.submit(results.append, 1)
+    pool.join()
+
+    assert results == [1]
+    assert pool.stats().failed == 1
+    assert pool.stats().completed == 1
+
+
+def test__submit__queue_full__drops_job_without_blocking():
+    pool = BoundedWorkerPool(workers=1, max_queue=1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block() -> None:
+        started.set()
+        release.wait(timeout=5)
+
+    pool.submit(block)
+    started.wait(timeout=5)
+    assert pool.submit(block)
+
+    assert not pool.submit(block)
+    stats = pool.stats()
+    assert stats.queued == 1
+    assert stats.dropped == 1
+
+    release.set()
+    pool.shutdown()
+
+
+def test__shutdown__discards_pending_jobs():
+    pool = BoundedWorkerPool(workers=1, max_queue=5)
+    release = threading.Event()
+    started = threading.Event()
+    results: list[int] = []
+
+    def block() -> None:
+        started.set()
+        release.wait(timeout=5)
+
+    pool.submit(block)
+    started.wait(timeout=5)
+    pool.submit(results.append, 1)
+    # Unblock the running job only once shutdown has started draining.
+    threading.Timer(0.05, release.set).start()
+    pool.shutdown()
+
+    assert results == []
+
+
+def test__ingest_pool_from_env__uses_configured_sizes(monkeypatch):
+    monkeypatch.setenv("INGEST_WORKERS", "3")
+    monkeypatch.setenv("INGEST_QUEUE_SIZE", "7")
+
+    with ingest_pool_from_env() as pool:
+        stats = pool.stats()
+
+    assert stats.workers == 3
+    assert stats.max_queue == 7
@@ -44,3 +44,14 @@ def test__create_upload_id__same_seed_and_content__returns_same_hash():
     upload_id2 = creator2.create_upload_id(content)
 
     assert upload_id1 == upload_id2
+
+
+def test__create_hasher__chunked_updates__returns_same_id_as_create_upload_id():
+    creator = HashingIDCreator(seed=42)
+    content = b"some content split into chunks"
+
+    hasher = creator.create_hasher()
+    for start in range(0, len(content), 5):
+        hasher.update(content[start : start + 5])
+
+    assert hasher.upload_id() == creator.create_upload_id(content)